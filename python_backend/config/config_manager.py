@@ -1,4 +1,5 @@
 import os
+import socket
 import yaml
 from typing import Any, Dict
 import random
@@ -82,7 +83,9 @@ class ConfigManager:
                 'id': os.getenv('AI_WORKER_ID', self.generate_worker_id()),
                 'max_concurrent': int(os.getenv('AI_MAX_CONCURRENT', '10')),
                 'window_limit': int(os.getenv('AI_WINDOW_LIMIT', '60')),
+                'window_seconds': float(os.getenv('AI_WINDOW_SECONDS', '60')),
                 'port': int(os.getenv('AI_SERVICE_PORT', '9000')),
+                'url': os.getenv('AI_WORKER_URL', f"http://{socket.gethostname()}:{os.getenv('AI_SERVICE_PORT', '9000')}"),
                 'health_check_interval': int(os.getenv('WORKER_HEALTH_CHECK_INTERVAL', '10000'))
             }
         }
@@ -133,6 +136,24 @@ class ConfigManager:
             },
             'storage': {
                 'path': speaker.get('storage', {}).get('path', 'data/speakers.json'),
+                'format': speaker.get('storage', {}).get('format', 'npz'),
+                'flush_interval': speaker.get('storage', {}).get('flush_interval', 2.0),
+            },
+            'cache': {
+                'max_meetings': speaker.get('cache', {}).get('max_meetings', 4),
+            },
+            'library': {
+                'enable': speaker.get('library', {}).get('enable', True),
+                'path': speaker.get('library', {}).get('path', 'data/voiceprints'),
+                'threshold': speaker.get('library', {}).get('threshold', 0.3),
+                'nprobe': speaker.get('library', {}).get('nprobe', 8),
+                'brute_force_limit': speaker.get('library', {}).get('brute_force_limit', 2048),
+                'flush_interval': speaker.get('library', {}).get('flush_interval', 2.0),
+            },
+            'rediarization': {
+                'threshold': speaker.get('rediarization', {}).get('threshold', 0.45),
+                'min_duration': speaker.get('rediarization', {}).get('min_duration', 1.0),
+                'on_meeting_end': speaker.get('rediarization', {}).get('on_meeting_end', False),
             }
         }
 
@@ -187,6 +208,118 @@ class ConfigManager:
             'sample_rate': buffer.get('sample_rate', 16000)
         }
 
+    @property
+    def inference_config(self) -> Dict:
+        """获取推理进程配置"""
+        inference = self._config.get('inference', {})
+        return {
+            'mode': inference.get('mode', 'thread'),
+            'processes': inference.get('processes', 1),
+            'slots': inference.get('slots', 16),
+            'max_segment_duration': inference.get('max_segment_duration', 60.0)
+        }
+
+    @property
+    def models_config(self) -> Dict:
+        """获取本地模型目录和预热配置"""
+        models = self._config.get('models', {})
+        registry = models.get('registry') or {}
+        warmup = models.get('warmup') or {}
+        return {
+            'registry': {
+                'path': registry.get('path', 'models'),
+                'offline': registry.get('offline', False),
+                'verify': registry.get('verify', True),
+                'mmap': registry.get('mmap', True)
+            },
+            'warmup': {
+                'enable': warmup.get('enable', True),
+                'duration': warmup.get('duration', 1.0)
+            }
+        }
+
+    @property
+    def startup_config(self) -> Dict:
+        """获取模型加载配置"""
+        startup = self._config.get('startup', {})
+        preload = startup.get('preload') or {}
+        return {
+            'parallel': startup.get('parallel', True),
+            'preload': {
+                'vad': preload.get('vad', True),
+                'speaker': preload.get('speaker', True),
+                'asr': preload.get('asr', True),
+                'embedding': preload.get('embedding', True)
+            }
+        }
+
+    @property
+    def threads_config(self) -> Dict:
+        """获取CPU线程预算配置"""
+        threads = self._config.get('threads', {})
+        defaults = {
+            'asr': {'workers': 1, 'threads': 4},
+            'vad': {'workers': 1, 'threads': 1},
+            'speaker': {'workers': 1, 'threads': 2},
+            'embedding': {'workers': 1, 'threads': 2},
+        }
+        result = {
+            'enable': threads.get('enable', False),
+            'cores': threads.get('cores', 0),
+            'pin': threads.get('pin', True),
+            'torch_inter_op': threads.get('torch_inter_op', 1),
+            'default_executor': threads.get('default_executor', 8)
+        }
+        for name, default in defaults.items():
+            component = threads.get(name) or {}
+            result[name] = {
+                'workers': component.get('workers', default['workers']),
+                'threads': component.get('threads', default['threads'])
+            }
+        return result
+
+    @property
+    def sessions_config(self) -> Dict:
+        """获取会话配置"""
+        sessions = self._config.get('sessions', {})
+        return {
+            'max_sessions': sessions.get('max_sessions', 32)
+        }
+
+    @property
+    def cluster_config(self) -> Dict:
+        """获取多 worker 协调配置"""
+        cluster = self._config.get('cluster', {})
+        return {
+            'enable': cluster.get('enable', False)
+        }
+
+    @property
+    def admission_config(self) -> Dict:
+        """获取准入控制配置，未配置的项使用 worker 的 max_concurrent / window_limit"""
+        admission = self._config.get('admission', {})
+        worker = self.worker
+        sessions = admission.get('sessions') or {}
+        documents = admission.get('documents') or {}
+        analyze = admission.get('analyze') or {}
+        return {
+            'sessions': {
+                'max_concurrent': sessions.get('max_concurrent', self.sessions_config['max_sessions']),
+                'window_limit': sessions.get('window_limit', worker['window_limit']),
+                'window_seconds': worker['window_seconds']
+            },
+            'documents': {
+                'max_concurrent': documents.get('max_concurrent', worker['max_concurrent']),
+                'window_limit': documents.get('window_limit', worker['window_limit']),
+                'window_seconds': worker['window_seconds']
+            },
+            'analyze': {
+                'max_concurrent': analyze.get('max_concurrent', worker['max_concurrent']),
+                'window_limit': analyze.get('window_limit', worker['window_limit']),
+                'window_seconds': worker['window_seconds']
+            }
+        }
+
     @property
     def vad_manager_config(self) -> Dict:
         """获取 VAD 管理器配置"""
@@ -207,11 +340,45 @@ class ConfigManager:
                 'enable': audio.get('sentence_split', {}).get('enable', True),
                 'min_duration_for_split': audio.get('sentence_split', {}).get('min_duration_for_split', 3.0)
             },
+            'speaker_switch': {
+                'enable': audio.get('speaker_switch', {}).get('enable', True),
+                'window': audio.get('speaker_switch', {}).get('window', 1.5),
+                'hop': audio.get('speaker_switch', {}).get('hop', 0.5),
+                'min_windows': audio.get('speaker_switch', {}).get('min_windows', 2)
+            },
+            'opus': {
+                'batch_duration': audio.get('opus', {}).get('batch_duration', 0.1),
+                'max_conceal': audio.get('opus', {}).get('max_conceal', 1.0)
+            },
             'asr': {
                 'model': audio.get('asr', {}).get('model', 'iic/SenseVoiceSmall'),
                 'language': audio.get('asr', {}).get('language', 'zh'),
                 'use_onnx': audio.get('asr', {}).get('use_onnx', True),
-                'output_timestamp': audio.get('asr', {}).get('output_timestamp', True)
+                'quantize': audio.get('asr', {}).get('quantize', False),
+                'output_timestamp': audio.get('asr', {}).get('output_timestamp', True),
+                'executor': {
+                    'instances': audio.get('asr', {}).get('executor', {}).get('instances', 1),
+                    'intra_op_threads': audio.get('asr', {}).get('executor', {}).get('intra_op_threads', 0),
+                    'pin_cores': audio.get('asr', {}).get('executor', {}).get('pin_cores', False)
+                },
+                'batching': {
+                    'enable': audio.get('asr', {}).get('batching', {}).get('enable', True),
+                    'window': audio.get('asr', {}).get('batching', {}).get('window', 0.02),
+                    'max_batch_size': audio.get('asr', {}).get('batching', {}).get('max_batch_size', 10),
+                    'bucket_ratio': audio.get('asr', {}).get('batching', {}).get('bucket_ratio', 1.5)
+                },
+                'chunking': {
+                    'enable': audio.get('asr', {}).get('chunking', {}).get('enable', True),
+                    'min_duration': audio.get('asr', {}).get('chunking', {}).get('min_duration', 12.0),
+                    'min_chunk': audio.get('asr', {}).get('chunking', {}).get('min_chunk', 5.0),
+                    'max_chunk': audio.get('asr', {}).get('chunking', {}).get('max_chunk', 8.0),
+                    'overlap': audio.get('asr', {}).get('chunking', {}).get('overlap', 0.2)
+                },
+                'cache': {
+                    'enable': audio.get('asr', {}).get('cache', {}).get('enable', True),
+                    'max_entries': audio.get('asr', {}).get('cache', {}).get('max_entries', 256),
+                    'ttl': audio.get('asr', {}).get('cache', {}).get('ttl', 300.0)
+                }
             },
             'speaker': {
                 'model': audio.get('speaker', {}).get('model', 'CAMPPlus/wespeaker'),
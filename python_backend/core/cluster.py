@@ -0,0 +1,187 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Callable, Awaitable, List
+from core.redis_client import RedisClient
+from config.config_manager import config
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterCoordinator:
+    """多 worker 协调：心跳与负载上报、会议到 worker 的粘性路由、识别事件的 pub/sub 转发
+
+    Redis 数据：
+    - worker:{id}            hash，worker 信息和负载，TTL 为 3 个心跳周期，过期即视为下线
+    - workers                zset，score 为负载率，用于选择最空闲的 worker
+    - route:meeting:{id}     会议分配到的 worker id，本 worker 有该会议的会话时随心跳续期
+    - events:meeting:{id}    频道，会议的识别事件
+    """
+
+    def __init__(self, redis=None, worker_id: Optional[str] = None, url: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = None, max_sessions: int = 0,
+                 load_fn: Optional[Callable[[], Dict[str, Any]]] = None):
+        worker_config = config.worker
+        self.redis = redis or RedisClient.get_instance()
+        self.worker_id = worker_id or worker_config['id']
+        self.url = url or worker_config['url']
+        self.heartbeat_interval = heartbeat_interval or worker_config['health_check_interval'] / 1000.0
+        self.ttl = max(1, int(self.heartbeat_interval * 3))
+        self.max_sessions = max_sessions
+        self.load_fn = load_fn or (lambda: {'sessions': 0, 'meetings': []})
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        # 频道 -> 本地回调列表
+        self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], Awaitable[None]]]] = {}
+
+    @staticmethod
+    def _worker_key(worker_id: str) -> str:
+        return RedisClient.key(f"worker:{worker_id}")
+
+    @staticmethod
+    def _route_key(meeting_id: int) -> str:
+        return RedisClient.key(f"route:meeting:{meeting_id}")
+
+    @staticmethod
+    def _channel(meeting_id: int) -> str:
+        return RedisClient.key(f"events:meeting:{meeting_id}")
+
+    async def start(self):
+        await self.heartbeat()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Cluster worker {self.worker_id} registered at {self.url}, heartbeat: {self.heartbeat_interval}s")
+
+    async def stop(self):
+        for task in (self._heartbeat_task, self._listener_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        # 主动下线，路由不再选择本 worker
+        await self.redis.zrem(RedisClient.key('workers'), self.worker_id)
+        await self.redis.delete(self._worker_key(self.worker_id))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Cluster heartbeat failed: {str(e)}")
+
+    async def heartbeat(self):
+        """上报负载，并为本 worker 上正在进行的会议续期路由"""
+        load = self.load_fn()
+        sessions = load['sessions']
+        load_ratio = sessions / self.max_sessions if self.max_sessions > 0 else float(sessions)
+        pipe = self.redis.pipeline()
+        pipe.hset(self._worker_key(self.worker_id), mapping={
+            'url': self.url,
+            'sessions': sessions,
+            'max_sessions': self.max_sessions,
+            'load': load_ratio,
+            'updated_at': time.time()
+        })
+        pipe.expire(self._worker_key(self.worker_id), self.ttl)
+        pipe.zadd(RedisClient.key('workers'), {self.worker_id: load_ratio})
+        for meeting_id in load['meetings']:
+            pipe.set(self._route_key(meeting_id), self.worker_id, ex=self.ttl)
+        await pipe.execute()
+
+    async def get_worker(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        info = await self.redis.hgetall(self._worker_key(worker_id))
+        if not info:
+            return None
+        return {
+            'worker_id': worker_id,
+            'url': info['url'],
+            'sessions': int(info['sessions']),
+            'max_sessions': int(info['max_sessions']),
+            'load': float(info['load']),
+            'updated_at': float(info['updated_at'])
+        }
+
+    async def list_workers(self) -> List[Dict[str, Any]]:
+        """在线的 worker，按负载从低到高，清理心跳已过期的成员"""
+        workers = []
+        for worker_id in await self.redis.zrange(RedisClient.key('workers'), 0, -1):
+            info = await self.get_worker(worker_id)
+            if info is None:
+                await self.redis.zrem(RedisClient.key('workers'), worker_id)
+                continue
+            workers.append(info)
+        return workers
+
+    async def route(self, meeting_id: int) -> Optional[Dict[str, Any]]:
+        """会议的粘性路由：已分配且在线的 worker 优先，否则分配给负载最低且未满的 worker"""
+        route_key = self._route_key(meeting_id)
+        worker_id = await self.redis.get(route_key)
+        if worker_id:
+            info = await self.get_worker(worker_id)
+            if info is not None:
+                return info
+
+        for info in await self.list_workers():
+            if info['max_sessions'] > 0 and info['sessions'] >= info['max_sessions']:
+                continue
+            # 并发分配时以先写入者为准
+            if await self.redis.set(route_key, info['worker_id'], ex=self.ttl, nx=True):
+                return info
+            if worker_id is not None:
+                # 原 worker 已下线，覆盖过期的分配
+                await self.redis.set(route_key, info['worker_id'], ex=self.ttl)
+                return info
+            return await self.get_worker(await self.redis.get(route_key))
+        return None
+
+    async def publish(self, meeting_id: int, event: Dict[str, Any]):
+        """发布会议的识别事件"""
+        await self.redis.publish(self._channel(meeting_id), json.dumps({
+            'worker_id': self.worker_id,
+            'meeting_id': meeting_id,
+            'event': event
+        }, ensure_ascii=False))
+
+    async def subscribe(self, meeting_id: int, callback: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """订阅会议的识别事件，callback 收到 publish 的消息"""
+        channel = self._channel(meeting_id)
+        if self._pubsub is None:
+            self._pubsub = self.redis.pubsub()
+        if channel not in self._subscribers:
+            self._subscribers[channel] = []
+            await self._pubsub.subscribe(channel)
+        self._subscribers[channel].append(callback)
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, meeting_id: int, callback: Callable[[Dict[str, Any]], Awaitable[None]]):
+        channel = self._channel(meeting_id)
+        callbacks = self._subscribers.get(channel)
+        if not callbacks or callback not in callbacks:
+            return
+        callbacks.remove(callback)
+        if not callbacks:
+            del self._subscribers[channel]
+            await self._pubsub.unsubscribe(channel)
+
+    async def _listen(self):
+        while self._subscribers:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message['type'] != 'message':
+                    continue
+                data = json.loads(message['data'])
+                for callback in list(self._subscribers.get(message['channel'], [])):
+                    await callback(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cluster event listener error: {str(e)}")
+                await asyncio.sleep(1)
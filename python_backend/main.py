@@ -6,9 +6,16 @@ import logging
 import colorlog
 import signal
 from config.config_manager import config
+from service.thread_budget import thread_budget
+from service.model_registry import model_registry
+# 线程数和离线模式的环境变量必须在导入 torch / onnxruntime / huggingface 之前设置
+thread_budget.apply_environment()
+model_registry.apply_environment()
+from service.model_loader import model_loader
 from service.socket_service import SocketService
 from service.ai_service import AIService
 from service.http_service import HttpService
+from service.audio_ingest import AudioIngestService
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import os
@@ -52,73 +59,93 @@ def setup_logging():
 setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title="Chat Verse AI Worker",
-    docs_url=None,
-    redoc_url=None
-)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# 初始化服务
-socket_service = SocketService()
-ai_service = AIService()
-http_service = HttpService(socket_service, ai_service)
-
-# 注册 WebSocket 路由
-app.mount("/ws", socket_service.get_app())
-
-# 注册 HTTP 路由
-http_service.register_routes(app)
-
-# 挂载上传目录为静态资源
-app.mount("/static/uploads", StaticFiles(directory="./data/uploads"), name="uploads")
-
-# 添加文档查看路由
-@app.get("/api/static/documents/{doc_id}/view")
-async def view_document(doc_id: str):
-    """在浏览器中查看文档"""
-    doc_info = await http_service.document_service.get_document(doc_id)
-    
-    if not doc_info:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    file_path = doc_info["save_path"]
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    # 返回文件以便浏览器直接查看
-    return FileResponse(
-        path=file_path, 
-        # filename=doc_info["original_filename"],
-        media_type=doc_info["content_type"]
+def create_app() -> FastAPI:
+    """创建应用并初始化各服务
+
+    服务不在模块顶层创建：inference.mode 为 process 时推理进程以 spawn 方式启动，
+    子进程会以 __mp_main__ 重新执行本模块，顶层创建的服务（模型池、向量库客户端等）会在每个推理进程中重复创建。
+    """
+    app = FastAPI(
+        title="Chat Verse AI Worker",
+        docs_url=None,
+        redoc_url=None
     )
 
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时的处理"""
-    try:
-        await socket_service.start()
-        logger.info("Socket service started successfully")
-    except Exception as e:
-        logger.error(f"Failed to start socket service: {str(e)}")
-        raise
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # 初始化服务
+    socket_service = SocketService()
+    ai_service = AIService()
+    http_service = HttpService(socket_service, ai_service)
+    audio_ingest_service = AudioIngestService(socket_service)
+    app.state.socket_service = socket_service
+
+    # 注册 WebSocket 路由
+    app.mount("/ws", socket_service.get_app())
+    # 二进制音频接入（帧头 + int16 PCM），路径不能放在 /ws 下，否则会被上面的挂载拦截
+    app.websocket("/ws_audio")(audio_ingest_service.handle)
+
+    # 注册 HTTP 路由
+    http_service.register_routes(app)
+
+    # 挂载上传目录为静态资源
+    app.mount("/static/uploads", StaticFiles(directory="./data/uploads"), name="uploads")
+
+    # 添加文档查看路由
+    @app.get("/api/static/documents/{doc_id}/view")
+    async def view_document(doc_id: str):
+        """在浏览器中查看文档"""
+        doc_info = await http_service.document_service.get_document(doc_id)
+        
+        if not doc_info:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        file_path = doc_info["save_path"]
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        # 返回文件以便浏览器直接查看
+        return FileResponse(
+            path=file_path, 
+            # filename=doc_info["original_filename"],
+            media_type=doc_info["content_type"]
+        )
+
+    @app.on_event("startup")
+    async def startup_event():
+        """应用启动时的处理"""
+        try:
+            # 模型在后台线程中并行加载，服务立即可用，/readyz 在加载完成后就绪
+            thread_budget.apply_torch()
+            thread_budget.log_layout()
+            await http_service.start()
+            model_loader.start()
+            await socket_service.start()
+            logger.info("Socket service started successfully")
+        except Exception as e:
+            logger.error(f"Failed to start socket service: {str(e)}")
+            raise
+
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        await shutdown_event(app)
+
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_event():
+async def shutdown_event(app: FastAPI):
     """应用关闭时的处理"""
     try:
-        await socket_service.stop()
+        await app.state.socket_service.stop()
         logger.info("Socket service stopped successfully")
     except Exception as e:
         logger.error(f"Error stopping socket service: {str(e)}")
 
-async def shutdown(signal_name):
+async def shutdown(signal_name, app: FastAPI):
     """优雅退出"""
     logger.info(f"Received exit signal {signal_name}")
     
@@ -131,15 +158,18 @@ async def shutdown(signal_name):
     
     # 等待清理完成
     logger.info("Cleaning up resources...")
-    await shutdown_event()
+    await shutdown_event(app)
     
     # 等待所有任务完成
     await asyncio.gather(*tasks, return_exceptions=True)
     logger.info("Shutdown complete.")
 
 async def main():
+    app = create_app()
+    # 直接传入 app 对象：传 "main:app" 时 uvicorn 会再导入一次本模块（python main.py 运行时本模块为 __main__），
+    # 重复创建服务并重复注册模型组件
     uv_config = uvicorn.Config(
-        "main:app",
+        app,
         host="0.0.0.0",
         port=config.worker['port'],
         reload=False,
@@ -152,14 +182,14 @@ async def main():
     for sig in (signal.SIGTERM, signal.SIGINT):
         asyncio.get_event_loop().add_signal_handler(
             sig,
-            lambda s=sig: asyncio.create_task(shutdown(signal.Signals(s).name))
+            lambda s=sig: asyncio.create_task(shutdown(signal.Signals(s).name, app))
         )
     
     try:
         await server.serve()
     except KeyboardInterrupt:
         logger.info("Received KeyboardInterrupt")
-        await shutdown("SIGINT")
+        await shutdown("SIGINT", app)
 
 if __name__ == "__main__":
     try:
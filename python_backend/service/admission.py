@@ -0,0 +1,76 @@
+import math
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """超过并发或速率限制，retry_after 为建议的重试等待时间(秒)"""
+
+    def __init__(self, name: str, reason: str, retry_after: int):
+        super().__init__(f"{name} overloaded: {reason}, retry after {retry_after}s")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """准入控制：并发上限 + 滑动窗口速率限制
+
+    超限时立即拒绝（AdmissionRejected）而不是排队，过载时只有超出的请求失败，已接纳的请求不受影响。
+    所有调用都在事件循环线程中，计数不需要加锁。
+    """
+
+    def __init__(self, name: str, max_concurrent: int, window_limit: int, window_seconds: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self._clock = clock
+        self.max_concurrent = max_concurrent
+        self.window_limit = window_limit
+        self.window_seconds = window_seconds
+        self.active = 0
+        self._admitted: Deque[float] = deque()  # 窗口内的准入时间
+        self._avg_duration = 1.0  # 最近任务耗时的指数平均，用于估计并发满时的重试时间
+        self.admitted = 0
+        self.rejected_concurrency = 0
+        self.rejected_rate = 0
+
+    def acquire(self) -> float:
+        """申请准入，返回开始时间，调用方完成后必须调用 release"""
+        now = self._clock()
+        while self._admitted and self._admitted[0] <= now - self.window_seconds:
+            self._admitted.popleft()
+
+        if self.max_concurrent > 0 and self.active >= self.max_concurrent:
+            self.rejected_concurrency += 1
+            raise AdmissionRejected(self.name, 'too many concurrent requests',
+                                    max(1, math.ceil(self._avg_duration)))
+        if self.window_limit > 0 and len(self._admitted) >= self.window_limit:
+            self.rejected_rate += 1
+            retry_after = self._admitted[0] + self.window_seconds - now
+            raise AdmissionRejected(self.name, 'rate limit exceeded', max(1, math.ceil(retry_after)))
+
+        self.active += 1
+        self.admitted += 1
+        self._admitted.append(now)
+        return now
+
+    def release(self, start_time: float):
+        self.active = max(0, self.active - 1)
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * (self._clock() - start_time)
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        return {
+            'active': self.active,
+            'max_concurrent': self.max_concurrent,
+            'window_count': sum(1 for t in self._admitted if t > now - self.window_seconds),
+            'window_limit': self.window_limit,
+            'window_seconds': self.window_seconds,
+            'admitted': self.admitted,
+            'rejected_concurrency': self.rejected_concurrency,
+            'rejected_rate': self.rejected_rate,
+        }
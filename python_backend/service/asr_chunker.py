@@ -0,0 +1,90 @@
+import numpy as np
+from typing import List, Tuple
+
+from tools.text_splitter import split_text
+
+
+def find_split_points(samples: np.ndarray, sample_rate: int, min_chunk: float = 5.0,
+                      max_chunk: float = 8.0, frame: float = 0.02) -> List[float]:
+    """在低能量处查找长音频的切分点
+
+    从上一个切分点出发，在 [min_chunk, max_chunk] 秒范围内选择短时能量最低的帧作为下一个切分点，
+    剩余音频不超过 max_chunk 时结束。切分点保证剩余音频不短于 min_chunk，
+    剩余音频不足以再切出两个 min_chunk 的分块时不再切分，并入最后一个分块。
+
+    Returns:
+        切分点时间列表（秒，相对音频起点），不含起点和终点
+    """
+    frame_size = max(1, int(frame * sample_rate))
+    n_frames = len(samples) // frame_size
+    if n_frames == 0:
+        return []
+    frames = samples[:n_frames * frame_size].astype(np.float32).reshape(n_frames, frame_size)
+    energy = np.mean(frames * frames, axis=1)
+
+    min_frames = int(min_chunk / frame)
+    max_frames = int(max_chunk / frame)
+    points = []
+    start = 0
+    while n_frames - start > max_frames:
+        window = energy[start + min_frames:min(start + max_frames, n_frames - min_frames)]
+        if len(window) == 0:
+            break
+        cut = start + min_frames + int(np.argmin(window))
+        points.append(cut * frame_size / sample_rate)
+        start = cut
+    return points
+
+
+def make_chunks(duration: float, split_points: List[float], overlap: float) -> List[Tuple[float, float, float, float]]:
+    """根据切分点生成带重叠的分块
+
+    Returns:
+        [(chunk_start, chunk_end, keep_start, keep_end), ...]：
+        chunk 为实际解码的范围（两侧各延伸 overlap/2），keep 为合并时保留的范围
+    """
+    bounds = [0.0] + list(split_points) + [duration]
+    chunks = []
+    for keep_start, keep_end in zip(bounds[:-1], bounds[1:]):
+        chunks.append((
+            max(0.0, keep_start - overlap / 2),
+            min(duration, keep_end + overlap / 2),
+            keep_start,
+            keep_end
+        ))
+    return chunks
+
+
+def merge_chunk_results(chunks: List[Tuple[float, float, float, float]],
+                        results: List[Tuple[str, List[List[int]]]]) -> Tuple[str, List[List[int]]]:
+    """合并各分块的识别结果
+
+    每个token按时间戳中点归属到保留范围，重叠区只保留一份；时间戳偏移到整段音频的时间轴(ms)。
+    token与时间戳数量不一致时（如ITN把读出的数字转为阿拉伯数字）无法逐token对应，
+    按时间戳落在保留范围两侧的比例裁掉文本首尾相应数量的token。
+    """
+    text_parts = []
+    merged_timestamps = []
+    previous_token = None
+    for (chunk_start, _, keep_start, keep_end), (text, timestamps) in zip(chunks, results):
+        offset = int(round(chunk_start * 1000))
+        tokens = split_text(text)
+        timestamps = timestamps or []
+        keep = [keep_start <= (ts[0] + ts[1]) / 2000.0 + chunk_start < keep_end for ts in timestamps]
+        if len(tokens) == len(timestamps):
+            kept_tokens = [token for token, kept in zip(tokens, keep) if kept]
+        else:
+            kept_tokens = tokens
+            if timestamps:
+                head = keep.index(True) if any(keep) else len(keep)
+                tail = keep[::-1].index(True) if any(keep) else 0
+                scale = len(tokens) / len(timestamps)
+                kept_tokens = tokens[int(round(head * scale)):len(tokens) - int(round(tail * scale))]
+
+        merged_timestamps.extend([[ts[0] + offset, ts[1] + offset] for ts, kept in zip(timestamps, keep) if kept])
+        for token in kept_tokens:
+            if previous_token is not None and token.is_english_word and previous_token.is_english_word:
+                text_parts.append(' ')
+            text_parts.append(token.text)
+            previous_token = token
+    return ''.join(text_parts), merged_timestamps
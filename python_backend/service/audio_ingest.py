@@ -0,0 +1,90 @@
+import time
+import struct
+import logging
+import numpy as np
+from typing import Dict
+from fastapi import WebSocket, WebSocketDisconnect
+
+from config.config_manager import config
+
+logger = logging.getLogger(__name__)
+
+# 帧头：uint32 会话标识 + uint64 采样时钟（本帧第一个采样点的序号），小端
+FRAME_HEADER = struct.Struct('<IQ')
+
+
+class AudioIngestService:
+    """二进制 WebSocket 音频接入
+
+    每个二进制消息为 12 字节帧头 + int16 PCM（连接参数 codec=opus 时为一个 Opus 包），
+    省去 socket.io 的 engine.io 封包和字典解码。
+    会话标识在 socket.io 连接时通过 system_status 下发，识别结果仍经 socket.io 推送。
+    时间戳由采样时钟换算：流开始时记录服务端时间作为基准，之后按采样数推算，不受网络抖动影响。
+    只有帧头没有音频数据的消息表示音频流结束。
+    Opus 流中采样时钟的跳变视为丢包，由解码器补偿相应时长。
+    """
+
+    def __init__(self, socket_service):
+        self.socket_service = socket_service
+        self.sample_rate = config.audio_config['sample_rate']
+
+    async def handle(self, websocket: WebSocket):
+        await websocket.accept()
+        use_opus = websocket.query_params.get('codec', 'pcm') == 'opus'
+        # 会话标识 -> (基准时间, 下一帧期望的采样时钟)
+        clocks: Dict[int, list] = {}
+        try:
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                data = message.get('bytes')
+                if not data or len(data) < FRAME_HEADER.size or (not use_opus and (len(data) - FRAME_HEADER.size) % 2):
+                    logger.warning(f"Invalid audio frame, length: {len(data) if data else 0}")
+                    continue
+
+                session_key, sample_clock = FRAME_HEADER.unpack_from(data)
+                sid = self.socket_service.get_sid_by_key(session_key)
+                if sid is None:
+                    logger.warning(f"Unknown audio session key: {session_key}")
+                    await websocket.close(code=4004)
+                    return
+
+                if len(data) == FRAME_HEADER.size:
+                    clocks.pop(session_key, None)
+                    await self.socket_service.stop_stream(sid)
+                    continue
+
+                clock = clocks.get(session_key)
+                new_stream = clock is None or sample_clock < clock[1]
+                if use_opus:
+                    lost_samples = 0 if new_stream else sample_clock - clock[1]
+                    try:
+                        frame_samples = self.socket_service.decode_opus(sid, data[FRAME_HEADER.size:], lost_samples=lost_samples)
+                    except Exception as e:
+                        logger.error(f"Opus decode error from client {sid}: {str(e)}")
+                        continue
+                    audio_data = None
+                else:
+                    audio_data = np.frombuffer(data, dtype=np.int16, offset=FRAME_HEADER.size)
+                    frame_samples = len(audio_data)
+
+                frame_end = sample_clock + frame_samples
+                if new_stream:
+                    # 新的音频流（或采样时钟回退），以当前时间对齐本帧结束时刻
+                    clock = [time.time() - frame_end / self.sample_rate, 0]
+                    clocks[session_key] = clock
+                clock[1] = frame_end
+                timestamp = clock[0] + frame_end / self.sample_rate
+
+                if use_opus:
+                    await self.socket_service.feed_decoded(sid, timestamp)
+                else:
+                    await self.socket_service.ingest_audio(sid, audio_data, timestamp)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for session_key in clocks:
+                sid = self.socket_service.get_sid_by_key(session_key)
+                if sid is not None:
+                    await self.socket_service.stop_stream(sid)
@@ -1,18 +1,22 @@
 import logging
 import numpy as np
 import asyncio
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Callable, Dict, Any, Optional, List, Tuple
 from datetime import datetime
 import time
 from functools import wraps
 
 from .audio_buffer import AudioBuffer
+from .event_queue import EventQueue
 from .voice_detector import VoiceDetector, VADEvent
 from .vad_manager import VADManager,VADSegment
 from .sense_voice import SenseVoiceSTT
 from .speaker import Speaker
+from .inference_worker import InferenceProcessPool
+from .thread_budget import thread_budget
+from .model_loader import ModelLoader, model_loader
+from .change_point import detect_change_point
 from config.config_manager import config
-from tools.bin_tools import ndarray_to_audio_frame
 from tools.text_splitter import split_text, Token
 
 logger = logging.getLogger(__name__)
@@ -31,18 +35,145 @@ def with_vad_lock(lock_type: str):
         return wrapper
     return decorator
 
+class ModelPool:
+    """所有会话共享的模型（VAD、说话人embedding、声纹库、ASR）
+
+    模型由 ModelLoader 在后台线程中并行加载，加载完成前对应属性为 None，使用前需 await ensure()。
+    """
+
+    COMPONENTS = ('vad', 'speaker', 'asr')
+
+    def __init__(self, loader: Optional[ModelLoader] = None):
+        self.loader = loader or model_loader
+        self.voice_detector: Optional[VoiceDetector] = None
+        self.speaker: Optional[Speaker] = None
+        self.asr = None
+        self.workers = None
+        self.on_meeting_end: Optional[Callable[[int], None]] = None  # 加载 speaker 后交给 MeetingRegistry
+        preload = config.startup_config['preload']
+        self.loader.register('vad', self._load_vad, preload['vad'])
+        self.loader.register('speaker', self._load_speaker, preload['speaker'])
+        self.loader.register('asr', self._load_asr, preload['asr'])
+
+    @classmethod
+    def load_now(cls) -> 'ModelPool':
+        """创建独立的模型池并阻塞等待全部模型加载完成"""
+        thread_budget.apply_torch()
+        pool = cls(ModelLoader())
+        for name in cls.COMPONENTS:
+            pool.loader.load(name)
+        for name in cls.COMPONENTS:
+            pool.loader.result(name)
+        return pool
+
+    @staticmethod
+    def warm_up(name: str, model):
+        """模型加载后用一段噪声推理一次，避免第一句话承担推理内核的初始化延迟"""
+        warmup_config = config.models_config['warmup']
+        if not warmup_config['enable']:
+            return
+        start = time.perf_counter()
+        model.warm_up(warmup_config['duration'])
+        logger.info(f"Model component {name} warmed up in {time.perf_counter() - start:.2f}s")
+
+    def _load_vad(self) -> VoiceDetector:
+        self.voice_detector = VoiceDetector()
+        self.warm_up('vad', self.voice_detector)
+        return self.voice_detector
+
+    def _load_asr(self):
+        inference_config = config.inference_config
+        if inference_config['mode'] == 'process':
+            # ASR 和说话人embedding在独立进程中推理，本进程只保留说话人状态和VAD
+            self.workers = InferenceProcessPool(
+                processes=inference_config['processes'],
+                slots=inference_config['slots'],
+                max_segment_duration=inference_config['max_segment_duration'],
+                sample_rate=config.audio_config['sample_rate']
+            )
+            self.asr = self.workers
+        else:
+            self.asr = self.create_asr()
+            self.warm_up('asr', self.asr)
+        return self.asr
+
+    def _load_speaker(self) -> Speaker:
+        if config.inference_config['mode'] == 'process':
+            # embedding 模型在推理进程中加载，等待进程池启动
+            self.loader.result('asr')
+            self.speaker = Speaker(remote=self.workers)
+        else:
+            self.speaker = Speaker()
+            self.warm_up('speaker', self.speaker)
+        self.speaker.meetings.on_meeting_end = self.on_meeting_end
+        return self.speaker
+
+    async def ensure(self, *names: str):
+        """等待模型加载完成（不指定时为全部），lazy 的组件在此时开始加载"""
+        await self.loader.ensure(*(names or self.COMPONENTS))
+
+    def is_ready(self) -> bool:
+        return self.loader.is_ready(*self.COMPONENTS)
+
+    def has_failed(self) -> bool:
+        return self.loader.has_failed(*self.COMPONENTS)
+
+    @staticmethod
+    def create_asr() -> SenseVoiceSTT:
+        asr_config = config.audio_config['asr']
+        executor_config = dict(asr_config['executor'])
+        core_sets = None
+        if thread_budget.enabled:
+            # 线程预算启用时实例数、线程数和绑定的核由预算统一分配
+            asr_layout = thread_budget.components['asr']
+            executor_config['instances'] = asr_layout.workers
+            executor_config['intra_op_threads'] = asr_layout.threads
+            core_sets = asr_layout.core_sets if thread_budget.pin else None
+        return SenseVoiceSTT(
+            use_onnx=asr_config['use_onnx'],
+            instances=executor_config['instances'],
+            intra_op_threads=executor_config['intra_op_threads'],
+            pin_cores=executor_config['pin_cores'],
+            batching=asr_config['batching'],
+            quantize=asr_config['quantize'],
+            chunking=asr_config['chunking'],
+            cache=asr_config['cache'],
+            core_sets=core_sets
+        )
+
+    def close(self):
+        if self.speaker is not None:
+            self.speaker.close()
+        if self.asr is not None:
+            self.asr.close()
+            logger.info(f"Model pool closed, asr metrics: {self.asr.get_metrics()}")
+
+
 class AudioProcessor:
-    """音频处理主模块"""
+    """音频处理主模块
+
+    每个连接（会话）一个实例，拥有独立的音频缓冲区、VAD状态、VAD片段和说话人集合，
+    模型由所有会话共享的 ModelPool 提供。
+    """
     
-    def __init__(self):
-        """初始化音频处理器"""
+    def __init__(self, models: Optional[ModelPool] = None, session_id: Optional[str] = None):
+        """初始化音频处理器
+
+        Args:
+            models: 已加载的共享模型，不传时单独加载一份
+            session_id: 会话标识，用于日志
+        """
         # 加载配置
         self.cfg = config
+        self.session_id = session_id
+        self.session_key: Optional[int] = None  # 二进制音频通道帧头中的会话标识，由 SocketService 分配
+        self.owns_models = models is None
+        self.models = models or ModelPool.load_now()
         
         # 初始化核心组件
-        self.voice_detector = VoiceDetector()
-        self.speaker_detector = Speaker()
-        self.asr = SenseVoiceSTT(use_onnx=self.cfg.audio_config['asr']['use_onnx'])
+        self.voice_detector = VoiceDetector(shared=self.models.voice_detector)
+        self.speaker_detector = Speaker(shared=self.models.speaker)
+        self.asr = self.models.asr
         
         # 初始化音频缓冲区
         buffer_cfg = self.cfg.buffer_config
@@ -53,9 +184,10 @@ class AudioProcessor:
         # 初始化VAD管理器
         self.vad_manager = VADManager()
         
-        # 事件队列
-        self.event_queue = asyncio.Queue(
-            maxsize=self.cfg.get('events.max_queue_size', 1000)
+        # 出站事件队列，满时按策略丢弃partial结果，不阻塞推理
+        self.event_queue = EventQueue(
+            maxsize=self.cfg.get('events.max_queue_size', 1000),
+            policy=self.cfg.get('events.drop_policy', 'drop_oldest_partial')
         )
         
         # 处理状态
@@ -104,7 +236,10 @@ class AudioProcessor:
                     pass
             # 清理资源
             self.audio_buffer.clear()
-            logger.info("Audio processor stopped")
+            self.speaker_detector.close()
+            if self.owns_models:
+                self.models.close()
+            logger.info(f"Audio processor stopped, session: {self.session_id}")
         
     async def process_audio(self, audio_data: np.ndarray, timestamp: float) -> None:
         """处理音频数据
@@ -193,10 +328,9 @@ class AudioProcessor:
             allow_update=False
         )
         
-        # ASR保持使用原始int16格式
-        audio_frame = ndarray_to_audio_frame(audio_data, self.cfg.audio_config['sample_rate'])
-        asr_task = self.asr.recognize(
-            buffer=audio_frame,  # int16格式
+        asr_task = self.asr.recognize_array(
+            audio_data,  # int16格式
+            self.cfg.audio_config['sample_rate'],
             language=self.cfg.audio_config['asr']['language'],
             output_timestamp=True
         )
@@ -224,7 +358,7 @@ class AudioProcessor:
         """统一发送识别结果"""
         text_content = asr_result.text if asr_result else ''
         if text_content:
-            await self.event_queue.put({
+            self.event_queue.put({
                 'type': 'transcription',
                 'text': text_content,
                 'speaker_id': speaker_id or '',
@@ -281,13 +415,10 @@ class AudioProcessor:
     async def get_next_event(self) -> Dict[str, Any]:
         """获取下一个事件"""
         return await self.event_queue.get()
-        
-    def stop(self) -> None:
-        """停止处理"""
-        self.is_processing = False
-        self.cleanup_task.cancel()
-        # 清理资源
-        self.audio_buffer.clear()
+
+    def get_event_stats(self) -> Dict[str, Any]:
+        """出站事件队列的深度和丢弃计数"""
+        return self.event_queue.stats()
         
     @with_vad_lock('short')
     async def _handle_short_vad(self, event_type: VADEvent, start_time: float, end_time: float):
@@ -304,11 +435,9 @@ class AudioProcessor:
             logger.info(f"handle short vad: {start_time:.3f} -> {end_time:.3f}, event_type: {event_type.value}, audio_data: {len(audio_data)}")
             
             # 2. 并行处理ASR和Speaker
-            audio_frame = ndarray_to_audio_frame(audio_data, self.cfg.audio_config['sample_rate'])
-
             logger.debug(f"get_speakerid_from_buffer_async from _handle_short_vad, audio : {start_time:.3f} -> {end_time:.3f}")
             speaker_task = self.speaker_detector.get_speakerid_from_buffer_async(audio_data, self.cfg.audio_config['sample_rate'], allow_update=False)
-            asr_task = self.asr.recognize(buffer=audio_frame, language=self.cfg.audio_config['asr']['language'], output_timestamp=True)
+            asr_task = self.asr.recognize_array(audio_data, self.cfg.audio_config['sample_rate'], language=self.cfg.audio_config['asr']['language'], output_timestamp=True)
             
             speaker_id, asr_result = await asyncio.gather(speaker_task, asr_task)
             
@@ -326,7 +455,7 @@ class AudioProcessor:
             
             # 4. 发送结果给客户端
             if asr_result:
-                await self.event_queue.put({
+                self.event_queue.put({
                     'type': 'transcription',
                     'text': asr_result.text,
                     'speaker_id': speaker_id or '',
@@ -337,120 +466,78 @@ class AudioProcessor:
                 })
             
             # 5. 如果是SHORT_TIMEOUT，检查说话人切换
-            # if event_type == VADEvent.SHORT_TIMEOUT:
-            #     await self._check_speaker_switch()
+            if event_type == VADEvent.SHORT_TIMEOUT and self.cfg.audio_config['speaker_switch']['enable']:
+                await self._check_speaker_switch()
                 
         except Exception as e:
             logger.error(f"Error handling short VAD: {str(e)}", exc_info=True)
         
     async def _check_speaker_switch(self):
-        """检查并处理说话人切换，基于声纹距离的三阶段判断"""
+        """检查并处理说话人切换
+
+        对最近三个短VAD段覆盖的音频按滑动窗口提取一组embedding（一次前向），
+        再用累加和扫描一次性找出左右两侧差异最大的切分点。
+        """
         try:
-            # 1. 获取最近三个 VAD 段并进行初步判断
+            if not self.current_long_segment:
+                return
+
+            # 1. 获取最近三个 VAD 段覆盖的时间范围
             recent_segments = self.vad_manager.get_recent_segments(3)
             if len(recent_segments) < 3:
                 return
-            
-            n_minus_2 = recent_segments[-3]  # 第一段
-            n_minus_1 = recent_segments[-2]  # 中间段待切分
-            n = recent_segments[-1]          # 第三段
-
-            # 2. 计算三段之间的声纹距离关系
-            # 2.1 计算第一段和第三段之间的距离
-            original_distance = self.speaker_detector.calculate_segment_distance(
-                self.audio_buffer.read(n_minus_2.start_time, n_minus_2.end_time)[0],
-                self.audio_buffer.read(n.start_time, n.end_time)[0],
-                self.cfg.audio_config['sample_rate']
-            )
 
-            # 如果原始距离太小，表示前后段之间没有明显变化，不需要拆分
-            if original_distance < self.speaker_merge_threshold:
-                logger.debug(f"Original distance {original_distance:.3f} too small, skip splitting")
+            switch_cfg = self.cfg.audio_config['speaker_switch']
+            sample_rate = self.cfg.audio_config['sample_rate']
+            long_start = self.current_long_segment['start_time']
+            range_start = max(recent_segments[0].start_time, long_start)
+            range_end = recent_segments[-1].end_time
+
+            audio_data, actual_start, actual_end = self.audio_buffer.read(range_start, range_end)
+            min_duration = switch_cfg['window'] + switch_cfg['hop'] * (2 * switch_cfg['min_windows'] - 1)
+            if len(audio_data) < min_duration * sample_rate:
                 return
 
-            # 2.2 计算中间段与前后段的距离
-            distance_with_prev = self.speaker_detector.calculate_segment_distance(
-                self.audio_buffer.read(n_minus_2.start_time, n_minus_2.end_time)[0],
-                self.audio_buffer.read(n_minus_1.start_time, n_minus_1.end_time)[0],
-                self.cfg.audio_config['sample_rate']
-            )
-            
-            distance_with_next = self.speaker_detector.calculate_segment_distance(
-                self.audio_buffer.read(n_minus_1.start_time, n_minus_1.end_time)[0],
-                self.audio_buffer.read(n.start_time, n.end_time)[0],
-                self.cfg.audio_config['sample_rate']
+            # 2. 提取窗口embedding序列并扫描切分点
+            embeddings, centers = await self.speaker_detector.get_window_embeddings_async(
+                audio_data, sample_rate, switch_cfg['window'], switch_cfg['hop']
             )
+            if embeddings is None:
+                return
+            index, distance = detect_change_point(embeddings, switch_cfg['min_windows'])
+            if index is None or distance < self.speaker_merge_threshold:
+                logger.debug(f"No valid split point found, windows: {len(centers)}, best distance: {distance:.3f}")
+                return
 
-            # 2.3 验证中间段是否需要切分
-            # 如果中间段与前后段的距离都大于原始距离，说明可能不是在中间段发生的变化
-            if distance_with_prev >= original_distance and distance_with_next >= original_distance:
-                logger.debug(f"Middle segment distances ({distance_with_prev:.3f}, {distance_with_next:.3f}) "
-                           f"both larger than original distance {original_distance:.3f}, skip splitting")
+            # 切分点取相邻两个窗口中心的中点，并对齐到最近的ASR时间戳
+            split_time = actual_start + (centers[index - 1] + centers[index]) / 2.0
+            split_time = self._snap_to_asr_timestamp(split_time, recent_segments, switch_cfg['hop'])
+            if split_time <= long_start:
                 return
 
-            # 3. 在ASR时间戳中寻找最佳切分点
-            best_split = None
-            min_combined_distance = float('inf')
-            best_distances = None
-
-            # 遍历ASR时间戳寻找最佳切分点
-            check_point_count = 0
-            for ts in n_minus_1.asr_timestamps:
-                if ts < 100:  # 跳过太短的时间戳
-                    continue
-                check_point_count += 1
-                split_time = n_minus_1.start_time + ts / 1000.0
-                
-                # 切分中间段
-                part1 = self.audio_buffer.read(n_minus_1.start_time, split_time)[0]
-                part2 = self.audio_buffer.read(split_time, n_minus_1.end_time)[0]
-                
-                # 计算切分后的距离
-                distance1 = self.speaker_detector.calculate_segment_distance(
-                    self.audio_buffer.read(n_minus_2.start_time, n_minus_2.end_time)[0],
-                    part1,
-                    self.cfg.audio_config['sample_rate']
-                )
-                distance2 = self.speaker_detector.calculate_segment_distance(
-                    part2,
-                    self.audio_buffer.read(n.start_time, n.end_time)[0],
-                    self.cfg.audio_config['sample_rate']
-                )
-                
-                # 计算组合距离
-                combined_distance = (distance1 + distance2) / 2.0
-                
-                # 验证切分效果：
-                # 1. 切分后的两部分都要比原始距离小
-                # 2. 两部分之间的距离差异不能太大
-                if (distance1 < original_distance and 
-                    distance2 < original_distance and 
-                    abs(distance1 - distance2) <= 0.2 * original_distance and 
-                    combined_distance < min_combined_distance):
-                    min_combined_distance = combined_distance
-                    best_split = split_time
-                    best_distances = (distance1, distance2)
-
-            # 4. 执行切分
-            if (best_split and 
-                min_combined_distance < original_distance * 0.8):  # 要求明显改善
-                logger.info(f"----____---- Found valid split point at {best_split:.3f}, check_point_count: {check_point_count},"
-                          f"original_distance={original_distance:.3f}, "
-                          f"new_distances=({best_distances[0]:.3f}, {best_distances[1]:.3f})")
-                
-                # 重新处理从原long段起点到切分点的音频
-                original_start = self.current_long_segment['start_time']
-                await self._process_segment(original_start, best_split, is_final=True)
-                
-                # 更新长段信息
-                await self._update_long_segment('update', best_split)
-            else:
-                logger.debug(f"No valid split point found, best_split: {best_split}, min_combined_distance: {min_combined_distance},"
-                             f" original_distance: {original_distance}, check_point_count: {check_point_count}, skip splitting")
+            logger.info(f"----____---- Found valid split point at {split_time:.3f}, "
+                        f"windows: {len(centers)}, distance: {distance:.3f}")
+
+            # 3. 重新处理从原long段起点到切分点的音频
+            await self._process_segment(long_start, split_time, is_final=True)
+
+            # 更新长段信息
+            await self._update_long_segment('update', split_time)
 
         except Exception as e:
             logger.error(f"Error checking speaker switch: {str(e)}", exc_info=True)
-        
+
+    def _snap_to_asr_timestamp(self, target_time: float, segments: List[VADSegment], max_distance: float) -> float:
+        """将切分点对齐到距离最近的ASR字起始时间，超出 max_distance 时保持原值"""
+        best_time = target_time
+        min_distance = max_distance
+        for segment in segments:
+            for ts in segment.asr_timestamps or []:
+                candidate = segment.start_time + ts / 1000.0
+                if abs(candidate - target_time) < min_distance:
+                    min_distance = abs(candidate - target_time)
+                    best_time = candidate
+        return best_time
 
     @with_vad_lock('long')
     async def _update_long_segment(self, action: str, timestamp: float = None, frame_duration: float = None):
@@ -482,8 +569,9 @@ class AudioProcessor:
                 logger.info(f"Long segment ended at {timestamp:.3f}, actual_duration: {actual_duration:.3f}")
                 
                 # 2. 利用 ASR 完整识别长段
-                asr_result = await self.asr.recognize(
-                    buffer=ndarray_to_audio_frame(long_audio, self.cfg.audio_config['sample_rate']),
+                asr_result = await self.asr.recognize_array(
+                    long_audio,
+                    self.cfg.audio_config['sample_rate'],
                     language=self.cfg.audio_config['asr']['language'],
                     output_timestamp=True
                 )
@@ -497,7 +585,8 @@ class AudioProcessor:
                     speaker_id = await self.speaker_detector.get_speakerid_from_buffer_async(
                         long_audio,
                         self.cfg.audio_config['sample_rate'],
-                        allow_update=True
+                        allow_update=True,
+                        segment_time=(actual_segment_start, actual_segment_end)
                     )
                     logger.debug(f"get_speakerid_from_buffer_async when duration too short, audio : {actual_segment_start:.3f} -> {actual_segment_end:.3f}, speaker_id: {speaker_id}")
                     await self._send_transcription_result(
@@ -529,7 +618,8 @@ class AudioProcessor:
                     speaker_id = await self.speaker_detector.get_speakerid_from_buffer_async(
                         long_audio,
                         self.cfg.audio_config['sample_rate'],
-                        allow_update=True
+                        allow_update=True,
+                        segment_time=(actual_segment_start, actual_segment_end)
                     )
                     logger.debug(f"get_speakerid_from_buffer_async when sentence splitting failed, audio : {actual_segment_start:.3f} -> {actual_segment_end:.3f}, speaker_id: {speaker_id}")
                     await self._send_transcription_result(
@@ -609,7 +699,8 @@ class AudioProcessor:
                     sent_audio = self.audio_buffer.read(seg_start, seg_end)[0]
                     speaker_id = await self.speaker_detector.get_speakerid_from_buffer_async(
                         sent_audio, self.cfg.audio_config['sample_rate'],
-                        allow_update=True
+                        allow_update=True,
+                        segment_time=(seg_start, seg_end)
                     )
                     speaker_ids.append(speaker_id)
                     logger.debug(f"Preliminary speaker ID for {seg_start:.3f}-{seg_end:.3f}: {speaker_id}")
@@ -0,0 +1,40 @@
+import numpy as np
+from typing import Optional, Tuple
+
+
+def detect_change_point(embeddings: np.ndarray, min_size: int = 2) -> Tuple[Optional[int], float]:
+    """在短窗口embedding序列上查找最可能的说话人切换点
+
+    对每个候选切分点k，比较左侧 [0, k) 与右侧 [k, n) 的平均embedding的余弦距离，
+    利用累加和一次性向量化计算所有候选点，复杂度 O(n·d)。
+
+    Args:
+        embeddings: 形状 (n, d) 的窗口embedding序列（按时间排序）
+        min_size: 切分后每侧至少包含的窗口数
+
+    Returns:
+        (切分点索引, 距离)：切分点为右侧第一个窗口的索引；无有效候选时返回 (None, 0.0)
+    """
+    if embeddings is None or embeddings.ndim != 2:
+        return None, 0.0
+    n = embeddings.shape[0]
+    min_size = max(1, min_size)
+    if n < 2 * min_size:
+        return None, 0.0
+
+    # 归一化后累加，左右平均向量之间的余弦距离只依赖于前缀和
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normed = embeddings / np.maximum(norms, 1e-8)
+    prefix = np.cumsum(normed, axis=0)
+    total = prefix[-1]
+
+    ks = np.arange(min_size, n - min_size + 1)
+    left = prefix[ks - 1]
+    right = total - left
+    cos = np.sum(left * right, axis=1) / np.maximum(
+        np.linalg.norm(left, axis=1) * np.linalg.norm(right, axis=1), 1e-8
+    )
+    distances = 1.0 - cos
+
+    best = int(np.argmax(distances))
+    return int(ks[best]), float(distances[best])
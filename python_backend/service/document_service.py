@@ -1,5 +1,6 @@
 import os
 import json
+import time
 import asyncio
 import logging
 from datetime import datetime
@@ -8,6 +9,10 @@ import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from parsers.text_parser import parse_text
+from .thread_budget import thread_budget
+from .model_loader import model_loader
+from .model_registry import model_registry
+from config.config_manager import config
 
 logger = logging.getLogger(__name__)
 
@@ -35,12 +40,25 @@ class DocumentService:
             metadata={"description": "文档集合"}
         )
         
-        # 初始化嵌入模型
-        self.embedding_model = SentenceTransformer('BAAI/bge-m3')
+        # 嵌入模型在后台加载，使用前 await model_loader.get('embedding')
+        self.embedding_model: Optional[SentenceTransformer] = None
+        model_loader.register('embedding', self._load_embedding_model, config.startup_config['preload']['embedding'])
+        # 向量计算不阻塞事件循环，启用线程预算时绑定到 embedding 的核
+        self.executor = thread_budget.executor('embedding')
         
         # 加载元数据
         self.load_metadata()
 
+    def _load_embedding_model(self) -> SentenceTransformer:
+        # 本地模型目录中有时直接加载（safetensors 权重以内存映射方式读取），否则从 HuggingFace 下载
+        self.embedding_model = SentenceTransformer(model_registry.resolve('bge_m3') or 'BAAI/bge-m3')
+        warmup_config = config.models_config['warmup']
+        if warmup_config['enable']:
+            start = time.perf_counter()
+            self.embedding_model.encode(["预热"])
+            logger.info(f"Embedding model warmed up in {time.perf_counter() - start:.2f}s")
+        return self.embedding_model
+
     def load_metadata(self) -> None:
         """加载文档元数据"""
         if os.path.exists(self.metadata_file):
@@ -202,7 +220,9 @@ class DocumentService:
             ids = [f"{doc_id}_{chunk['id']}" for chunk in batch]
             
             # 生成嵌入向量
-            embeddings = self.embedding_model.encode(texts).tolist()
+            embedding_model = await model_loader.get('embedding')
+            embeddings = (await asyncio.get_event_loop().run_in_executor(
+                self.executor, embedding_model.encode, texts)).tolist()
             
             # 准备元数据
             metadatas = []
@@ -330,7 +350,9 @@ class DocumentService:
                             limit: int = 5) -> List[Dict[str, Any]]:
         """查询文档内容"""
         # 生成查询向量
-        query_embedding = self.embedding_model.encode(query_text).tolist()
+        embedding_model = await model_loader.get('embedding')
+        query_embedding = (await asyncio.get_event_loop().run_in_executor(
+            self.executor, embedding_model.encode, query_text)).tolist()
         
         # 构建过滤条件
         where_clause = {}
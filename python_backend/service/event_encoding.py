@@ -0,0 +1,77 @@
+import msgpack
+from typing import List, Dict, Any
+
+# 紧凑编码版本号，格式变化时递增
+ENCODING_VERSION = 1
+
+EVENT_TRANSCRIPTION = 0
+EVENT_ERROR = 1
+
+
+def delta_encode(timestamps: List[List[int]]) -> List[int]:
+    """[[start, end], ...](ms) 展平后做差分，相邻值差很小，msgpack 多数只占 1 字节"""
+    deltas = []
+    previous = 0
+    for start, end in timestamps or []:
+        deltas.append(int(start) - previous)
+        deltas.append(int(end) - int(start))
+        previous = int(end)
+    return deltas
+
+
+def delta_decode(deltas: List[int]) -> List[List[int]]:
+    timestamps = []
+    previous = 0
+    for i in range(0, len(deltas) - 1, 2):
+        start = previous + deltas[i]
+        end = start + deltas[i + 1]
+        timestamps.append([start, end])
+        previous = end
+    return timestamps
+
+
+def encode_events(events: List[Dict[str, Any]]) -> bytes:
+    """把一批出站事件编码为 msgpack
+
+    格式：[version, [event, ...]]
+    - 识别结果：[0, text, speaker_id, start_time, duration_ms, is_final, timestamp_deltas]
+    - 错误：[1, code, message]
+    """
+    packed = []
+    for event in events:
+        if event['type'] == 'transcription':
+            packed.append([
+                EVENT_TRANSCRIPTION,
+                event['text'],
+                event['speaker_id'],
+                event['start_time'],
+                int(round((event['end_time'] - event['start_time']) * 1000)),
+                event['isFinal'],
+                delta_encode(event['timestamp'])
+            ])
+        elif event['type'] == 'error':
+            packed.append([EVENT_ERROR, event['code'], event['message']])
+    return msgpack.packb([ENCODING_VERSION, packed], use_bin_type=True)
+
+
+def decode_events(data: bytes) -> List[Dict[str, Any]]:
+    """encode_events 的逆过程，供客户端参考和调试"""
+    version, packed = msgpack.unpackb(data, raw=False)
+    if version != ENCODING_VERSION:
+        raise ValueError(f"Unsupported encoding version: {version}")
+    events = []
+    for item in packed:
+        if item[0] == EVENT_TRANSCRIPTION:
+            _, text, speaker_id, start_time, duration_ms, is_final, deltas = item
+            events.append({
+                'type': 'transcription',
+                'text': text,
+                'speaker_id': speaker_id,
+                'start_time': start_time,
+                'end_time': start_time + duration_ms / 1000.0,
+                'isFinal': is_final,
+                'timestamp': delta_decode(deltas)
+            })
+        elif item[0] == EVENT_ERROR:
+            events.append({'type': 'error', 'code': item[1], 'message': item[2]})
+    return events
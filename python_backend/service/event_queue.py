@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class EventQueue:
+    """会话的有界出站事件队列
+
+    生产者（推理流程）调用 put 永不阻塞，队列满时按策略丢弃事件，慢客户端不会反压推理：
+    - drop_oldest_partial: 丢弃最早的未定稿(partial)结果，没有可丢弃的partial时丢弃新到的partial
+    - drop_newest_partial: 丢弃新到的partial
+    定稿结果(isFinal)和错误事件永不丢弃，队列满时允许超出上限，记入 overflow 计数。
+    新的识别结果覆盖了队列中尚未发送的 partial 的时间范围时，旧 partial 直接移除（superseded）。
+    """
+
+    # 判断时间范围覆盖时的容差(秒)
+    SUPERSEDE_TOLERANCE = 0.05
+
+    POLICIES = ('drop_oldest_partial', 'drop_newest_partial')
+
+    def __init__(self, maxsize: int = 1000, policy: str = 'drop_oldest_partial'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._not_empty = asyncio.Event()
+        self.enqueued = 0
+        self.dropped = 0
+        self.overflow = 0
+        self.superseded = 0
+        self.max_depth = 0
+
+    @staticmethod
+    def _droppable(event: Dict[str, Any]) -> bool:
+        return event.get('type') == 'transcription' and not event.get('isFinal', False)
+
+    def put(self, event: Dict[str, Any]):
+        """放入事件，队列满时按策略丢弃"""
+        if event.get('type') == 'transcription':
+            self._remove_superseded(event)
+        if self.maxsize > 0 and len(self._queue) >= self.maxsize:
+            if not self._make_room(event):
+                self.dropped += 1
+                logger.debug(f"Event queue full, dropped incoming partial: {event.get('start_time')}")
+                return
+        self._queue.append(event)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._not_empty.set()
+
+    @classmethod
+    def _covers(cls, event: Dict[str, Any], older: Dict[str, Any]) -> bool:
+        return (cls._droppable(older)
+                and event['start_time'] - cls.SUPERSEDE_TOLERANCE <= older['start_time']
+                and older['end_time'] <= event['end_time'] + cls.SUPERSEDE_TOLERANCE)
+
+    def _remove_superseded(self, event: Dict[str, Any]):
+        """移除时间范围被新结果覆盖、尚未发送的 partial"""
+        stale = [queued for queued in self._queue if self._covers(event, queued)]
+        for queued in stale:
+            self._queue.remove(queued)
+        self.superseded += len(stale)
+
+    def collapse(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """合并发送的一批事件中，去掉被批内更新结果覆盖的 partial"""
+        kept = []
+        for i, event in enumerate(events):
+            if any(later.get('type') == 'transcription' and self._covers(later, event) for later in events[i + 1:]):
+                self.superseded += 1
+                continue
+            kept.append(event)
+        return kept
+
+    def _make_room(self, event: Dict[str, Any]) -> bool:
+        """为新事件腾出位置，返回 False 表示丢弃新事件"""
+        if self.policy == 'drop_oldest_partial':
+            for queued in self._queue:
+                if self._droppable(queued):
+                    self._queue.remove(queued)
+                    self.dropped += 1
+                    return True
+        if self._droppable(event):
+            return False
+        # 定稿结果和错误事件不丢弃
+        self.overflow += 1
+        if self.overflow == 1:
+            logger.warning(f"Event queue exceeded {self.maxsize} with non-droppable events, client is not keeping up")
+        return True
+
+    async def get(self) -> Dict[str, Any]:
+        while not self._queue:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self._queue.popleft()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """不等待地取出当前所有事件"""
+        events = list(self._queue)
+        self._queue.clear()
+        return events
+
+    def qsize(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': len(self._queue),
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'overflow': self.overflow,
+            'superseded': self.superseded,
+        }
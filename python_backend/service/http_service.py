@@ -8,8 +8,14 @@ import os
 import asyncio
 from fastapi import UploadFile, Form, File, Body, Query, Path, Depends
 from fastapi.responses import JSONResponse
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
+from uuid import uuid4
 from .document_service import DocumentService
+from .rediarization import RediarizationService
+from .admission import AdmissionController, AdmissionRejected
+from .thread_budget import thread_budget
+from .model_loader import model_loader
+from .socket_service import SessionRequired
 
 logger = logging.getLogger(__name__)
 
@@ -21,28 +27,65 @@ class HttpService:
         self.document_service = DocumentService(base_path)
         # 文档处理状态存储
         self.document_tasks = {}
+        # 会后重新聚类
+        rediarization_config = config.speaker['rediarization']
+        self.rediarization_service = RediarizationService(
+            socket_service,
+            threshold=rediarization_config['threshold'],
+            min_duration=rediarization_config['min_duration']
+        )
+        self.rediarize_on_meeting_end = rediarization_config['on_meeting_end']
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 后台任务保留引用，避免任务在运行中被垃圾回收；结束时记录异常
+        self._background_tasks: Set[asyncio.Task] = set()
+        # 准入控制
+        admission_config = config.admission_config
+        self.document_admission = AdmissionController('documents', **admission_config['documents'])
+        self.analyze_admission = AdmissionController('analyze', **admission_config['analyze'])
         # 确保上传目录存在
         os.makedirs("uploads", exist_ok=True)
 
-    async def switch_meeting(self, meeting_id: int = Form(...)):
-        """切换会议"""
+    async def switch_meeting(self, meeting_id: int = Form(...), sid: Optional[str] = Form(None)):
+        """切换会议，sid 指定切换的会话，只有一个会话时可以不指定"""
         try:
-            logging.info(f"Switching to meeting ID: {meeting_id}")
-            
-            success = await self.socket_service.switch_meeting(meeting_id)
+            logging.info(f"Switching to meeting ID: {meeting_id}, session: {sid}")
+            success = await self.socket_service.switch_meeting(meeting_id, sid)
             if not success:
                 raise HTTPException(status_code=500, detail="Failed to switch meeting")
-                
+
             return {"success": True, "status": "success"}
             
+        except SessionRequired as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"Invalid meeting ID: {str(e)}")
         except Exception as e:
             logging.error(f"Error switching meeting: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    @staticmethod
+    def _acquire(admission: AdmissionController) -> float:
+        """申请准入，超限时返回 429 和 Retry-After"""
+        try:
+            return admission.acquire()
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Service overloaded: {e.reason}",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+
+    async def _process_document(self, doc_id: str, admitted_at: float):
+        """后台处理文档，完成后释放准入名额"""
+        try:
+            await self.document_service.process_document(doc_id)
+        finally:
+            self.document_admission.release(admitted_at)
+
     async def analyze_dialog(self, data: Dict[str, Any] = Body(...)):
         """分析对话内容"""
+        admitted_at = self._acquire(self.analyze_admission)
         try:
             messages = data.get('messages', [])
             
@@ -66,9 +109,13 @@ class HttpService:
                 
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"Invalid request: {str(e)}")
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error analyzing dialog: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            self.analyze_admission.release(admitted_at)
         
     async def upload_document(self, 
                             file: UploadFile = File(...),
@@ -78,6 +125,8 @@ class HttpService:
                             visibility: str = Form("private"),
                             meeting_id: Optional[int] = Form(None)):
         """上传文档"""
+        # 准入名额在后台向量化完成后释放
+        admitted_at = self._acquire(self.document_admission)
         try:
             # 读取文件内容
             file_content = await file.read()
@@ -97,7 +146,8 @@ class HttpService:
             )
             
             # 启动异步处理
-            asyncio.create_task(self.document_service.process_document(doc_info["doc_id"]))
+            self._spawn(self._process_document(doc_info["doc_id"], admitted_at), f"process document {doc_info['doc_id']}")
+            admitted_at = None
             
             return {
                 "success": True,
@@ -113,6 +163,9 @@ class HttpService:
         except Exception as e:
             logger.error(f"Error uploading document: {str(e)}")
             raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            if admitted_at is not None:
+                self.document_admission.release(admitted_at)
             
     async def get_document_status(self, doc_id: str = Path(...)):
         """获取文档处理状态"""
@@ -249,8 +302,204 @@ class HttpService:
             "results": results
         }
 
+    async def enroll_voiceprint(self,
+                              name: str = Form(...),
+                              speaker_id: Optional[int] = Form(None),
+                              file: Optional[UploadFile] = File(None),
+                              sid: Optional[str] = Form(None)):
+        """登记声纹：使用会话当前会议的说话人或上传的音频文件"""
+        try:
+            session = self.socket_service.get_session(sid)
+        except SessionRequired as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if session is None:
+            await self.socket_service.models.ensure('speaker')
+        speaker_detector = session.speaker_detector if session else self.socket_service.models.speaker
+        if speaker_detector.library is None:
+            raise HTTPException(status_code=400, detail="Voiceprint library is disabled")
+
+        file_path = None
+        try:
+            if file is not None:
+                tmp_dir = config.get('app.tmp_dir', 'tmp')
+                os.makedirs(tmp_dir, exist_ok=True)
+                file_path = os.path.join(tmp_dir, f"voiceprint_{uuid4().hex}{os.path.splitext(file.filename or '')[1] or '.wav'}")
+                with open(file_path, "wb") as f:
+                    f.write(await file.read())
+
+            voiceprint = await asyncio.get_event_loop().run_in_executor(
+                None, speaker_detector.enroll_voiceprint, name, speaker_id, file_path
+            )
+            return {
+                "success": True,
+                "voiceprint": voiceprint
+            }
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error enrolling voiceprint: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+
+    async def list_voiceprints(self):
+        """获取声纹列表"""
+        await self.socket_service.models.ensure('speaker')
+        library = self.socket_service.models.speaker.library
+        if library is None:
+            raise HTTPException(status_code=400, detail="Voiceprint library is disabled")
+        return {
+            "success": True,
+            "voiceprints": library.list()
+        }
+
+    async def delete_voiceprint(self, voiceprint_id: str = Path(...)):
+        """删除声纹"""
+        await self.socket_service.models.ensure('speaker')
+        library = self.socket_service.models.speaker.library
+        if library is None:
+            raise HTTPException(status_code=400, detail="Voiceprint library is disabled")
+        success = await asyncio.get_event_loop().run_in_executor(None, library.delete, voiceprint_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="Voiceprint not found")
+        return {
+            "success": True
+        }
+
+    async def start(self):
+        """在事件循环中启动：会后重新聚类挂到会议的最后一个会话离开时"""
+        self._loop = asyncio.get_running_loop()
+        if self.rediarize_on_meeting_end:
+            models = self.socket_service.models
+            models.on_meeting_end = self._on_meeting_end
+            if models.speaker is not None:
+                models.speaker.meetings.on_meeting_end = self._on_meeting_end
+
+    def _spawn(self, coro, name: str) -> asyncio.Task:
+        task = asyncio.create_task(coro, name=name)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task {task.get_name()} failed: {task.exception()}", exc_info=task.exception())
+
+    def _on_meeting_end(self, meeting_id: int):
+        """MeetingRegistry 在最后一个会话离开会议时调用（可能在线程池中），在事件循环中启动重新聚类"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(
+            lambda: self._spawn(self.rediarization_service.run(meeting_id), f"rediarize meeting {meeting_id}")
+        )
+
+    async def rediarize_meeting(self,
+                              meeting_id: int = Path(...),
+                              data: Optional[Dict[str, Any]] = Body(None)):
+        """对会议的所有片段重新聚类，修正说话人标签"""
+        data = data or {}
+        try:
+            result = await self.rediarization_service.run(
+                meeting_id,
+                utterances=data.get("utterances"),
+                threshold=data.get("threshold")
+            )
+            return {
+                "success": True,
+                **result
+            }
+        except Exception as e:
+            logger.error(f"Error rediarizing meeting {meeting_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def get_rediarization(self, meeting_id: int = Path(...)):
+        """获取上一次的重新聚类结果"""
+        result = self.rediarization_service.get_result(meeting_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Rediarization result not found")
+        return {
+            "success": True,
+            **result
+        }
+
+    async def get_asr_metrics(self):
+        """获取ASR排队与推理耗时统计"""
+        asr = self.socket_service.models.asr
+        return {
+            "success": True,
+            "metrics": asr.get_metrics() if asr is not None else None
+        }
+
+    async def healthz(self):
+        """存活检查，进程能响应即返回 200"""
+        return {"status": "ok"}
+
+    async def readyz(self):
+        """就绪检查：预加载的模型都加载完成时返回 200，否则 503，附各组件的加载状态"""
+        ready = model_loader.is_ready()
+        content = {
+            "ready": ready,
+            "components": model_loader.status()
+        }
+        return JSONResponse(status_code=200 if ready else 503, content=content)
+
+    async def get_sessions(self):
+        """获取各会话状态及出站事件队列统计"""
+        return {
+            "success": True,
+            "max_sessions": self.socket_service.max_sessions,
+            "sessions": self.socket_service.get_sessions_stats()
+        }
+
+    async def get_admission(self):
+        """获取各类请求的准入控制状态"""
+        return {
+            "success": True,
+            "admission": {
+                "sessions": self.socket_service.admission.stats(),
+                "documents": self.document_admission.stats(),
+                "analyze": self.analyze_admission.stats()
+            }
+        }
+
+    async def get_thread_layout(self):
+        """获取CPU线程预算的分配结果"""
+        return {
+            "success": True,
+            "threads": thread_budget.layout()
+        }
+
+    def _get_cluster(self):
+        cluster = self.socket_service.cluster
+        if cluster is None:
+            raise HTTPException(status_code=400, detail="Cluster mode is disabled")
+        return cluster
+
+    async def route_meeting(self, meeting_id: int = Query(...)):
+        """获取会议应连接的 worker（粘性路由）"""
+        worker = await self._get_cluster().route(meeting_id)
+        if worker is None:
+            raise HTTPException(status_code=503, detail="No available worker", headers={"Retry-After": "5"})
+        return {
+            "success": True,
+            "worker": worker
+        }
+
+    async def list_workers(self):
+        """获取在线的 worker 及负载"""
+        return {
+            "success": True,
+            "workers": await self._get_cluster().list_workers()
+        }
+
     def register_routes(self, app: FastAPI):
         """注册所有 HTTP 路由"""
+        # 健康检查
+        app.get("/healthz")(self.healthz)
+        app.get("/readyz")(self.readyz)
+
         # 会话管理
         app.post("/api/switch_meeting")(self.switch_meeting)
         app.post("/api/analyze_dialogue")(self.analyze_dialog)
@@ -262,4 +511,23 @@ class HttpService:
         app.get("/api/documents")(self.list_documents)
         app.patch("/api/documents/{doc_id}")(self.update_document)
         app.delete("/api/documents/{doc_id}")(self.delete_document)
-        app.post("/api/documents/query")(self.query_documents) 
\ No newline at end of file
+        app.post("/api/documents/query")(self.query_documents)
+
+        # 声纹库
+        app.post("/api/voiceprints")(self.enroll_voiceprint)
+        app.get("/api/voiceprints")(self.list_voiceprints)
+        app.delete("/api/voiceprints/{voiceprint_id}")(self.delete_voiceprint) 
+
+        # 会后重新聚类
+        app.post("/api/meetings/{meeting_id}/rediarize")(self.rediarize_meeting)
+        app.get("/api/meetings/{meeting_id}/rediarization")(self.get_rediarization)
+
+        # 运行状态
+        app.get("/api/asr/metrics")(self.get_asr_metrics)
+        app.get("/api/sessions")(self.get_sessions)
+        app.get("/api/admission")(self.get_admission)
+        app.get("/api/threads")(self.get_thread_layout)
+
+        # 多 worker 路由
+        app.get("/api/cluster/route")(self.route_meeting)
+        app.get("/api/cluster/workers")(self.list_workers)
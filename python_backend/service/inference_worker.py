@@ -0,0 +1,379 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+import itertools
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from .stt_base import MySpeechData
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRing:
+    """共享内存中的定长音频槽
+
+    主进程写入片段音频，请求里只传槽号、dtype 和采样数，worker 进程直接在共享内存上读取，
+    避免 pickle 整段音频。槽在结果返回后才释放，worker 处理期间可以直接使用视图而不复制。
+    """
+
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+
+    def write(self, slot: int, samples: np.ndarray):
+        data = np.ascontiguousarray(samples)
+        offset = slot * self.slot_bytes
+        self.shm.buf[offset:offset + data.nbytes] = data.view(np.uint8).reshape(-1)
+
+    def view(self, slot: int, dtype: str, count: int) -> np.ndarray:
+        return np.frombuffer(self.shm.buf, dtype=np.dtype(dtype), count=count, offset=slot * self.slot_bytes)
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有 view 引用共享内存，随进程退出释放
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def _read_audio(ring: AudioRing, audio) -> np.ndarray:
+    """audio 为 ('slot', 槽号, dtype, 采样数) 或直接传递的 ndarray"""
+    if isinstance(audio, tuple):
+        _, slot, dtype, count = audio
+        return ring.view(slot, dtype, count)
+    return audio
+
+
+def _worker_main(index: int, ring_name: str, slots: int, slot_bytes: int,
+                 requests: mp.Queue, results: mp.Queue, load_asr: bool, load_speaker: bool):
+    """推理 worker 进程入口：加载模型，在自己的事件循环里并发处理请求（ASR 仍可批量推理）"""
+    from config.config_manager import config
+    from .audio_processor import ModelPool
+    from .speaker import Speaker
+    from .thread_budget import thread_budget
+
+    logging.basicConfig(level=config.get('logging.level', 'INFO'),
+                        format=f'%(asctime)s - inference-{index} - %(levelname)s - %(message)s')
+    ring = AudioRing(slots, slot_bytes, name=ring_name)
+    thread_budget.apply_torch()
+    asr = ModelPool.create_asr() if load_asr else None
+    speaker = Speaker() if load_speaker else None
+    for name, model in (('asr', asr), ('speaker', speaker)):
+        if model is not None:
+            ModelPool.warm_up(name, model)
+    results.put(('ready', index, None))
+
+    async def handle(request: tuple):
+        kind, request_id, audio, params = request
+        try:
+            samples = _read_audio(ring, audio)
+            if kind == 'asr':
+                result = await asr.recognize_array(samples, params['sample_rate'], language=params['language'],
+                                                   output_timestamp=params['output_timestamp'])
+                payload = (result.text, [list(ts) for ts in result.timestamp])
+            elif kind == 'embedding':
+                payload = await asyncio.get_event_loop().run_in_executor(
+                    speaker.executor, speaker.get_embedding_from_buffer, samples, params['sample_rate'])
+            elif kind == 'window_embeddings':
+                payload = await asyncio.get_event_loop().run_in_executor(
+                    speaker.executor, speaker.get_window_embeddings, samples, params['sample_rate'], params['window'], params['hop'])
+            else:
+                raise ValueError(f"Unknown request: {kind}")
+            results.put(('result', request_id, payload))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Inference request {kind} failed: {str(e)}", exc_info=True)
+            results.put(('error', request_id, str(e)))
+
+    async def serve():
+        loop = asyncio.get_event_loop()
+        tasks = set()
+        while True:
+            request = await loop.run_in_executor(None, requests.get)
+            if request is None:
+                break
+            task = asyncio.create_task(handle(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        asyncio.run(serve())
+    finally:
+        if asr is not None:
+            asr.close()
+        ring.close()
+
+
+class InferenceProcessPool:
+    """独立进程中的模型推理（ASR、说话人embedding）
+
+    推理前后处理不再与 socket/HTTP 事件循环争用 GIL。片段音频写入共享内存槽后只传递槽号，
+    结果通过 multiprocessing 队列返回，由后台线程分发给等待的协程或线程。
+    槽用尽或片段超出槽大小时退化为直接传递数组（计入 inline）。
+
+    worker 进程意外退出（OOM、推理库崩溃）时，结果线程在 health_check_interval 内发现，
+    让该进程未完成的请求失败并归还其共享内存槽，然后重启进程；重启超过 max_restarts 次后不再向其分发请求。
+
+    提供与 SenseVoiceSTT 相同的 recognize_array / get_metrics / close 接口，可直接替换。
+    """
+
+    def __init__(self, processes: int = 1, slots: int = 16, max_segment_duration: float = 60.0,
+                 sample_rate: int = 16000, load_asr: bool = True, load_speaker: bool = True,
+                 start_timeout: float = 600.0, health_check_interval: float = 1.0, max_restarts: int = 3):
+        self.sample_rate = sample_rate
+        self.health_check_interval = health_check_interval
+        self.max_restarts = max_restarts
+        # 槽按 float32 计算大小，int16 音频可以放下两倍时长
+        self.ring = AudioRing(slots, int(max_segment_duration * sample_rate) * 4)
+        self._free_slots: "queue.SimpleQueue[int]" = queue.SimpleQueue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+
+        self._context = mp.get_context('spawn')
+        self._results = self._context.Queue()
+        self._load_asr = load_asr
+        self._load_speaker = load_speaker
+        self._closing = False
+        self._request_queues: List[Any] = [None] * processes
+        # 退出后不再重启的 worker 为 None
+        self._processes: List[Optional[mp.Process]] = [None] * processes
+        # 加载完成、可以分发请求的 worker
+        self._ready = [False] * processes
+        self._restarts = [0] * processes
+        for index in range(processes):
+            self._start_worker(index)
+
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        # request_id -> (Future, 槽号, worker序号)
+        self._pending: Dict[int, Tuple[Future, Optional[int], int]] = {}
+        self._process_load = [0] * processes
+        self._metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'inline': 0,
+            'worker_exits': 0,
+            'roundtrip_total': 0.0,
+        }
+
+        self._wait_ready(processes, start_timeout)
+        self._reader = threading.Thread(target=self._read_results, name="inference-results", daemon=True)
+        self._reader.start()
+        logger.info(f"Inference process pool started: {processes} processes, {slots} slots of "
+                    f"{max_segment_duration:.0f}s, asr={load_asr}, speaker={load_speaker}")
+
+    def _start_worker(self, index: int):
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.ring.name, self.ring.slots, self.ring.slot_bytes, requests, self._results,
+                  self._load_asr, self._load_speaker),
+            name=f"inference-{index}",
+            daemon=True
+        )
+        process.start()
+        self._request_queues[index] = requests
+        self._processes[index] = process
+
+    def _wait_ready(self, processes: int, timeout: float):
+        deadline = time.time() + timeout
+        ready = 0
+        while ready < processes:
+            try:
+                message, index, _ = self._results.get(timeout=max(0.1, deadline - time.time()))
+            except queue.Empty:
+                raise RuntimeError("Inference worker processes failed to start in time")
+            if message == 'ready':
+                ready += 1
+                self._ready[index] = True
+                logger.info(f"Inference worker {index} ready")
+
+    def _read_results(self):
+        next_check = time.monotonic() + self.health_check_interval
+        while True:
+            # 持续有结果时 get 不会超时，按时间间隔检查
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.health_check_interval
+            try:
+                message, request_id, payload = self._results.get(timeout=self.health_check_interval)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if message == 'stop':
+                return
+            if message == 'ready':
+                with self._lock:
+                    self._ready[request_id] = True
+                logger.info(f"Inference worker {request_id} ready")
+                continue
+            with self._lock:
+                entry = self._pending.pop(request_id, None)
+                if entry is None:
+                    continue
+                future, slot, worker = entry
+                self._process_load[worker] -= 1
+                self._metrics['completed' if message == 'result' else 'failed'] += 1
+            if slot is not None:
+                self._free_slots.put(slot)
+            if message == 'result':
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _check_workers(self):
+        """处理意外退出的 worker：未完成的请求失败并归还槽，重启进程或停止向其分发请求"""
+        for index, process in enumerate(self._processes):
+            if process is None or process.is_alive() or self._closing:
+                continue
+            process.join(timeout=0)
+            with self._lock:
+                self._ready[index] = False
+                lost = [request_id for request_id, entry in self._pending.items() if entry[2] == index]
+                entries = [self._pending.pop(request_id) for request_id in lost]
+                self._process_load[index] = 0
+                self._metrics['failed'] += len(entries)
+                self._metrics['worker_exits'] += 1
+            logger.error(f"Inference worker {index} exited with code {process.exitcode}, "
+                         f"failing {len(entries)} pending requests")
+            error = RuntimeError(f"Inference worker {index} exited with code {process.exitcode}")
+            for future, slot, _ in entries:
+                if slot is not None:
+                    self._free_slots.put(slot)
+                future.set_exception(error)
+
+            if self._restarts[index] < self.max_restarts:
+                self._restarts[index] += 1
+                logger.warning(f"Restarting inference worker {index} ({self._restarts[index]}/{self.max_restarts})")
+                self._start_worker(index)
+            else:
+                self._processes[index] = None
+                logger.error(f"Inference worker {index} exceeded {self.max_restarts} restarts, no longer used")
+
+    def _submit(self, kind: str, samples: np.ndarray, params: Dict[str, Any]) -> Future:
+        samples = np.asarray(samples)
+        slot = None
+        audio: Any = samples
+        if samples.nbytes <= self.ring.slot_bytes:
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                slot = None
+        if slot is not None:
+            self.ring.write(slot, samples)
+            audio = ('slot', slot, samples.dtype.str, len(samples))
+
+        future: Future = Future()
+        # 已提交的请求不能取消（等待方被取消时结果直接丢弃），保证槽和负载计数正确释放
+        future.set_running_or_notify_cancel()
+        submit_time = time.perf_counter()
+        with self._lock:
+            workers = [index for index, ready in enumerate(self._ready) if ready]
+            if workers:
+                request_id = next(self._ids)
+                worker = min(workers, key=self._process_load.__getitem__)
+                self._process_load[worker] += 1
+                self._pending[request_id] = (future, slot, worker)
+                # 在锁内取队列：worker 重启后旧队列上的请求已随退出处理失败
+                requests = self._request_queues[worker]
+                self._metrics['submitted'] += 1
+                if slot is None:
+                    self._metrics['inline'] += 1
+        if not workers:
+            if slot is not None:
+                self._free_slots.put(slot)
+            future.set_exception(RuntimeError("No inference worker available"))
+            return future
+
+        def record(_):
+            with self._lock:
+                self._metrics['roundtrip_total'] += time.perf_counter() - submit_time
+        future.add_done_callback(record)
+
+        requests.put((kind, request_id, audio, params))
+        return future
+
+    async def recognize_array(self, samples: np.ndarray, sample_rate: int = 16000, *,
+                              language: Optional[str] = None, output_timestamp: bool = True) -> MySpeechData:
+        duration = len(samples) / sample_rate
+        now = time.time()
+        speech_data = MySpeechData(language=language or "zh", text='', start_time=now - duration, end_time=now)
+        try:
+            text, timestamp = await asyncio.wrap_future(self._submit('asr', samples, {
+                'sample_rate': sample_rate,
+                'language': language,
+                'output_timestamp': output_timestamp
+            }))
+            speech_data.text = text
+            if timestamp:
+                speech_data.timestamp = timestamp
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Remote recognize failed: {str(e)}")
+        return speech_data
+
+    async def get_embedding(self, samples: np.ndarray, sample_rate: int) -> Optional[np.ndarray]:
+        return await asyncio.wrap_future(self._submit('embedding', samples, {'sample_rate': sample_rate}))
+
+    def get_embedding_blocking(self, samples: np.ndarray, sample_rate: int) -> Optional[np.ndarray]:
+        """供线程池中的同步代码调用"""
+        return self._submit('embedding', samples, {'sample_rate': sample_rate}).result()
+
+    async def get_window_embeddings(self, samples: np.ndarray, sample_rate: int,
+                                    window: float, hop: float) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        return await asyncio.wrap_future(self._submit('window_embeddings', samples, {
+            'sample_rate': sample_rate,
+            'window': window,
+            'hop': hop
+        }))
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['pending'] = len(self._pending)
+            metrics['process_load'] = list(self._process_load)
+            metrics['process_ready'] = list(self._ready)
+            metrics['process_restarts'] = list(self._restarts)
+        finished = metrics['completed'] + metrics['failed']
+        metrics['roundtrip_avg'] = metrics['roundtrip_total'] / finished if finished else 0.0
+        metrics['mode'] = 'process'
+        return metrics
+
+    def close(self):
+        self._closing = True
+        for requests in self._request_queues:
+            requests.put(None)
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(('stop', None, None))
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, _, _ in pending:
+            future.set_exception(RuntimeError("Inference process pool closed"))
+        self.ring.close()
+        logger.info(f"Inference process pool closed, metrics: {self.get_metrics()}")
@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from config.config_manager import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelComponent:
+    name: str
+    load_fn: Callable[[], Any]
+    preload: bool
+    state: str = 'pending'  # pending / lazy / loading / ready / failed
+    error: Optional[str] = None
+    load_time: Optional[float] = None
+    future: Future = field(default_factory=Future)
+
+
+class ModelLoader:
+    """模型的后台加载与状态跟踪
+
+    各组件注册加载函数，start 时在各自的后台线程中并行加载（startup.parallel 为 false 时在一个后台线程中依次加载），
+    服务在加载期间即可响应，冷启动时间约等于最慢的模型而不是全部之和。
+    startup.preload 中关闭的组件为 lazy，首次 ensure / result 时才加载，不影响就绪状态。
+    加载函数可以调用 result(name) 等待依赖的组件。
+    """
+
+    PENDING = 'pending'
+    LAZY = 'lazy'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, parallel: Optional[bool] = None):
+        self.parallel = config.startup_config['parallel'] if parallel is None else parallel
+        self._lock = threading.Lock()
+        self._components: Dict[str, ModelComponent] = {}
+        self.started_at: Optional[float] = None
+
+    def register(self, name: str, load_fn: Callable[[], Any], preload: bool = True):
+        if name in self._components:
+            raise ValueError(f"Model component already registered: {name}")
+        self._components[name] = ModelComponent(name, load_fn, preload, self.PENDING if preload else self.LAZY)
+
+    def start(self):
+        """开始在后台加载所有预加载的组件"""
+        self.started_at = time.perf_counter()
+        components = [c for c in self._components.values() if c.preload]
+        logger.info(f"Loading models in background: {[c.name for c in components]}, parallel: {self.parallel}, "
+                    f"lazy: {[c.name for c in self._components.values() if not c.preload]}")
+        if self.parallel:
+            for component in components:
+                self._spawn(component)
+        else:
+            threading.Thread(target=lambda: [self._run(c) for c in components], name="model-loader", daemon=True).start()
+
+    def _spawn(self, component: ModelComponent):
+        threading.Thread(target=self._run, args=(component,), name=f"load-{component.name}", daemon=True).start()
+
+    def _begin(self, component: ModelComponent) -> bool:
+        """把组件标记为加载中，已经开始加载的返回 False，保证每个组件只加载一次"""
+        with self._lock:
+            if component.state not in (self.PENDING, self.LAZY):
+                return False
+            component.state = self.LOADING
+            return True
+
+    def _run(self, component: ModelComponent):
+        if not self._begin(component):
+            return
+        start = time.perf_counter()
+        logger.info(f"Loading model component: {component.name}")
+        try:
+            value = component.load_fn()
+        except BaseException as e:
+            # 部分模型加载失败时直接 exit()，在后台线程中表现为 SystemExit
+            component.error = str(e) if isinstance(e, Exception) and str(e) else type(e).__name__
+            component.state = self.FAILED
+            logger.error(f"Failed to load model component {component.name}: {component.error}", exc_info=True)
+            component.future.set_exception(e if isinstance(e, Exception) else RuntimeError(component.error))
+            return
+        component.load_time = time.perf_counter() - start
+        component.state = self.READY
+        component.future.set_result(value)
+        logger.info(f"Model component {component.name} loaded in {component.load_time:.1f}s")
+        if component.preload and self.started_at is not None and self.is_ready():
+            logger.info(f"All models loaded, cold start: {time.perf_counter() - self.started_at:.1f}s")
+
+    def load(self, name: str) -> Future:
+        """返回组件的加载结果，尚未开始加载（lazy，或未调用 start）时立即在后台线程中加载"""
+        component = self._components[name]
+        if component.state in (self.PENDING, self.LAZY):
+            self._spawn(component)
+        return component.future
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """阻塞等待组件加载完成，供加载线程和同步代码使用"""
+        return self.load(name).result(timeout)
+
+    async def get(self, name: str) -> Any:
+        """等待组件加载完成并返回加载结果"""
+        return await asyncio.wrap_future(self.load(name))
+
+    async def ensure(self, *names: str):
+        await asyncio.gather(*(self.get(name) for name in names))
+
+    def state(self, name: str) -> str:
+        return self._components[name].state
+
+    def is_ready(self, *names: str) -> bool:
+        """指定组件（不指定时为所有预加载组件）是否都已加载"""
+        if names:
+            return all(self._components[name].state == self.READY for name in names)
+        return all(c.state == self.READY for c in self._components.values() if c.preload)
+
+    def is_available(self, name: str) -> bool:
+        """已加载，或为 lazy 组件可以在使用时加载"""
+        component = self._components.get(name)
+        return component is not None and component.state in (self.READY, self.LAZY)
+
+    def has_failed(self, *names: str) -> bool:
+        return any(self._components[name].state == self.FAILED for name in names or self._components)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                'state': c.state,
+                'preload': c.preload,
+                'load_time': round(c.load_time, 3) if c.load_time is not None else None,
+                'error': c.error,
+            }
+            for name, c in self._components.items()
+        }
+
+
+# 进程内共享的模型加载器，ModelPool 和 DocumentService 在其中注册组件
+model_loader = ModelLoader()
@@ -0,0 +1,203 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+from config.config_manager import config
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+VERIFIED_NAME = '.verified.json'
+MANIFEST_VERSION = 1
+
+# 模型名 -> 联网时的来源，tools/model_registry.py fetch 按此下载
+MODEL_SOURCES = {
+    'silero_vad': 'torch.hub:snakers4/silero-vad',         # torch hub 仓库目录（ONNX 版 VAD）
+    'silero_vad_jit': 'torch.hub:snakers4/silero-vad/silero_vad.jit',
+    'campplus': 'huggingface:funasr/campplus/campplus_cn_common.bin',
+    'sense_voice': 'modelscope:iic/SenseVoiceSmall',
+    'bge_m3': 'huggingface:BAAI/bge-m3',
+}
+
+
+class ModelIntegrityError(Exception):
+    """本地模型缺失或校验和不匹配"""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """本地模型目录（离线部署）
+
+    目录下的 manifest.json 记录每个模型的相对路径和每个文件的 sha256：
+        {"version": 1, "models": {"campplus": {"path": "campplus/campplus_cn_common.bin", "source": "...",
+                                                "files": {"campplus_cn_common.bin": "<sha256>"}}}}
+    模型可以是单个文件或目录，目录的 files 记录目录内所有文件。可用 python -m tools.model_registry fetch 生成。
+
+    - resolve 返回模型的本地路径，目录中没有该模型时返回 None，调用方按原来的方式联网加载；
+      offline 时不允许联网，缺失直接报错
+    - verify 时首次使用前校验 sha256，文件大小和修改时间未变时复用上次的校验结果（记录在 .verified.json），
+      大模型不必每次启动都重新计算
+    - mmap 时 torch 权重以内存映射方式加载，多进程共享页缓存、不额外复制
+    """
+
+    def __init__(self, path: str, offline: bool = False, verify: bool = True, mmap: bool = True):
+        self.path = path
+        self.offline = offline
+        self.verify = verify
+        self.mmap = mmap
+        self._lock = threading.Lock()
+        self._verified_entries = set()
+        self.models: Dict[str, Dict[str, Any]] = {}
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != MANIFEST_VERSION:
+                raise ModelIntegrityError(f"Unsupported model manifest version: {manifest.get('version')}")
+            self.models = manifest.get('models', {})
+        self._stamps = self._load_stamps()
+
+    def apply_environment(self):
+        """离线模式下禁止 huggingface / transformers 联网，必须在导入它们之前调用"""
+        if self.offline:
+            os.environ.setdefault('HF_HUB_OFFLINE', '1')
+            os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+    def _load_stamps(self) -> Dict[str, list]:
+        stamps_path = os.path.join(self.path, VERIFIED_NAME)
+        if not os.path.exists(stamps_path):
+            return {}
+        try:
+            with open(stamps_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_stamps(self):
+        try:
+            with open(os.path.join(self.path, VERIFIED_NAME), 'w', encoding='utf-8') as f:
+                json.dump(self._stamps, f)
+        except OSError as e:
+            logger.warning(f"Failed to save model verification cache: {str(e)}")
+
+    def _entry_root(self, entry: Dict[str, Any]) -> str:
+        """目录模型的文件相对目录本身，单文件模型相对其所在目录"""
+        root = os.path.join(self.path, entry['path'])
+        return root if os.path.isdir(root) else os.path.dirname(root)
+
+    def resolve(self, name: str, fallback: Optional[str] = None) -> Optional[str]:
+        """返回模型的本地路径，不在目录中时返回存在的 fallback 或 None（offline 时抛出 ModelIntegrityError）
+
+        Args:
+            fallback: manifest 之外已有的本地路径（不校验）
+        """
+        entry = self.models.get(name)
+        local_path = os.path.join(self.path, entry['path']) if entry else None
+        if local_path is None or not os.path.exists(local_path):
+            if fallback is not None and os.path.exists(fallback):
+                return fallback
+            if self.offline:
+                raise ModelIntegrityError(f"Model {name} not found in registry {self.path} (offline mode)")
+            return None
+        if self.verify:
+            self.verify_model(name)
+        logger.info(f"Using local model {name}: {local_path}")
+        return local_path
+
+    def verify_model(self, name: str, use_cache: bool = True):
+        """校验模型的所有文件，不匹配时抛出 ModelIntegrityError
+
+        Args:
+            use_cache: 为 False 时忽略上次的校验结果，重新计算所有文件的 sha256
+        """
+        if use_cache and name in self._verified_entries:
+            return
+        entry = self.models[name]
+        root = self._entry_root(entry)
+        for relative, expected in entry['files'].items():
+            file_path = os.path.join(root, relative)
+            if not os.path.exists(file_path):
+                raise ModelIntegrityError(f"Model {name} is missing file {relative}")
+            stat = os.stat(file_path)
+            key = os.path.relpath(file_path, self.path)
+            with self._lock:
+                stamp = self._stamps.get(key)
+            if use_cache and stamp == [stat.st_size, stat.st_mtime_ns, expected]:
+                continue
+            actual = _sha256(file_path)
+            if actual != expected:
+                raise ModelIntegrityError(f"Checksum mismatch for model {name} file {relative}")
+            with self._lock:
+                self._stamps[key] = [stat.st_size, stat.st_mtime_ns, expected]
+                self._save_stamps()
+        self._verified_entries.add(name)
+
+    def add(self, name: str, source_path: str, source: Optional[str] = None) -> Dict[str, Any]:
+        """把文件或目录复制到模型目录，计算校验和并写入 manifest"""
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.isdir(source_path):
+            target = os.path.join(self.path, name)
+            # HuggingFace 缓存中的文件是符号链接，复制实际内容
+            shutil.copytree(source_path, target, dirs_exist_ok=True, ignore=shutil.ignore_patterns('.git', '__pycache__'))
+            root = target
+            files = sorted(
+                os.path.relpath(os.path.join(directory, filename), root)
+                for directory, _, filenames in os.walk(root) for filename in filenames
+            )
+        else:
+            target = os.path.join(self.path, name, os.path.basename(source_path))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source_path, target)
+            root = os.path.dirname(target)
+            files = [os.path.basename(target)]
+        entry = {
+            'path': os.path.relpath(target, self.path),
+            'source': source or MODEL_SOURCES.get(name, ''),
+            'files': {relative: _sha256(os.path.join(root, relative)) for relative in files},
+        }
+        self.models[name] = entry
+        self._verified_entries.discard(name)
+        self.save_manifest()
+        return entry
+
+    def save_manifest(self):
+        with open(os.path.join(self.path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'models': self.models}, f, ensure_ascii=False, indent=2)
+
+    def torch_load(self, path: str):
+        """加载 torch 权重，mmap 时以内存映射方式加载（需要 zip 格式的权重文件，旧格式退回普通加载）"""
+        import torch
+        if self.mmap:
+            try:
+                return torch.load(path, map_location='cpu', mmap=True)
+            except (RuntimeError, TypeError) as e:
+                logger.debug(f"mmap load not supported for {path}, falling back: {str(e)}")
+        return torch.load(path, map_location='cpu')
+
+
+def warmup_audio(duration: float, sample_rate: int = 16000) -> np.ndarray:
+    """预热推理用的低幅度噪声（int16），全零输入可能走不到与真实音频相同的计算路径"""
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(int(duration * sample_rate)) * 300).astype(np.int16)
+
+
+_registry_config = config.models_config['registry']
+model_registry = ModelRegistry(
+    _registry_config['path'],
+    offline=_registry_config['offline'],
+    verify=_registry_config['verify'],
+    mmap=_registry_config['mmap']
+)
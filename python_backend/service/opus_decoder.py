@@ -0,0 +1,139 @@
+import time
+import logging
+import numpy as np
+import opuslib
+from typing import Optional, List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class OpusStreamDecoder:
+    """会话的 Opus 流式解码器
+
+    逐包解码为 int16 PCM，累计到 batch_duration 后整批交给 AudioBuffer，减少小帧写入和VAD调用。
+    丢包时用 Opus 的 PLC 补出对应时长的音频，保证采样数与真实经过的时间一致、时间戳不漂移；
+    超过 max_conceal 的长时间断流直接补静音。迟到或重复的包直接丢弃。
+    """
+
+    # Opus 单次解码的最大时长 120ms
+    MAX_FRAME_DURATION = 0.12
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1,
+                 batch_duration: float = 0.1, max_conceal: float = 1.0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.batch_samples = int(batch_duration * sample_rate)
+        self.max_conceal_samples = int(max_conceal * sample_rate)
+        self.max_frame_samples = int(self.MAX_FRAME_DURATION * sample_rate)
+        self._decoder = opuslib.Decoder(sample_rate, channels)
+        self._pending: List[np.ndarray] = []
+        self._pending_samples = 0
+        self.expected_seq: Optional[int] = None
+        self.last_frame_samples = int(0.02 * sample_rate)
+        self.last_timestamp: Optional[float] = None
+
+        self.packets = 0
+        self.lost_packets = 0
+        self.late_packets = 0
+        self.decode_errors = 0
+        self.decoded_samples = 0
+        self.concealed_samples = 0
+        self.decode_cpu = 0.0
+
+    def reset(self):
+        """音频流结束，下一次推流重新开始计数"""
+        self._decoder.reset_state()
+        self._pending = []
+        self._pending_samples = 0
+        self.expected_seq = None
+        self.last_timestamp = None
+
+    def decode(self, packet: bytes, seq: Optional[int] = None, lost_samples: int = 0) -> int:
+        """解码一个 Opus 包
+
+        Args:
+            packet: Opus 包
+            seq: 包序号，用于检测丢包（socket.io 通道）
+            lost_samples: 本包之前丢失的采样数（二进制通道由采样时钟算出）
+
+        Returns:
+            本包解码出的采样数（不含补偿的部分），迟到/重复包返回 -1
+        """
+        if seq is not None:
+            if self.expected_seq is not None:
+                if seq < self.expected_seq:
+                    self.late_packets += 1
+                    return -1
+                if seq > self.expected_seq:
+                    self.lost_packets += seq - self.expected_seq
+                    lost_samples = (seq - self.expected_seq) * self.last_frame_samples
+            self.expected_seq = seq + 1
+
+        start = time.thread_time()
+        try:
+            if lost_samples > 0:
+                self._conceal(lost_samples)
+            try:
+                pcm = self._decoder.decode(packet, self.max_frame_samples)
+            except opuslib.OpusError as e:
+                # 损坏的包按丢失处理
+                self.decode_errors += 1
+                logger.debug(f"Opus decode error: {str(e)}")
+                self._conceal(self.last_frame_samples)
+                return self.last_frame_samples
+            samples = np.frombuffer(pcm, dtype=np.int16)
+            if self.channels > 1:
+                samples = samples.reshape(-1, self.channels).mean(axis=1).astype(np.int16)
+            self._append(samples)
+            self.packets += 1
+            self.last_frame_samples = len(samples)
+            self.decoded_samples += len(samples)
+            return len(samples)
+        finally:
+            self.decode_cpu += time.thread_time() - start
+
+    def _conceal(self, lost_samples: int):
+        """补偿丢失的音频：PLC 按 Opus 帧长逐段生成，过长的断流补静音"""
+        self.concealed_samples += lost_samples
+        if lost_samples > self.max_conceal_samples:
+            self._append(np.zeros(lost_samples, dtype=np.int16))
+            return
+        # PLC 的帧长必须是 2.5ms 的整数倍，余数补静音
+        step = int(0.0025 * self.sample_rate)
+        remaining = lost_samples
+        while remaining >= step:
+            frame_size = min(remaining, self.max_frame_samples) // step * step
+            pcm = self._decoder.decode(b'', frame_size)
+            samples = np.frombuffer(pcm, dtype=np.int16)
+            if self.channels > 1:
+                samples = samples.reshape(-1, self.channels).mean(axis=1).astype(np.int16)
+            self._append(samples)
+            remaining -= frame_size
+        if remaining:
+            self._append(np.zeros(remaining, dtype=np.int16))
+
+    def _append(self, samples: np.ndarray):
+        self._pending.append(samples)
+        self._pending_samples += len(samples)
+
+    def take_batch(self, force: bool = False) -> Optional[np.ndarray]:
+        """累计达到批大小（或 force）时取出待写入的 PCM"""
+        if not self._pending_samples or (not force and self._pending_samples < self.batch_samples):
+            return None
+        batch = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._pending = []
+        self._pending_samples = 0
+        return batch
+
+    def stats(self) -> Dict[str, Any]:
+        decoded_duration = self.decoded_samples / self.sample_rate
+        return {
+            'packets': self.packets,
+            'lost_packets': self.lost_packets,
+            'late_packets': self.late_packets,
+            'decode_errors': self.decode_errors,
+            'decoded_duration': decoded_duration,
+            'concealed_duration': self.concealed_samples / self.sample_rate,
+            'decode_cpu': self.decode_cpu,
+            'decode_rtf': self.decode_cpu / decoded_duration if decoded_duration else 0.0,
+        }
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Any
+from scipy.cluster.hierarchy import linkage, fcluster
+
+from .speaker_storage import SegmentLog
+
+logger = logging.getLogger(__name__)
+
+
+def cluster_embeddings(embeddings: np.ndarray, durations: np.ndarray, threshold: float,
+                       min_duration: float = 1.0) -> np.ndarray:
+    """对片段embedding做平均连接的层次聚类
+
+    短片段的embedding噪声较大，只用时长不小于 min_duration 的片段聚类，
+    其余片段分配到最近的聚类中心。
+
+    Returns:
+        每个片段的聚类标签（从0开始）
+    """
+    n = len(embeddings)
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    normed = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-8)
+
+    core = np.flatnonzero(durations >= min_duration)
+    if len(core) < 2:
+        core = np.arange(n)
+    if len(core) == 1:
+        return np.zeros(n, dtype=np.int32)
+
+    tree = linkage(normed[core], method='average', metric='cosine')
+    core_labels = fcluster(tree, t=threshold, criterion='distance') - 1
+
+    # 计算聚类中心并为所有片段分配最近的中心
+    n_clusters = int(core_labels.max()) + 1
+    centroids = np.zeros((n_clusters, normed.shape[1]), dtype=np.float64)
+    np.add.at(centroids, core_labels, normed[core] * durations[core, None])
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-8)
+
+    labels = np.argmax(normed @ centroids.T, axis=1).astype(np.int32)
+    labels[core] = core_labels
+    return labels
+
+
+def build_relabel_map(speaker_ids: np.ndarray, labels: np.ndarray, durations: np.ndarray):
+    """根据聚类结果生成说话人ID映射
+
+    每个聚类以其中总时长最长的原说话人ID作为新ID；
+    每个原说话人映射到其大部分时长所在聚类的新ID。
+
+    Returns:
+        (relabel_map, new_ids): {原ID: 新ID} 以及每个片段的新ID
+    """
+    cluster_ids = {}
+    for label in np.unique(labels):
+        mask = labels == label
+        ids, inverse = np.unique(speaker_ids[mask], return_inverse=True)
+        totals = np.bincount(inverse, weights=durations[mask])
+        cluster_ids[int(label)] = int(ids[np.argmax(totals)])
+
+    new_ids = np.array([cluster_ids[int(label)] for label in labels], dtype=np.int32)
+
+    relabel_map = {}
+    for speaker_id in np.unique(speaker_ids):
+        mask = speaker_ids == speaker_id
+        ids, inverse = np.unique(new_ids[mask], return_inverse=True)
+        totals = np.bincount(inverse, weights=durations[mask])
+        relabel_map[int(speaker_id)] = int(ids[np.argmax(totals)])
+    return relabel_map, new_ids
+
+
+def relabel_utterances(utterances: List[Dict[str, Any]], starts: np.ndarray, ends: np.ndarray,
+                       new_ids: np.ndarray, relabel_map: Dict[int, int]) -> List[Dict[str, Any]]:
+    """按时间重叠为转写结果分配修正后的说话人ID"""
+    corrected = []
+    for utterance in utterances:
+        start = float(utterance['start_time'])
+        end = float(utterance['end_time'])
+        overlaps = np.minimum(ends, end) - np.maximum(starts, start)
+        if len(overlaps) and overlaps.max() > 0:
+            speaker_id = int(new_ids[np.argmax(overlaps)])
+        else:
+            try:
+                old_id = int(utterance.get('speaker_id'))
+                speaker_id = relabel_map.get(old_id, old_id)
+            except (TypeError, ValueError):
+                speaker_id = utterance.get('speaker_id')
+        corrected.append({**utterance, 'speaker_id': speaker_id})
+    return corrected
+
+
+def run_rediarization(segment_log_path: str, threshold: float, min_duration: float,
+                      utterances: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """重新聚类一个会议的所有片段（在独立进程中运行）"""
+    start_time = time.time()
+    records = SegmentLog.read(segment_log_path)
+    if records is None or len(records) == 0:
+        return {
+            'segment_count': 0,
+            'relabel_map': {},
+            'segments': [],
+            'utterances': utterances or []
+        }
+
+    starts = records['start']
+    ends = records['end']
+    durations = ends - starts
+    speaker_ids = records['speaker_id']
+    labels = cluster_embeddings(records['embedding'], durations, threshold, min_duration)
+    relabel_map, new_ids = build_relabel_map(speaker_ids, labels, durations)
+
+    result = {
+        'segment_count': len(records),
+        'speaker_count_before': int(len(np.unique(speaker_ids))),
+        'speaker_count_after': int(len(np.unique(new_ids))),
+        'relabel_map': {str(k): v for k, v in relabel_map.items()},
+        'segments': [
+            {
+                'start_time': float(starts[i]),
+                'end_time': float(ends[i]),
+                'speaker_id': int(speaker_ids[i]),
+                'new_speaker_id': int(new_ids[i])
+            }
+            for i in range(len(records))
+        ],
+        'utterances': relabel_utterances(utterances or [], starts, ends, new_ids, relabel_map),
+        'elapsed': time.time() - start_time
+    }
+    return result
+
+
+class RediarizationService:
+    """会后批量重新聚类任务
+
+    每个任务在独立的低优先级 Python 进程中运行（python -m service.rediarization），
+    不加载任何模型，也不与实时会话争用事件循环和 GIL。
+    """
+
+    def __init__(self, meetings, threshold: float = 0.45, min_duration: float = 1.0,
+                 result_dir: str = "data", max_workers: int = 1):
+        self.meetings = meetings  # 提供 flush_meeting / get_segment_log_path，即 SocketService
+        self.threshold = threshold
+        self.min_duration = min_duration
+        self.result_dir = result_dir
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    def _result_path(self, meeting_id: int) -> str:
+        return os.path.join(self.result_dir, f"rediarization.{meeting_id}.json")
+
+    async def run(self, meeting_id: int, utterances: Optional[List[Dict[str, Any]]] = None,
+                  threshold: Optional[float] = None) -> Dict[str, Any]:
+        """运行重新聚类并保存结果"""
+        loop = asyncio.get_event_loop()
+        # 先把尚未写入的片段落盘
+        await loop.run_in_executor(None, self.meetings.flush_meeting, meeting_id)
+        request = {
+            'segment_log_path': os.path.abspath(self.meetings.get_segment_log_path(meeting_id)),
+            'threshold': threshold if threshold is not None else self.threshold,
+            'min_duration': self.min_duration,
+            'utterances': utterances,
+        }
+
+        async with self._semaphore:
+            logger.info(f"Starting rediarization for meeting {meeting_id}")
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'service.rediarization',
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            )
+            try:
+                stdout, stderr = await process.communicate(json.dumps(request).encode('utf-8'))
+            except asyncio.CancelledError:
+                process.kill()
+                raise
+            if process.returncode != 0:
+                raise RuntimeError(f"Rediarization worker failed: {stderr.decode('utf-8', errors='ignore')[-2000:]}")
+
+        result = json.loads(stdout)
+        result['meeting_id'] = meeting_id
+        result['created_at'] = time.time()
+
+        with open(self._result_path(meeting_id), 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        logger.info(
+            f"Rediarization for meeting {meeting_id} done in {result.get('elapsed', 0):.2f}s: "
+            f"{result['segment_count']} segments, "
+            f"speakers {result.get('speaker_count_before', 0)} -> {result.get('speaker_count_after', 0)}"
+        )
+        return result
+
+    def get_result(self, meeting_id: int) -> Optional[Dict[str, Any]]:
+        """读取上一次的重新聚类结果"""
+        path = self._result_path(meeting_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+if __name__ == '__main__':
+    # 工作进程入口：从 stdin 读取请求，向 stdout 写入结果
+    if hasattr(os, 'nice'):
+        os.nice(10)
+    request = json.load(sys.stdin)
+    json.dump(run_rediarization(**request), sys.stdout, ensure_ascii=False)
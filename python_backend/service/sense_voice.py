@@ -1,47 +1,458 @@
-from typing import Optional
+from typing import Optional, List, Tuple
 from livekit import agents, rtc
 from livekit.agents.utils import AudioBuffer
 from livekit.agents import stt
 import logging
 import time
+import asyncio
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import torch
+from math import gcd
+from concurrent.futures import ThreadPoolExecutor
+from scipy.signal import resample_poly
 from .stt_base import MySpeechData
-from tools.bin_tools import memoryview_to_tensor, memoryview_to_ndarray
+from .asr_chunker import find_split_points, make_chunks, merge_chunk_results
+from .thread_budget import pin_current_thread, thread_budget
+from .model_registry import model_registry, warmup_audio
 from funasr_onnx import SenseVoiceSmall
 from funasr import AutoModel
 from funasr_onnx.utils.postprocess_utils import rich_transcription_postprocess
 
+
+def ctc_token_timestamps(frame_ids: np.ndarray, id_to_piece, blank_id: int = 0, skip_frames: int = 4,
+                         frame_shift_ms: int = 60) -> List[List[int]]:
+    """根据CTC逐帧argmax结果计算每个输出token的时间戳(ms)
+
+    与 funasr 的 output_timestamp 保持一致：
+    - 前 skip_frames 帧对应语言/情感/事件/文本规整4个提示token，不计入时间
+    - 连续相同的非blank帧合并为一个token，时间为 [start*60-30, end*60-30]，至少30ms
+    - 特殊token（<|...|>）和空白piece不输出；英文子词并入前一个单词，与 split_text 的切分对齐
+
+    Args:
+        frame_ids: 逐帧argmax的token id，形状 (T,)
+        id_to_piece: token id 到 sentencepiece piece 的映射函数
+
+    Returns:
+        [[start_ms, end_ms], ...]
+    """
+    frame_ids = frame_ids[skip_frames:]
+    if len(frame_ids) == 0:
+        return []
+    # 相同token的连续帧区间
+    boundaries = np.flatnonzero(np.diff(frame_ids)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(frame_ids)]))
+
+    timestamps = []
+    previous_piece = ''
+    for token_id, start, end in zip(frame_ids[starts], starts, ends):
+        if token_id == blank_id:
+            continue
+        piece = id_to_piece(int(token_id))
+        if piece.startswith('<|'):
+            continue
+        text = piece.replace('\u2581', '')
+        if not text:
+            continue
+        ts_left = max(int(start) * frame_shift_ms - frame_shift_ms // 2, 0)
+        ts_right = max(int(end) * frame_shift_ms - frame_shift_ms // 2, ts_left + 30)
+        if (timestamps and not piece.startswith('\u2581') and text[0].isascii() and text[0].isalpha()
+                and previous_piece[-1:].isascii() and previous_piece[-1:].isalpha()):
+            timestamps[-1][1] = ts_right
+        else:
+            timestamps.append([ts_left, ts_right])
+        previous_piece = text
+    return timestamps
+
+
+class ASRBatcher:
+    """跨请求的ASR微批处理
+
+    在 window 秒内收集并发的识别请求（来自不同会话、中间结果和最终结果），
+    按 (language, output_timestamp) 分组、按音频长度排序后切分为长度相近的批次
+    （批内最长/最短不超过 bucket_ratio，减少padding浪费），每批做一次前向推理，再把结果分发回各请求。
+    """
+
+    def __init__(self, stt: "SenseVoiceSTT", window: float = 0.02, max_batch_size: int = 10,
+                 bucket_ratio: float = 1.5):
+        self.stt = stt
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.bucket_ratio = bucket_ratio
+        self._pending = []
+        self._flush_handle = None
+
+    def submit(self, samples: np.ndarray, language: Optional[str], output_timestamp: bool,
+               job: dict) -> asyncio.Future:
+        """提交一个识别请求，返回结果 (text, timestamp) 的 Future"""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((samples, language, output_timestamp, job, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    def _make_batches(self, requests: list) -> List[list]:
+        groups = {}
+        for request in requests:
+            groups.setdefault((request[1], request[2]), []).append(request)
+
+        batches = []
+        for group in groups.values():
+            group.sort(key=lambda r: len(r[0]))
+            batch = []
+            for request in group:
+                if batch and (len(batch) >= self.max_batch_size or
+                              len(request[0]) > len(batch[0][0]) * self.bucket_ratio):
+                    batches.append(batch)
+                    batch = []
+                batch.append(request)
+            if batch:
+                batches.append(batch)
+        return batches
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # 已取消的请求不再参与推理
+        requests = [r for r in self._pending if not r[4].cancelled()]
+        self._pending = []
+        for batch in self._make_batches(requests):
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list):
+        _, language, output_timestamp, _, _ = batch[0]
+        try:
+            results = await self.stt._submit_batch(
+                [r[0] for r in batch], language, output_timestamp, [r[3] for r in batch]
+            )
+        except asyncio.CancelledError:
+            for request in batch:
+                request[4].cancel()
+            raise
+        except Exception as e:
+            for request in batch:
+                if not request[4].done():
+                    request[4].set_exception(e)
+            return
+        for request, result in zip(batch, results):
+            if not request[4].done():
+                request[4].set_result(result)
+
+
+class ASRInstance:
+    """一个独立的ASR模型实例及其专用推理线程"""
+
+    def __init__(self, index: int, cores: Optional[List[int]] = None):
+        self.index = index
+        self.cores = cores
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"asr-{index}", initializer=pin_current_thread, initargs=(cores,)
+        )
+        self.model = None
+        self.load = 0  # 排队和推理中的批次数，只在事件循环线程中修改
+
+
+class ASRResultCache:
+    """按音频内容寻址的ASR结果LRU缓存
+
+    键为音频样本的 blake2b 哈希加采样率、语言和时间戳选项，同一段音频重复识别
+    （force_process_pending、说话人切换重试、断线重放等）只需一次哈希查找。
+    超过 max_entries 时淘汰最久未使用的条目，超过 ttl 秒的条目视为失效。
+    只在事件循环线程中访问，不需要加锁。
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(samples: np.ndarray, sample_rate: int, language: Optional[str], output_timestamp: bool) -> tuple:
+        digest = hashlib.blake2b(np.ascontiguousarray(samples).data, digest_size=16).digest()
+        return digest, str(samples.dtype), sample_rate, language, output_timestamp
+
+    def get(self, key: tuple) -> Optional[Tuple[str, list]]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        text, timestamp = entry[1]
+        return text, [list(ts) for ts in timestamp]
+
+    def put(self, key: tuple, result: Tuple[str, list]):
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
 class SenseVoiceSTT(stt.STT):
     """语音识别模块
-    
+
     输入要求：
-    - 格式：int16
-    - 范围：[-32768, 32767]
-    - 采样率：16000Hz
-    - 通道：单通道
-    - 传入方式：rtc.AudioFrame
+    - recognize_array: 单通道 np.ndarray（int16 或 [-1, 1] 的 float32），采样率不是16000Hz时自动重采样
+    - recognize: livekit stt.STT 接口，传入 rtc.AudioFrame（int16），内部转换后调用 recognize_array
+
+    推理在 instances 个独立的模型实例上执行，每个实例有专用的推理线程，不阻塞事件循环：
+    - instances: 模型实例数，请求分配到负载最小的实例
+    - intra_op_threads: 每个实例推理时使用的 ONNX 线程数，0 表示使用库默认值；
+      torch 版的线程数是进程级的，不能按实例设置，统一使用 ThreadBudget 的 torch 线程数（见 _load_model）
+    - pin_cores: 把每个实例绑定到互不重叠的 intra_op_threads 个CPU核（仅Linux）
+    - core_sets: 每个实例绑定的核，由 ThreadBudget 分配，指定时忽略 pin_cores
+    - batching: 微批处理配置 {'enable', 'window', 'max_batch_size', 'bucket_ratio'}，见 ASRBatcher
+    - quantize: 使用INT8量化的ONNX模型（仅 use_onnx 时有效），可用 tools/asr_benchmark.py 评估精度和速度
+    - chunking: 长音频分块配置 {'enable', 'min_duration', 'min_chunk', 'max_chunk', 'overlap'}，
+      超过 min_duration 的音频在低能量处切成 min_chunk~max_chunk 秒的重叠分块，在多个实例上并行解码后合并
+    - cache: 结果缓存配置 {'enable', 'max_entries', 'ttl'}，见 ASRResultCache
     """
-    def __init__(self, *, streaming_supported: bool = False, use_onnx: bool = False) -> None:
+    def __init__(self, *, streaming_supported: bool = False, use_onnx: bool = False,
+                 instances: int = 1, intra_op_threads: int = 0, pin_cores: bool = False,
+                 batching: Optional[dict] = None, quantize: bool = False, chunking: Optional[dict] = None,
+                 cache: Optional[dict] = None, core_sets: Optional[List[List[int]]] = None) -> None:
         super().__init__(streaming_supported=streaming_supported)
         self.use_onnx = use_onnx
+        self.quantize = quantize and use_onnx
+        if quantize and not use_onnx:
+            logging.warning("sense_voice quantize is only supported with use_onnx, ignored")
+
+        batching = batching or {}
+        max_batch_size = batching.get('max_batch_size', 10)
+        self.max_batch_size = max_batch_size
+        self.batcher = None
+        if batching.get('enable', False):
+            self.batcher = ASRBatcher(
+                self,
+                window=batching.get('window', 0.02),
+                max_batch_size=max_batch_size,
+                bucket_ratio=batching.get('bucket_ratio', 1.5)
+            )
+
+        self.chunking = chunking if chunking and chunking.get('enable', False) else None
+        self.cache = None
+        if cache and cache.get('enable', False):
+            self.cache = ASRResultCache(cache.get('max_entries', 256), cache.get('ttl', 300.0))
+
+        # 排队与推理耗时统计
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'cancelled': 0,
+            'failed': 0,
+            'pending': 0,
+            'batches': 0,
+            'chunked': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0,
+            'inference_total': 0.0,
+        }
 
         # mps cuda cpu # 实测 mps 2.7 it/s, cpu 3.8 it/s, mps存在性能问题
         # mps  2.7.  it/s  0.233   0.246.     0.096     2.807 ?
         # cpu  3.80it/s   0.232(0.5) 0.24(0.33) 0.095(0.36) . # 前面为模型输出，括号内为日志相减
         # onnx  0.1  0.6  0.18
         # device = "mps" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu"
-        model_dir = "iic/SenseVoiceSmall"
+        if core_sets is None and pin_cores:
+            core_sets = [self._instance_cores(i, instances, intra_op_threads) for i in range(instances)]
+        self.instances = [
+            ASRInstance(i, core_sets[i % len(core_sets)] if core_sets else None)
+            for i in range(instances)
+        ]
+        # 在实例自己的线程中加载模型，ONNX 的推理线程池继承该线程的CPU绑定
+        for instance in self.instances:
+            instance.model = instance.executor.submit(
+                self._load_model, max_batch_size, intra_op_threads
+            ).result()
+        logging.info(
+            f"sense_voice stt init success, instances: {instances}, intra op threads: {intra_op_threads}, "
+            f"pinned cores: {[instance.cores for instance in self.instances]}, "
+            f"batching: {self.batcher is not None}, quantize: {self.quantize}"
+        )
+
+    @staticmethod
+    def _instance_cores(index: int, instances: int, intra_op_threads: int) -> Optional[List[int]]:
+        if not hasattr(os, 'sched_getaffinity'):
+            return None
+        cores = sorted(os.sched_getaffinity(0))
+        per_instance = intra_op_threads if intra_op_threads > 0 else max(1, len(cores) // instances)
+        subset = cores[index * per_instance:(index + 1) * per_instance]
+        return subset or None
+
+    def _load_model(self, max_batch_size: int, intra_op_threads: int):
+        # 本地模型目录中有时直接加载，否则由 ModelScope 下载
+        model_dir = model_registry.resolve('sense_voice') or "iic/SenseVoiceSmall"
         if self.use_onnx:
-            self.model = SenseVoiceSmall(model_dir, batch_size=10, quantize=False)
+            onnx_kwargs = {'intra_op_num_threads': intra_op_threads} if intra_op_threads > 0 else {}
+            return SenseVoiceSmall(model_dir, batch_size=max_batch_size, quantize=self.quantize, **onnx_kwargs)
+        # AutoModel 用 ncpu（默认 4）调用 torch.set_num_threads，对整个进程生效，最后加载的实例会覆盖之前的设置。
+        # 所有实例传入同一个进程级线程数：启用线程预算时取预算的 torch 线程数，否则为 intra_op_threads 或当前设置
+        if thread_budget.enabled:
+            ncpu = thread_budget.torch_threads
         else:
-            self.model = AutoModel(model=model_dir, trust_remote_code=False, disable_update=True)
-        logging.info("sense_voice stt init success")
-    
+            ncpu = intra_op_threads if intra_op_threads > 0 else torch.get_num_threads()
+        return AutoModel(model=model_dir, trust_remote_code=False, disable_update=True, ncpu=ncpu)
+
     @classmethod
     def change_sample_rate(cls, buffer: AudioBuffer, sample_rate: int) -> AudioBuffer:
         if buffer.sample_rate == sample_rate:
             return buffer
         return buffer.remix_and_resample(sample_rate, buffer.num_channels)
-    
+
+    def _update_metrics(self, **deltas):
+        with self._metrics_lock:
+            for key, value in deltas.items():
+                self._metrics[key] += value
+
+    def get_metrics(self) -> dict:
+        """获取ASR排队与推理耗时统计"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        completed = max(metrics['completed'], 1)
+        metrics['queue_wait_avg'] = metrics['queue_wait_total'] / completed
+        metrics['inference_avg'] = metrics['inference_total'] / completed
+        metrics['batch_size_avg'] = metrics['completed'] / max(metrics['batches'], 1)
+        metrics['instance_load'] = [instance.load for instance in self.instances]
+        if self.cache is not None:
+            metrics['cache'] = self.cache.stats()
+        return metrics
+
+    def _onnx_batch(self, model, waveforms: List[np.ndarray], language: Optional[str],
+                    output_timestamp: bool) -> List[Tuple[str, list]]:
+        """ONNX 批量推理
+
+        SenseVoiceSmall.__call__ 只接受单个数组或文件路径列表，这里直接调用其特征提取和推理步骤，
+        extract_feat 会把批内特征补齐到最长长度。
+        与torch路径的 use_itn=True 一致使用 withitn（带标点），句子切分依赖标点。
+        """
+        feats, feats_len = model.extract_feat(waveforms)
+        batch_size = feats.shape[0]
+        language_ids = np.full(batch_size, model._get_lid(language or "auto"), dtype=np.int32)
+        textnorm_ids = np.full(batch_size, model._get_tnid("withitn"), dtype=np.int32)
+        ctc_logits, encoder_out_lens = model.infer(feats, feats_len, language_ids, textnorm_ids)
+
+        outputs = []
+        for b in range(batch_size):
+            frame_ids = np.argmax(ctc_logits[b, :encoder_out_lens[b].item(), :], axis=-1)
+            yseq = frame_ids[np.concatenate(([True], np.diff(frame_ids) != 0))]
+            text = model.tokenizer.decode(yseq[yseq != model.blank_id].tolist())
+            timestamp = []
+            if output_timestamp:
+                timestamp = ctc_token_timestamps(
+                    frame_ids, model.tokenizer.sp.IdToPiece, blank_id=model.blank_id
+                )
+            outputs.append((rich_transcription_postprocess(text), timestamp))
+        return outputs
+
+    def _submit_batch(self, waveforms: List[np.ndarray], language: Optional[str],
+                      output_timestamp: bool, jobs: List[dict]) -> asyncio.Future:
+        """把一批请求提交到负载最小的模型实例"""
+        instance = min(self.instances, key=lambda i: i.load)
+        instance.load += 1
+        future = asyncio.get_event_loop().run_in_executor(
+            instance.executor, self._recognize_batch_sync, instance.model, waveforms, language, output_timestamp, jobs
+        )
+
+        def release(_):
+            instance.load -= 1
+        future.add_done_callback(release)
+        return future
+
+    def _recognize_batch_sync(self, model, waveforms: List[np.ndarray], language: Optional[str],
+                              output_timestamp: bool, jobs: List[dict]) -> List[Optional[Tuple[str, list]]]:
+        """在ASR线程中执行一批推理，返回每个请求的 (text, timestamp)；已取消的请求返回 None"""
+        now = time.perf_counter()
+        with self._metrics_lock:
+            active = [i for i, job in enumerate(jobs) if not job['cancelled']]
+            queue_waits = []
+            for i in active:
+                jobs[i]['started'] = True
+                queue_waits.append(now - jobs[i]['submit_time'])
+            if queue_waits:
+                self._metrics['queue_wait_max'] = max(self._metrics['queue_wait_max'], max(queue_waits))
+        results = [None] * len(jobs)
+        if not active:
+            return results
+
+        start = time.perf_counter()
+        try:
+            outputs = self._infer(model, [waveforms[i] for i in active], language, output_timestamp)
+        except Exception:
+            # 失败的请求只计入 failed，不计入 completed 和耗时统计
+            self._finish_jobs([jobs[i] for i in active], 'failed')
+            raise
+        inference = time.perf_counter() - start
+        with self._metrics_lock:
+            self._metrics['batches'] += 1
+            self._metrics['queue_wait_total'] += sum(queue_waits)
+            self._metrics['inference_total'] += inference * len(active)
+        self._finish_jobs([jobs[i] for i in active], 'completed')
+        logging.debug(
+            f"sense_voice batch size: {len(active)}, max queue wait: {max(queue_waits) * 1000:.1f}ms, "
+            f"inference: {inference * 1000:.1f}ms"
+        )
+        for i, output in zip(active, outputs):
+            results[i] = output
+        return results
+
+    def _infer(self, model, inputs: List[np.ndarray], language: Optional[str],
+               output_timestamp: bool) -> List[Tuple[str, list]]:
+        if self.use_onnx:
+            return self._onnx_batch(model, inputs, language, output_timestamp)
+        res = model.generate(
+            input=[torch.from_numpy(waveform) for waveform in inputs],
+            cache={},
+            language=language,  # "zn", "en", "yue", "ja", "ko", "nospeech", "auto"
+            use_itn=True,
+            batch_size=len(inputs),
+            output_timestamp=output_timestamp
+        )
+        return [(rich_transcription_postprocess(r["text"]), r.get("timestamp") or []) for r in res]
+
+    def warm_up(self, duration: float):
+        """在每个实例的推理线程中用一段噪声推理一次，完成推理内核的初始化（不计入统计、不写缓存）"""
+        samples = self._to_model_input(warmup_audio(duration), 16000)
+        futures = [
+            instance.executor.submit(self._infer, instance.model, [samples], "auto", True)
+            for instance in self.instances
+        ]
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _to_model_input(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+        """转换为模型输入：16000Hz 的 float32 数组"""
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32, copy=False)
+        if sample_rate != 16000:
+            factor = gcd(sample_rate, 16000)
+            samples = resample_poly(samples, 16000 // factor, sample_rate // factor).astype(np.float32)
+        return samples
+
     async def recognize(
         self,
         *,
@@ -51,29 +462,123 @@ class SenseVoiceSTT(stt.STT):
     ) -> MySpeechData:
         buffer = self.change_sample_rate(buffer, 16000)
         buffer: rtc.AudioFrame = agents.utils.merge_frames(buffer)
-        duration = len(buffer.data) / buffer.sample_rate
+        return await self.recognize_array(
+            np.frombuffer(buffer.data, dtype=np.int16), buffer.sample_rate,
+            language=language, output_timestamp=output_timestamp
+        )
+
+    async def recognize_array(
+        self,
+        samples: np.ndarray,
+        sample_rate: int = 16000,
+        *,
+        language: Optional[str] = None,
+        output_timestamp: bool = True
+    ) -> MySpeechData:
+        """直接识别 ndarray 音频，不经过 rtc.AudioFrame 转换"""
+        duration = len(samples) / sample_rate
         now = time.time()
         speechData = MySpeechData(language=language or "zh", text='', start_time=now-duration, end_time=now)
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(samples, sample_rate, language, output_timestamp)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                speechData.text, speechData.timestamp = cached
+                logging.debug(f"sense_voice cache hit: {speechData.text}")
+                return speechData
+
+        samples = self._to_model_input(samples, sample_rate)
         try:
-            if self.use_onnx:
-                input = memoryview_to_ndarray(buffer.data)
-                res = self.model(input, language=language, use_itn=True)
-                speechData.text = rich_transcription_postprocess(res[0])
+            if self.chunking is not None and duration > self.chunking['min_duration']:
+                speechData.text, timestamp = await self._recognize_chunked(samples, language)
+                if not output_timestamp:
+                    timestamp = []
             else:
-                input = memoryview_to_tensor(buffer.data)
-                res = self.model.generate(
-                    input=input,
-                    cache={},
-                    language=language,  # "zn", "en", "yue", "ja", "ko", "nospeech", "auto"
-                    use_itn=True,
-                    output_timestamp=output_timestamp
-                )
-                speechData.text = rich_transcription_postprocess(res[0]["text"])
-                if res[0]["timestamp"]:
-                    speechData.timestamp = res[0]["timestamp"]
+                speechData.text, timestamp = await self._recognize_samples(samples, language, output_timestamp)
+            if timestamp:
+                speechData.timestamp = timestamp
+            if cache_key is not None:
+                self.cache.put(cache_key, (speechData.text, [list(ts) for ts in speechData.timestamp]))
             logging.info(f"sense_voice recognize result:{speechData.text}, timestamp:{speechData.timestamp}")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logging.error("sense_voice recognize exception:", e)
+            logging.error(f"sense_voice recognize exception: {e}")
         return speechData
-    
\ No newline at end of file
+
+    def _finish_jobs(self, jobs: List[dict], outcome: str):
+        """把尚未计入的请求计入 completed 或 failed（同一批的其他请求可能已因分组失败提前计入）"""
+        with self._metrics_lock:
+            for job in jobs:
+                if not job['finished']:
+                    job['finished'] = True
+                    self._metrics[outcome] += 1
+                    self._metrics['pending'] -= 1
+
+    def _new_jobs(self, count: int) -> List[dict]:
+        self._update_metrics(submitted=count, pending=count)
+        now = time.perf_counter()
+        return [{'submit_time': now, 'started': False, 'cancelled': False, 'finished': False} for _ in range(count)]
+
+    async def _await_jobs(self, awaitable, jobs: List[dict]):
+        """等待识别结果，每个请求只计入 completed / failed / cancelled 之一"""
+        try:
+            return await awaitable
+        except Exception:
+            # 推理失败已在 _recognize_batch_sync 中计入，这里是推理之外的失败（如推理线程已关闭）
+            self._finish_jobs(jobs, 'failed')
+            raise
+        except asyncio.CancelledError:
+            # 尚未开始的推理直接跳过；已开始的推理无法中断，结果被丢弃
+            with self._metrics_lock:
+                for job in jobs:
+                    if not job['started'] and not job['cancelled']:
+                        job['cancelled'] = True
+                        self._metrics['cancelled'] += 1
+                        self._metrics['pending'] -= 1
+            raise
+
+    async def _recognize_samples(self, samples: np.ndarray, language: Optional[str],
+                                 output_timestamp: bool) -> Tuple[str, list]:
+        """提交一段16kHz float32音频的识别请求"""
+        jobs = self._new_jobs(1)
+        if self.batcher is not None:
+            return await self._await_jobs(self.batcher.submit(samples, language, output_timestamp, jobs[0]), jobs)
+        return (await self._await_jobs(self._submit_batch([samples], language, output_timestamp, jobs), jobs))[0]
+
+    async def _recognize_chunked(self, samples: np.ndarray, language: Optional[str]) -> Tuple[str, list]:
+        """长音频分块并行解码，按时间戳合并文本
+
+        分块不经过微批处理器（长度相近的分块会被分到同一批、落在同一个实例上），
+        而是轮流分成若干组，每组作为一批直接提交到当前负载最小的实例，各实例并行解码。
+        """
+        split_points = find_split_points(
+            samples, 16000, self.chunking['min_chunk'], self.chunking['max_chunk']
+        )
+        chunks = make_chunks(len(samples) / 16000, split_points, self.chunking['overlap'])
+        self._update_metrics(chunked=1)
+        waveforms = [samples[int(start * 16000):int(end * 16000)] for start, end, _, _ in chunks]
+        groups = min(len(waveforms), max(len(self.instances), -(-len(waveforms) // self.max_batch_size)))
+        group_indices = [list(range(g, len(waveforms), groups)) for g in range(groups)]
+        jobs = self._new_jobs(len(waveforms))
+        # _submit_batch 同步增加所选实例的负载，依次提交的各组会分散到不同实例
+        futures = [
+            self._submit_batch([waveforms[i] for i in indices], language, True, [jobs[i] for i in indices])
+            for indices in group_indices
+        ]
+        group_results = await self._await_jobs(asyncio.gather(*futures), jobs)
+        results = [None] * len(waveforms)
+        for indices, outputs in zip(group_indices, group_results):
+            for i, output in zip(indices, outputs):
+                results[i] = output
+        logging.debug(
+            f"sense_voice chunked decoding: {len(chunks)} chunks in {groups} batches, split points: {split_points}"
+        )
+        return merge_chunk_results(chunks, results)
+
+    def close(self):
+        """关闭所有实例的推理线程，取消排队中的推理"""
+        for instance in self.instances:
+            instance.executor.shutdown(wait=False, cancel_futures=True)
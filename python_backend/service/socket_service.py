@@ -1,15 +1,27 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List
 import socketio
 from datetime import datetime
 from config.config_manager import config
 import asyncio
 import numpy as np
 import time
-from .audio_processor import AudioProcessor
+import secrets
+from urllib.parse import parse_qs
+from .audio_processor import AudioProcessor, ModelPool
+from .speaker import Speaker
+from .model_loader import model_loader
+from .admission import AdmissionController, AdmissionRejected
+from .thread_budget import thread_budget
+from core.cluster import ClusterCoordinator
 
 logger = logging.getLogger(__name__)
 
+
+class SessionRequired(ValueError):
+    """有多个会话时 HTTP 请求未指定 sid"""
+
+
 class SocketService:
     def __init__(self):
         self.sio = socketio.AsyncServer(
@@ -19,28 +31,161 @@ class SocketService:
             engineio_logger=True
         )
         self.app = socketio.ASGIApp(self.sio)
-        self.audio_processor = AudioProcessor()  # 初始化音频处理器
-        self._last_stream_log_time = 0  # 添加时间戳跟踪
-        self._stream_status = False  # 只保留流状态跟踪
-        self.current_sid = None  # 添加当前活跃连接的跟踪
-        self._event_handler_task = None  # 新增：用于跟踪事件处理任务
+        self.models = ModelPool()  # 所有会话共享的模型，启动后在后台加载
+        self.admission = AdmissionController('sessions', **config.admission_config['sessions'])
+        self.max_sessions = self.admission.max_concurrent
+        self.sessions: Dict[str, AudioProcessor] = {}  # sid -> 会话的音频处理器
+        self._stream_status: Dict[str, bool] = {}  # sid -> 是否正在推流
+        self._event_handler_tasks: Dict[str, asyncio.Task] = {}  # sid -> 事件发送任务
+        self.default_meeting_id = None  # 没有会话时切换的会议，新会话自动进入
+        self.session_keys: Dict[int, str] = {}  # 二进制音频通道的会话标识 -> sid
+        self.cluster: Optional[ClusterCoordinator] = None  # 多 worker 协调，cluster.enable 时在 start 中创建
+        self._watches: Dict[str, list] = {}  # sid -> [(meeting_id, callback)]，通过 Redis 订阅的会议
+        self._admitted_at: Dict[str, float] = {}  # sid -> 准入时间，会话结束时释放名额
+        self._encodings: Dict[str, str] = {}  # sid -> 出站事件编码：json / msgpack
+        self.coalesce_window = config.get('events.coalesce_window', 0.005)
+        self._decoders: Dict[str, Any] = {}  # sid -> Opus 解码器，首个 Opus 包到达时创建
+        self._pending_sessions: Dict[str, asyncio.Task] = {}  # sid -> 等待模型加载完成后创建会话的任务
+        self.opus_config = config.audio_config['opus']
         self._setup_handlers()
 
-    async def _handle_audio_events(self):
-        """统一的事件处理循环"""
+    def get_session(self, sid: Optional[str] = None) -> Optional[AudioProcessor]:
+        """获取会话的音频处理器
+
+        未指定 sid 时只有一个会话（含等待模型加载的会话）才返回该会话，没有会话返回 None；
+        多个会话时无法确定目标，抛出 SessionRequired，避免误操作其他客户端的会话。
+        """
+        if sid is not None:
+            return self.sessions.get(sid)
+        candidates = set(self.sessions) | set(self._pending_sessions)
+        if len(candidates) > 1:
+            raise SessionRequired("sid is required when multiple sessions are connected")
+        return self.sessions.get(next(iter(candidates))) if candidates else None
+
+    def get_sessions_stats(self) -> List[Dict[str, Any]]:
+        """各会话的会议、推流状态和出站事件队列统计"""
+        return [{
+            'sid': sid,
+            'meeting_id': processor.speaker_detector.current_meeting_id,
+            'streaming': self._stream_status.get(sid, False),
+            'encoding': self._encodings.get(sid, 'json'),
+            'events': processor.get_event_stats(),
+            'decoder': self._decoders[sid].stats() if sid in self._decoders else None
+        } for sid, processor in self.sessions.items()]
+
+    def flush_meeting(self, meeting_id: int):
+        """落盘会议尚未写入的说话人更新（同一会议的会话共享存储）"""
+        if self.models.speaker is not None:
+            self.models.speaker.flush_meeting(meeting_id)
+
+    def get_segment_log_path(self, meeting_id: int) -> str:
+        return Speaker.get_segment_log_path(meeting_id)
+
+    def _new_session_key(self, sid: str) -> int:
+        """生成二进制音频帧头中使用的 uint32 会话标识"""
         while True:
+            key = secrets.randbits(32)
+            if key and key not in self.session_keys:
+                self.session_keys[key] = sid
+                return key
+
+    def get_sid_by_key(self, session_key: int) -> Optional[str]:
+        return self.session_keys.get(session_key)
+
+    async def _create_session(self, sid: str, meeting_id: Optional[int] = None, encoding: str = 'json'):
+        """创建会话；失败或创建期间客户端断开时清理已创建的资源并释放准入名额，异常继续抛出"""
+        processor = None
+        try:
+            await self.models.ensure()
+            processor = AudioProcessor(models=self.models, session_id=sid)
+            self.sessions[sid] = processor
+            await processor.start()
+            self._stream_status[sid] = False
+            self._encodings[sid] = encoding
+            self._event_handler_tasks[sid] = asyncio.create_task(self._handle_audio_events(sid, processor))
+            processor.session_key = self._new_session_key(sid)
+            if meeting_id is None:
+                meeting_id = self.default_meeting_id
+            if meeting_id is not None:
+                await processor.speaker_detector.switch_meeting(meeting_id)
+            if sid not in self._admitted_at:
+                # disconnect 已在创建期间执行并释放了名额
+                raise ConnectionError(f"Client {sid} disconnected during session creation")
+        except BaseException:
+            await self._discard_session(sid, processor)
+            raise
+        logger.info(f"Session created: {sid}, meeting: {meeting_id}, encoding: {encoding}, active sessions: {len(self.sessions)}")
+
+    async def _discard_session(self, sid: str, processor: Optional[AudioProcessor]):
+        """清理创建失败的会话"""
+        if processor is not None and self.sessions.get(sid) is processor:
+            del self.sessions[sid]
+        self._stream_status.pop(sid, None)
+        self._encodings.pop(sid, None)
+        task = self._event_handler_tasks.pop(sid, None)
+        if task and not task.done():
+            task.cancel()
+        if processor is not None:
+            if processor.session_key is not None:
+                self.session_keys.pop(processor.session_key, None)
+            await processor.stop()
+        admitted_at = self._admitted_at.pop(sid, None)
+        if admitted_at is not None:
+            self.admission.release(admitted_at)
+
+    async def _create_session_when_ready(self, sid: str, meeting_id: Optional[int], encoding: str):
+        """模型加载完成后创建会话并再次发送 system_status，加载失败时断开连接"""
+        try:
+            await self._create_session(sid, meeting_id, encoding)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to create session {sid}: {str(e)}")
+            await self._send_error(sid, 1004, "Model loading failed")
+            await self.sio.disconnect(sid)
+            return
+        finally:
+            self._pending_sessions.pop(sid, None)
+        await self._send_system_status(sid)
+
+    async def _close_session(self, sid: str):
+        pending = self._pending_sessions.pop(sid, None)
+        if pending is not None and pending is not asyncio.current_task():
+            pending.cancel()
             try:
-                event = await self.audio_processor.get_next_event()
-                
-                # 检查是否有活跃连接
-                if not self.current_sid:
-                    logger.debug("No active connection, skipping event")
-                    continue
-                    
-                logger.debug(f"Processing event for current client {self.current_sid}: {event}")
+                await pending
+            except asyncio.CancelledError:
+                pass
+        processor = self.sessions.pop(sid, None)
+        self._stream_status.pop(sid, None)
+        self._encodings.pop(sid, None)
+        admitted_at = self._admitted_at.pop(sid, None)
+        if admitted_at is not None:
+            self.admission.release(admitted_at)
+        self._decoders.pop(sid, None)
+        task = self._event_handler_tasks.pop(sid, None)
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if processor is not None:
+            self.session_keys.pop(processor.session_key, None)
+            await processor.stop()
+        logger.info(f"Session closed: {sid}, active sessions: {len(self.sessions)}")
+
+    async def _handle_audio_events(self, sid: str, processor: AudioProcessor):
+        """会话的事件发送循环"""
+        if self._encodings.get(sid) == 'msgpack':
+            await self._handle_audio_events_compact(sid, processor)
+            return
+        while True:
+            try:
+                event = await processor.get_next_event()
+                logger.debug(f"Processing event for client {sid}: {event}")
                 
                 if event['type'] == 'transcription':
-                    logger.debug(f"Attempting to send transcription to current client {self.current_sid}")
                     try:
                         await self.sio.emit('transcription', {
                             'text': event['text'],
@@ -49,90 +194,285 @@ class SocketService:
                             'end_time': event['end_time'],
                             'isFinal': event['isFinal'],
                             'timestamp': event['timestamp']
-                        }, room=self.current_sid)
-                        logger.debug(f"Successfully sent transcription to current client {self.current_sid}")
+                        }, room=sid)
+                        logger.debug(f"Successfully sent transcription to client {sid}")
                     except Exception as e:
-                        logger.error(f"Failed to send transcription to client {self.current_sid}: {str(e)}")
+                        logger.error(f"Failed to send transcription to client {sid}: {str(e)}")
                         
                 elif event['type'] == 'error':
-                    logger.debug(f"Attempting to send error to current client {self.current_sid}")
                     await self.sio.emit('error', {
                         'code': event['code'],
                         'message': event['message'],
-                    }, room=self.current_sid)
+                    }, room=sid)
+
+                await self._publish(processor, [event])
                     
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in _handle_audio_events: {str(e)}", exc_info=True)
                 await asyncio.sleep(0.1)
                 continue
 
+    async def _handle_audio_events_compact(self, sid: str, processor: AudioProcessor):
+        """紧凑编码的事件发送循环：coalesce_window 内的事件合并为一条 msgpack 消息"""
+        from .event_encoding import encode_events
+        while True:
+            try:
+                events = [await processor.get_next_event()]
+                if self.coalesce_window > 0:
+                    await asyncio.sleep(self.coalesce_window)
+                events.extend(processor.event_queue.drain())
+                events = processor.event_queue.collapse(events)
+                await self.sio.emit('events', encode_events(events), room=sid)
+                logger.debug(f"Sent {len(events)} events to client {sid}")
+                await self._publish(processor, events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in _handle_audio_events_compact: {str(e)}", exc_info=True)
+                await asyncio.sleep(0.1)
+
+    async def _publish(self, processor: AudioProcessor, events: List[Dict[str, Any]]):
+        """集群模式下把会议的识别结果发布到 Redis，任意 worker 上订阅该会议的客户端都能收到"""
+        meeting_id = processor.speaker_detector.current_meeting_id
+        if self.cluster is None or meeting_id is None:
+            return
+        for event in events:
+            if event['type'] != 'transcription':
+                continue
+            try:
+                await self.cluster.publish(meeting_id, event)
+            except Exception as e:
+                logger.error(f"Failed to publish event of meeting {meeting_id}: {str(e)}")
+
+    async def watch_meeting(self, sid: str, meeting_id: int):
+        """订阅会议的识别结果（无论会议在哪个 worker 上处理），以 meeting_transcription 事件推送"""
+        if self.cluster is None:
+            raise ValueError("Cluster mode is disabled")
+
+        async def deliver(message: Dict[str, Any]):
+            event = message['event']
+            await self.sio.emit('meeting_transcription', {
+                'meeting_id': message['meeting_id'],
+                'text': event['text'],
+                'speaker_id': event['speaker_id'],
+                'start_time': event['start_time'],
+                'end_time': event['end_time'],
+                'isFinal': event['isFinal'],
+                'timestamp': event['timestamp']
+            }, room=sid)
+
+        await self.cluster.subscribe(meeting_id, deliver)
+        self._watches.setdefault(sid, []).append((meeting_id, deliver))
+
+    async def unwatch_meeting(self, sid: str, meeting_id: Optional[int] = None):
+        """取消订阅，meeting_id 为空时取消该连接的所有订阅"""
+        remaining = []
+        for watched_id, callback in self._watches.pop(sid, []):
+            if meeting_id is None or watched_id == meeting_id:
+                await self.cluster.unsubscribe(watched_id, callback)
+            else:
+                remaining.append((watched_id, callback))
+        if remaining:
+            self._watches[sid] = remaining
+
+    def get_load(self) -> Dict[str, Any]:
+        """心跳上报的负载：会话数和正在处理的会议"""
+        meetings = {processor.speaker_detector.current_meeting_id for processor in self.sessions.values()}
+        meetings.discard(None)
+        return {'sessions': len(self.sessions), 'meetings': sorted(meetings)}
+
+    @staticmethod
+    def _get_connect_param(environ, auth, name: str) -> Optional[str]:
+        """从连接参数（auth 或 query string）中读取参数"""
+        value = auth.get(name) if isinstance(auth, dict) else None
+        if value is None:
+            value = parse_qs(environ.get('QUERY_STRING', '')).get(name, [None])[0]
+        return value
+
+    @classmethod
+    def _get_meeting_id(cls, environ, auth) -> Optional[int]:
+        meeting_id = cls._get_connect_param(environ, auth, 'meeting_id')
+        try:
+            return int(meeting_id) if meeting_id is not None else None
+        except (TypeError, ValueError):
+            return None
+
     def _setup_handlers(self):
         @self.sio.event
-        async def connect(sid, environ):
+        async def connect(sid, environ, auth=None):
             logger.info(f"Client connected: {sid}")
             logger.debug(f"Connection environment: {environ}")
+
+            try:
+                admitted_at = self.admission.acquire()
+            except AdmissionRejected as e:
+                logger.warning(f"Rejecting client {sid}: {str(e)}")
+                raise socketio.exceptions.ConnectionRefusedError({
+                    'code': 1004,
+                    'message': e.reason,
+                    'retry_after': e.retry_after
+                })
             
-            # 更新当前活跃连接
-            self.current_sid = sid
-            logger.info(f"Set current active connection to {sid}")
-            
-            # 确保事件处理任务在运行
-            if not self._event_handler_task or self._event_handler_task.done():
-                self._event_handler_task = asyncio.create_task(self._handle_audio_events())
-            
+            encoding = 'msgpack' if self._get_connect_param(environ, auth, 'encoding') == 'msgpack' else 'json'
+            meeting_id = self._get_meeting_id(environ, auth)
+            # 在第一个 await 之前记录准入，创建会话期间断开时由 disconnect 释放名额
+            self._admitted_at[sid] = admitted_at
+            if not self.models.is_ready():
+                # 模型仍在加载：先接受连接并报告加载状态，加载完成后创建会话并再次发送 system_status
+                self._pending_sessions[sid] = asyncio.create_task(
+                    self._create_session_when_ready(sid, meeting_id, encoding))
+                await self._send_system_status(sid)
+                return
+            # 失败时 _create_session 自行清理并释放名额
+            await self._create_session(sid, meeting_id, encoding)
+
             await self._send_system_status(sid)
 
         @self.sio.event
         async def disconnect(sid):
-            if sid == self.current_sid:
-                logger.info(f"Active client disconnected: {sid}")
-                self.current_sid = None
-                if self._stream_status:
-                    logger.info(f"Audio streaming stopped from client {sid}")
-                    self._stream_status = False
+            if self._stream_status.get(sid):
+                logger.info(f"Audio streaming stopped from client {sid}")
+            if sid in self._watches:
+                await self.unwatch_meeting(sid)
+            await self._close_session(sid)
             logger.info(f"Client disconnected: {sid}")
 
+        @self.sio.on('watch_meeting')
+        async def handle_watch_meeting(sid, data: Dict[str, Any]):
+            try:
+                await self.watch_meeting(sid, int(data['meeting_id']))
+            except Exception as e:
+                logger.error(f"Failed to watch meeting for client {sid}: {str(e)}")
+                await self._send_error(sid, 1004, str(e))
+
+        @self.sio.on('unwatch_meeting')
+        async def handle_unwatch_meeting(sid, data: Optional[Dict[str, Any]] = None):
+            if self.cluster is None:
+                return
+            meeting_id = (data or {}).get('meeting_id')
+            await self.unwatch_meeting(sid, int(meeting_id) if meeting_id is not None else None)
+
         @self.sio.on('audio_stream_stop')
         async def handle_stream_stop(sid):
-            if self._stream_status:
-                logger.info(f"Audio streaming stopped from client {sid}")
-                self._stream_status = False
-                # Add force processing of any pending audio segments
-                await self.audio_processor.force_process_pending()
+            await self.stop_stream(sid)
 
         @self.sio.on('audio_stream')
         async def handle_audio_stream(sid, data: Dict[str, Any]):
             try:
                 audio_data = np.frombuffer(data['audio'], dtype=np.int16)
-                timestamp = data.get('timestamp', time.time())
-                # logger.debug(f"Received audio data from client {sid}, length: {len(audio_data)}, timestamp: {data.get('timestamp')}")
-                
-                # 只在状态变化时打印 INFO 日志
-                if not self._stream_status:
-                    logger.info(f"Audio streaming started from client {sid}")
-                    self._stream_status = True
-                
-                await self.audio_processor.process_audio(
-                    audio_data=audio_data,
-                    timestamp=timestamp
-                )
-                
             except Exception as e:
-                if self._stream_status:
-                    logger.error(f"Audio streaming error from client {sid}: {str(e)}")
-                    self._stream_status = False
+                logger.error(f"Invalid audio data from client {sid}: {str(e)}")
+                await self._send_error(sid, 1001, "Audio processing error")
+                return
+            await self.ingest_audio(sid, audio_data, data.get('timestamp', time.time()))
+
+        @self.sio.on('audio_stream_opus')
+        async def handle_audio_stream_opus(sid, data: Dict[str, Any]):
+            if sid not in self.sessions:
+                return
+            try:
+                if self.decode_opus(sid, data['audio'], seq=data.get('seq')) < 0:
+                    return
+            except Exception as e:
+                logger.error(f"Opus decode error from client {sid}: {str(e)}")
                 await self._send_error(sid, 1001, "Audio processing error")
+                return
+            await self.feed_decoded(sid, data.get('timestamp', time.time()))
+
+    async def ingest_audio(self, sid: str, audio_data: np.ndarray, timestamp: float):
+        """把一帧音频送入会话（socket.io 与二进制 WebSocket 共用）"""
+        processor = self.sessions.get(sid)
+        if processor is None:
+            return
+        try:
+            # 只在状态变化时打印 INFO 日志
+            if not self._stream_status.get(sid):
+                logger.info(f"Audio streaming started from client {sid}")
+                self._stream_status[sid] = True
+            
+            await processor.process_audio(
+                audio_data=audio_data,
+                timestamp=timestamp
+            )
+            
+        except Exception as e:
+            if self._stream_status.get(sid):
+                logger.error(f"Audio streaming error from client {sid}: {str(e)}")
+                self._stream_status[sid] = False
+            await self._send_error(sid, 1001, "Audio processing error")
+
+    def _get_decoder(self, sid: str):
+        decoder = self._decoders.get(sid)
+        if decoder is None:
+            # 只有使用 Opus 的客户端才需要 opuslib
+            from .opus_decoder import OpusStreamDecoder
+            decoder = OpusStreamDecoder(
+                sample_rate=config.audio_config['sample_rate'],
+                batch_duration=self.opus_config['batch_duration'],
+                max_conceal=self.opus_config['max_conceal']
+            )
+            self._decoders[sid] = decoder
+        return decoder
+
+    def decode_opus(self, sid: str, packet: bytes, seq: Optional[int] = None, lost_samples: int = 0) -> int:
+        """解码会话的一个 Opus 包，返回解码出的采样数，迟到/重复包返回 -1"""
+        return self._get_decoder(sid).decode(packet, seq=seq, lost_samples=lost_samples)
+
+    async def feed_decoded(self, sid: str, timestamp: float, force: bool = False):
+        """解码结果攒够一批后写入会话
+
+        Args:
+            timestamp: 最后一个已解码包的结束时间戳
+        """
+        decoder = self._decoders.get(sid)
+        if decoder is None:
+            return
+        decoder.last_timestamp = timestamp
+        batch = decoder.take_batch(force=force)
+        if batch is None:
+            return
+        # 丢包补偿可能使一批过长，按批大小切开，保持每帧的结束时间戳
+        step = decoder.batch_samples
+        for start in range(0, len(batch), step):
+            piece = batch[start:start + step]
+            remaining = len(batch) - start - len(piece)
+            await self.ingest_audio(sid, piece, timestamp - remaining / decoder.sample_rate)
+
+    async def stop_stream(self, sid: str):
+        """音频流结束，立即处理尚未结束的片段"""
+        decoder = self._decoders.get(sid)
+        if decoder is not None:
+            if decoder.last_timestamp is not None:
+                await self.feed_decoded(sid, decoder.last_timestamp, force=True)
+            decoder.reset()
+        processor = self.sessions.get(sid)
+        if processor and self._stream_status.get(sid):
+            logger.info(f"Audio streaming stopped from client {sid}")
+            self._stream_status[sid] = False
+            # Add force processing of any pending audio segments
+            await processor.force_process_pending()
 
 
     async def _send_system_status(self, sid: str):
         """发送系统状态"""
+        processor = self.sessions.get(sid)
+        if processor is not None:
+            state = 'ready'
+        elif self.models.has_failed():
+            state = 'error'
+        else:
+            state = 'loading'
         status = {
-            'status': 'ready',
+            'status': state,
             'components': {
-                'audio': True,
+                'audio': processor is not None,
                 'llm': True,
-                'rag': True
-            }
+                'rag': model_loader.is_available('embedding')
+            },
+            'models': model_loader.status(),
+            'session_key': processor.session_key if processor else None
         }
         await self.sio.emit('system_status', status, room=sid)
 
@@ -151,20 +491,19 @@ class SocketService:
 
     async def start(self):
         """启动服务"""
-        await self.audio_processor.start()
-        # 启动统一的事件处理任务
-        if not self._event_handler_task or self._event_handler_task.done():
-            self._event_handler_task = asyncio.create_task(self._handle_audio_events())
+        thread_budget.install_default_executor(asyncio.get_running_loop())
+        if config.cluster_config['enable']:
+            self.cluster = ClusterCoordinator(max_sessions=self.max_sessions, load_fn=self.get_load)
+            await self.cluster.start()
+        logger.info(f"Socket service ready, max sessions: {self.max_sessions}")
 
     async def stop(self):
         """停止服务"""
-        if self._event_handler_task and not self._event_handler_task.done():
-            self._event_handler_task.cancel()
-            try:
-                await self._event_handler_task
-            except asyncio.CancelledError:
-                pass
-        await self.audio_processor.stop() 
+        for sid in list(self.sessions):
+            await self._close_session(sid)
+        if self.cluster is not None:
+            await self.cluster.stop()
+        self.models.close()
 
     async def _process_audio_event(self, event):
         try:
@@ -192,11 +531,23 @@ class SocketService:
         except Exception as e:
             logger.error(f"Error processing audio event: {str(e)}", exc_info=True) 
 
-    async def switch_meeting(self, meeting_id: int):
-        """切换会议"""
+    async def switch_meeting(self, meeting_id: int, sid: Optional[str] = None):
+        """切换会议
+
+        Args:
+            sid: 切换的会话，只有一个会话时可以不指定；没有会话时记录下来，新会话连接后自动进入
+
+        Raises:
+            SessionRequired: 未指定 sid 且有多个会话
+        """
+        processor = self.get_session(sid)
         try:
-            # 使用 audio_processor 中的 speaker_detector
-            await self.audio_processor.speaker_detector.switch_meeting(meeting_id)
+            if processor is None:
+                if sid is not None:
+                    raise ValueError(f"Session not found: {sid}")
+                self.default_meeting_id = meeting_id
+                return True
+            await processor.speaker_detector.switch_meeting(meeting_id)
             return True
         except Exception as e:
             logging.error(f"Error switching meeting: {e}")
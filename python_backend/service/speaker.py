@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 load_dotenv()
 import time
+import wave
 import torch
 import numpy as np
 from pyannote.audio import Model, Inference
@@ -8,14 +9,21 @@ from pyannote.core import Segment
 from funasr.models.campplus.model import CAMPPlus
 from huggingface_hub import hf_hub_download
 from scipy.spatial.distance import cdist
+from scipy.signal import resample_poly
+from math import gcd
 import asyncio
 import logging
+import threading
 from dataclasses import dataclass
-from typing import List, Optional
-from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import deque, OrderedDict
+from concurrent.futures import Future
 from tools.bin_tools import memoryview_to_tensor, memoryview_to_ndarray
 from config.config_manager import config
-from .speaker_storage import SpeakerStorage
+from .speaker_storage import open_speaker_storage, get_speaker_storage_path, get_segment_log_path
+from .voiceprint_library import VoiceprintLibrary
+from .thread_budget import thread_budget
+from .model_registry import model_registry, warmup_audio
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +42,7 @@ class SpeakerEmbeddings:
 
     def __init__(self, id:int, adaptive_threshold:float = 0.25):
         self.id = id
+        self.voiceprint_id: Optional[str] = None  # 关联的全局声纹ID
         self.max_embeddings = config.speaker['embedding']['max_embeddings']
         self.embeddings = []
         self.historical_distances = deque(maxlen=10)  # 保存最近10个距离值
@@ -71,9 +80,26 @@ class SpeakerEmbeddings:
             ],
             'average_embedding': self.average_embedding.astype(np.float32),
             'average_distance': float(self.average_distance),
-            'adaptive_threshold': float(self.adaptive_threshold)
+            'adaptive_threshold': float(self.adaptive_threshold),
+            'voiceprint_id': self.voiceprint_id or ''
         }
 
+    @classmethod
+    def from_dict(cls, id:int, data:dict, adaptive_threshold:float = 0.25) -> 'SpeakerEmbeddings':
+        """Restore from storage format without recomputing statistics"""
+        speaker = cls(id, data.get('adaptive_threshold', adaptive_threshold))
+        speaker.voiceprint_id = data.get('voiceprint_id') or None
+        speaker.embeddings = [
+            SpeakerEmbedding(e['duration'], e['embedding'])
+            for e in data['embeddings']
+        ]
+        if data.get('average_embedding') is not None:
+            speaker.average_embedding = data['average_embedding']
+            speaker.average_distance = data.get('average_distance', 0.0)
+        else:
+            speaker.update_average_embedding()
+        return speaker
+
     def update_average_embedding(self):
         if len(self.embeddings) == 0:
             return None
@@ -134,7 +160,142 @@ class SpeakerEmbeddings:
             self.adaptive_threshold = (self.adaptive_threshold * 0.9 + distance * 0.1)
         
         return is_same, distance
-    
+
+
+class MeetingState:
+    """一个会议的说话人集合，连接到同一会议的所有会话共享"""
+
+    def __init__(self, meeting_id: Optional[int], speakers: Optional[Dict[int, SpeakerEmbeddings]] = None,
+                 last_speaker_id: int = 0, storage=None):
+        self.meeting_id = meeting_id
+        self.speakers = speakers if speakers is not None else {}
+        self.last_speaker_id = last_speaker_id
+        self.recent_speakers = deque(maxlen=5)
+        self.storage = storage
+        # 说话人匹配和新增在 embedding 线程中执行，多个会话可能同时修改同一会议
+        self.lock = threading.RLock()
+        self.refs = 0
+
+
+class MeetingRegistry:
+    """按会议共享的说话人集合与存储
+
+    同一会议只打开一个存储（一个写回线程），多个会话不会各自写同一个文件互相覆盖。
+    没有会话使用的会议保留在 LRU 中（最多 max_meetings 个），切回时无需重新读取文件。
+    方法会读写文件，在线程池中调用。
+    """
+
+    def __init__(self, max_meetings: int, speaker_distance_threshold: float):
+        self.max_meetings = max_meetings
+        self.speaker_distance_threshold = speaker_distance_threshold
+        self._lock = threading.Lock()
+        self._active: Dict[int, MeetingState] = {}
+        self._idle: OrderedDict = OrderedDict()
+        # 正在从文件加载的会议 -> 加载结果，加载在全局锁外进行，同一会议的其他请求等待同一次加载
+        self._loading: Dict[int, Future] = {}
+        # 最后一个会话离开会议、存储落盘后调用，参数为会议ID；可能在线程池中调用
+        self.on_meeting_end: Optional[Callable[[int], None]] = None
+
+    @staticmethod
+    def open_storage(meeting_id: int):
+        storage_config = config.speaker['storage']
+        return open_speaker_storage(
+            storage_config['path'], meeting_id, storage_config['format'],
+            flush_interval=storage_config['flush_interval']
+        )
+
+    def _load(self, meeting_id: int) -> MeetingState:
+        """从存储加载会议的说话人集合，直接恢复保存的统计量而不重新计算"""
+        storage = self.open_storage(meeting_id)
+        speakers = {}
+        last_speaker_id = 0
+        for speaker_id, speaker_data in storage.get_all_speakers().items():
+            speakers[int(speaker_id)] = SpeakerEmbeddings.from_dict(
+                int(speaker_id), speaker_data, self.speaker_distance_threshold
+            )
+            last_speaker_id = max(last_speaker_id, int(speaker_id))
+        if speakers:
+            logger.info(f"Loaded {len(speakers)} speakers for meeting {meeting_id}")
+        else:
+            logger.info(f"No existing speakers found for meeting {meeting_id}")
+        return MeetingState(meeting_id, speakers, last_speaker_id, storage)
+
+    def acquire(self, meeting_id: int) -> MeetingState:
+        """获取会议的说话人集合并增加引用，其他会话已在使用或在 LRU 中时直接复用
+
+        冷加载在全局锁外读取文件，不阻塞其他会议的 acquire / release。
+        """
+        with self._lock:
+            state = self._active.get(meeting_id)
+            if state is None:
+                state = self._idle.pop(meeting_id, None)
+                if state is not None:
+                    logger.info(f"Restored {len(state.speakers)} speakers for meeting {meeting_id} from cache")
+                    self._active[meeting_id] = state
+            if state is not None:
+                state.refs += 1
+                return state
+            loading = self._loading.get(meeting_id)
+            if loading is None:
+                loading = self._loading[meeting_id] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            # 等待其他请求完成加载后重新获取（加载失败时抛出同样的异常）
+            loading.result()
+            return self.acquire(meeting_id)
+
+        try:
+            state = self._load(meeting_id)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(meeting_id, None)
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(meeting_id, None)
+            self._active[meeting_id] = state
+            state.refs += 1
+        loading.set_result(state)
+        return state
+
+    def release(self, state: MeetingState):
+        """减少引用，最后一个会话离开时落盘并放入 LRU，淘汰最久未使用的会议"""
+        evicted = []
+        with self._lock:
+            state.refs -= 1
+            if state.refs > 0:
+                return
+            self._active.pop(state.meeting_id, None)
+            self._idle[state.meeting_id] = state
+            while len(self._idle) > self.max_meetings:
+                evicted.append(self._idle.popitem(last=False))
+        state.storage.flush()
+        for evicted_id, evicted_state in evicted:
+            evicted_state.storage.close()
+            logger.info(f"Evicted meeting {evicted_id} from speaker cache")
+        if self.on_meeting_end is not None:
+            try:
+                self.on_meeting_end(state.meeting_id)
+            except Exception as e:
+                logger.error(f"Meeting end callback failed for meeting {state.meeting_id}: {e}", exc_info=True)
+
+    def get(self, meeting_id: int) -> Optional[MeetingState]:
+        with self._lock:
+            return self._active.get(meeting_id) or self._idle.get(meeting_id)
+
+    def close(self):
+        """写入尚未落盘的说话人更新，并关闭所有会议的存储"""
+        with self._lock:
+            states = list(self._active.values()) + list(self._idle.values())
+            self._active.clear()
+            self._idle.clear()
+        for state in states:
+            state.storage.close()
+
+
 # https://huggingface.co/pyannote/wespeaker-voxceleb-resnet34-LM
 class Speaker:
     """说话人识别模块
@@ -145,7 +306,14 @@ class Speaker:
     - 采样率：16000Hz
     - 通道：单通道
     """
-    def __init__(self):
+    MODEL_SAMPLE_RATE = 16000
+
+    def __init__(self, shared: Optional['Speaker'] = None, remote=None):
+        """
+        Args:
+            shared: 已加载模型的 Speaker，传入时复用其embedding模型、声纹库和按会议共享的说话人集合
+            remote: InferenceProcessPool，传入时embedding在推理进程中计算，本进程不加载模型
+        """
         # 从配置获取参数
         speaker_config = config.speaker
         model_config = speaker_config['model']
@@ -159,11 +327,24 @@ class Speaker:
         self.max_chunk_duration = embedding_config['max_chunk_duration']
         
         # 初始化模型和其他属性
+        self.model_owner = shared is None
+        self.remote = shared.remote if shared is not None else remote
+        # embedding 推理线程池，启用线程预算时绑定到说话人模型的核，否则为 None（使用默认线程池）
+        self.executor = shared.executor if shared is not None else thread_budget.executor('speaker')
         try:
-            if self.use_campplus:
+            if shared is not None:
+                self.model = shared.model
+                if not self.use_campplus:
+                    self.inference = shared.inference
+            elif self.remote is not None:
+                # embedding 在推理进程中计算，本进程不加载模型
+                self.model = None
+                self.inference = None
+            elif self.use_campplus:
                 self.model = CAMPPlus()
-                model_path = hf_hub_download(repo_id="funasr/campplus", filename="campplus_cn_common.bin")
-                self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
+                model_path = (model_registry.resolve('campplus')
+                              or hf_hub_download(repo_id="funasr/campplus", filename="campplus_cn_common.bin"))
+                self.model.load_state_dict(model_registry.torch_load(model_path))
                 self.model.to(self.device)
                 self.model.eval()
             else:
@@ -174,64 +355,139 @@ class Speaker:
             logger.error(f"Error loading model: {e}")
             exit()
 
-        # 初始化基本属性
-        self.speakers = {}
-        self.last_speaker_id = 0
-        self.recent_speakers = deque(maxlen=5)
-        self.current_meeting_id = None
-        self.storage = None
+        # 会议的说话人集合，未进入会议时为会话自己的临时集合
+        self.meeting = MeetingState(None)
+        self.meetings = shared.meetings if shared is not None else MeetingRegistry(
+            speaker_config['cache']['max_meetings'], self.speaker_distance_threshold
+        )
+        self._switch_lock = asyncio.Lock()
+
+        # 跨会议声纹库
+        library_config = speaker_config['library']
+        self.library_threshold = library_config['threshold']
+        self.library = None
+        if shared is not None:
+            self.library = shared.library
+        elif library_config['enable']:
+            self.library = VoiceprintLibrary(
+                library_config['path'],
+                nprobe=library_config['nprobe'],
+                brute_force_limit=library_config['brute_force_limit'],
+                flush_interval=library_config['flush_interval']
+            )
         logger.info(f"Speaker initialized with storage=None, use_campplus={self.use_campplus}, max_embeddings={config.speaker['embedding']['max_embeddings']}")
         
 
+    def warm_up(self, duration: float):
+        """用一段噪声提取一次embedding（单段和滑动窗口），完成推理内核的初始化"""
+        if self.remote is not None:
+            return
+        sample_rate = config.audio_config['sample_rate']
+        audio = warmup_audio(max(duration, 1.6), sample_rate)
+        self.get_embedding_from_buffer(audio, sample_rate)
+        if self.use_campplus:
+            self.get_window_embeddings(audio, sample_rate)
+
+    @property
+    def current_meeting_id(self) -> Optional[int]:
+        return self.meeting.meeting_id
+
+    @property
+    def speakers(self) -> Dict[int, SpeakerEmbeddings]:
+        return self.meeting.speakers
+
+    @property
+    def recent_speakers(self) -> deque:
+        return self.meeting.recent_speakers
+
+    @property
+    def storage(self):
+        return self.meeting.storage
+
+    @property
+    def last_speaker_id(self) -> int:
+        return self.meeting.last_speaker_id
+
+    @last_speaker_id.setter
+    def last_speaker_id(self, value: int):
+        self.meeting.last_speaker_id = value
+
     def _ensure_storage(self):
         """确保存储已初始化"""
         if self.storage is None and self.current_meeting_id is not None:
             logger.info(f"Initializing storage for meeting {self.current_meeting_id}")
-            self.storage = SpeakerStorage(f"data/speakers.{self.current_meeting_id}.json")
+            self.meeting.storage = MeetingRegistry.open_storage(self.current_meeting_id)
+
+    def close(self):
+        """离开当前会议；共享模型的 Speaker 关闭时写入并关闭所有会议的存储"""
+        if self.meeting.meeting_id is not None:
+            self.meetings.release(self.meeting)
+            self.meeting = MeetingState(None)
+        if self.model_owner:
+            self.meetings.close()
+            if self.library is not None:
+                self.library.close()
+
+    @staticmethod
+    def get_segment_log_path(meeting_id: int) -> str:
+        storage_config = config.speaker['storage']
+        return get_segment_log_path(
+            get_speaker_storage_path(storage_config['path'], meeting_id, storage_config['format'])
+        )
+
+    def flush_meeting(self, meeting_id: int):
+        """落盘指定会议尚未写入的更新（使用中或缓存中的会议）"""
+        state = self.meetings.get(meeting_id)
+        if state is not None and state.storage is not None:
+            state.storage.flush()
 
     async def switch_meeting(self, meeting_id: int):
-        """Switch to a new meeting context"""
-        try:
-            logger.info(f"Switching to meeting {meeting_id}")
-            
-            # Clear current speakers cache
-            self.speakers = {}
-            self.last_speaker_id = 0
-            self.recent_speakers.clear()
-            
-            # Update current meeting ID and initialize new storage
-            self.current_meeting_id = meeting_id
-            self.storage = SpeakerStorage(f"data/speakers.{meeting_id}.json")
-            logger.info(f"Storage initialized for meeting {meeting_id}")
-            
-            # Load speakers for new meeting if file exists
-            stored_speakers = self.storage.get_all_speakers()
-            for speaker_id, speaker_data in stored_speakers.items():
-                speaker = SpeakerEmbeddings(int(speaker_id), self.speaker_distance_threshold)
-                for embedding_data in speaker_data['embeddings']:
-                    speaker.add_embedding(
-                        embedding_data['duration'],
-                        embedding_data['embedding']
-                    )
-                self.speakers[int(speaker_id)] = speaker
-                self.last_speaker_id = max(self.last_speaker_id, int(speaker_id))
-            
-            if stored_speakers:
-                logger.info(f"Loaded {len(stored_speakers)} speakers for meeting {meeting_id}")
-            else:
-                logger.info(f"No existing speakers found for meeting {meeting_id}")
-                
-        except Exception as e:
-            logger.error(f"Error switching meeting: {e}")
-            raise
+        """Switch to a new meeting context
+
+        同一会议的所有会话共享说话人集合和存储；最近使用过的会议保存在 LRU 缓存中，切回时无需重新读取文件。
+        """
+        async with self._switch_lock:
+            try:
+                logger.info(f"Switching to meeting {meeting_id}")
+                if meeting_id == self.current_meeting_id:
+                    logger.info(f"Meeting {meeting_id} is already active")
+                    return
+
+                loop = asyncio.get_event_loop()
+                state = await loop.run_in_executor(None, self.meetings.acquire, meeting_id)
+                previous, self.meeting = self.meeting, state
+                # 离开之前的会议，最后一个会话离开时落盘并放入缓存
+                if previous.meeting_id is not None:
+                    await loop.run_in_executor(None, self.meetings.release, previous)
+
+            except Exception as e:
+                logger.error(f"Error switching meeting: {e}")
+                raise
 
     def get_embedding_by_file(self, file_path:str) -> np.ndarray:
-        if self.use_campplus:
-            embedding = self.model.inference(file_path)
-        else:
-            embedding = self.inference(file_path)
-            # numpy.ndarray (float32,256)
-        embedding = embedding.reshape(1, -1)
+        """解码WAV文件后与实时音频走同一条推理路径（进程内/推理进程、CAMPPlus/pyannote）"""
+        try:
+            with wave.open(file_path, 'rb') as wf:
+                sample_width = wf.getsampwidth()
+                sample_rate = wf.getframerate()
+                channels = wf.getnchannels()
+                frames = wf.readframes(wf.getnframes())
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Invalid WAV file: {e}")
+        if sample_width != 2:
+            raise ValueError("Only 16-bit PCM WAV files are supported")
+        audio = np.frombuffer(frames, dtype=np.int16)
+        if channels > 1:
+            audio = audio.reshape(-1, channels).mean(axis=1).astype(np.int16)
+        if sample_rate != self.MODEL_SAMPLE_RATE:
+            # embedding 模型按 16kHz 训练，其他采样率直接输入会得到错误的声纹
+            factor = gcd(sample_rate, self.MODEL_SAMPLE_RATE)
+            audio = resample_poly(audio.astype(np.float32), self.MODEL_SAMPLE_RATE // factor, sample_rate // factor)
+            audio = np.clip(audio, -32768, 32767).astype(np.int16)
+            sample_rate = self.MODEL_SAMPLE_RATE
+        embedding = self.get_embedding_from_buffer(audio, sample_rate)
+        if embedding is None:
+            raise ValueError("Audio file too short")
         return embedding
     
     # {"waveform": array or tensor, "sample_rate": int}
@@ -240,6 +496,10 @@ class Speaker:
         if total_duration < 0.1:  # 设置一个最小的有效时长，比如100ms
             logger.debug(f"Audio buffer too short: {total_duration:.2f}s")
             return None
+
+        if self.remote is not None:
+            embedding = self.remote.get_embedding_blocking(buf, sample_rate)
+            return embedding.reshape(1, -1) if embedding is not None else None
         
         if self.use_campplus:
             audio_tensor = memoryview_to_ndarray(buf, is_2d=True)
@@ -258,7 +518,41 @@ class Speaker:
             # logger.debug(f"Audio duration ({total_duration:.2f}s) < min_chunk_duration ({self.min_chunk_duration:.2f}s), will not update embeddings")
         
         return embedding
-    
+
+    def get_window_embeddings(self, buf, sample_rate:int, window:float = 1.5, hop:float = 0.5):
+        """按滑动窗口提取embedding序列
+
+        CAMPPlus 支持一次输入多段等长音频，所有窗口在一次前向中完成。
+
+        Returns:
+            (embeddings, centers): 形状 (n, d) 的embedding序列，以及每个窗口中心相对音频起点的时间(秒)
+        """
+        window_samples = int(window * sample_rate)
+        hop_samples = max(1, int(hop * sample_rate))
+        if buf is None or len(buf) < window_samples:
+            return None, None
+
+        audio = memoryview_to_ndarray(buf)
+        frames = np.lib.stride_tricks.sliding_window_view(audio, window_samples)[::hop_samples]
+        centers = (np.arange(len(frames)) * hop_samples + window_samples / 2) / sample_rate
+
+        if self.use_campplus:
+            results, _ = self.model.inference(np.ascontiguousarray(frames), device=self.device)
+            embeddings = results[0]["spk_embedding"].detach().cpu().numpy()
+        else:
+            embeddings = np.vstack([
+                self.get_embedding_from_buffer(buf[i * hop_samples:i * hop_samples + window_samples], sample_rate)
+                for i in range(len(frames))
+            ])
+        return embeddings, centers
+
+    async def get_window_embeddings_async(self, buf, sample_rate:int, window:float = 1.5, hop:float = 0.5):
+        if self.remote is not None:
+            if buf is None or len(buf) < int(window * sample_rate):
+                return None, None
+            return await self.remote.get_window_embeddings(buf, sample_rate, window, hop)
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self.get_window_embeddings, buf, sample_rate, window, hop)
+
     def calculate_segment_distance(self, seg1, seg2, sample_rate:int):
         """计算两个音频片段的距离（简化版）"""
         try:
@@ -298,85 +592,116 @@ class Speaker:
         wav_file.writeframes(buf)
         wav_file.close()
     
-    def get_speakerid_from_buffer(self, buf, sample_rate:int, allow_update:bool = True):
+    def get_speakerid_from_buffer(self, buf, sample_rate:int, allow_update:bool = True,
+                                  segment_time: Optional[Tuple[float, float]] = None):
+        """识别说话人
+
+        Args:
+            segment_time: 最终结果对应的 (开始时间, 结束时间)，提供时记录该片段的embedding用于会后重新聚类
+        """
         try:
             start_time = time.time()
             new_embedding = self.get_embedding_from_buffer(buf, sample_rate)
-            total_duration = len(buf) / sample_rate
-            if new_embedding is None:
-                return 0
-            
             # self.write_to_wav(buf, sample_rate)
+            return self._assign_speaker(new_embedding, len(buf) / sample_rate, allow_update, segment_time, start_time)
 
-            # 判断是否允许更新
-            if total_duration < self.min_chunk_duration:
-                allow_update = False
-
-            if not self.speakers:
-                # 时长不够不创建新说话人
-                if not allow_update:
-                    return 0
-                return self._add_new_speaker(new_embedding, total_duration)
-
-            # 首先检查最近的说话人
-            for speaker_id in self.recent_speakers:
-                rt, distance = self.speakers[speaker_id].is_same_speaker(
-                    new_embedding, 
-                    self.speaker_distance_threshold, 
-                    total_duration,
-                    allow_update
-                )
-                if rt:
-                    if allow_update:
-                        self._update_recent_speakers(speaker_id)
-                        self._update_speaker_storage(speaker_id)
-                    logger.info(f"Recent speaker found with id: {speaker_id}, time: {time.time() - start_time:.4f}s, distance: {distance:.4f}, duration: {total_duration:.3f}s")
-                    return speaker_id
-                else:
-                    # logger.debug(f"Recent speaker not found with id: {speaker_id}, time: {time.time() - start_time:.4f}s, distance: {distance:.4f}, duration: {total_duration:.3f}s")
-                    pass
-            
-            # 如果是短音频且没有找到完全匹配的说话人,从最近说话人中找最接近的
+        except Exception as e:
+            logger.error(f"Error getting speaker id from buffer: {e}")
+            return 0
+
+    def _assign_speaker(self, new_embedding, total_duration:float, allow_update:bool,
+                        segment_time: Optional[Tuple[float, float]], start_time:float):
+        """根据embedding确定说话人，并记录片段"""
+        if new_embedding is None:
+            return 0
+        with self.meeting.lock:
+            speaker_id = self._identify_speaker(new_embedding, total_duration, allow_update, start_time)
+            if segment_time is not None and speaker_id and self.storage:
+                self.storage.add_segment(segment_time[0], segment_time[1], speaker_id, new_embedding)
+        return speaker_id
+
+    def _identify_speaker(self, new_embedding, total_duration:float, allow_update:bool, start_time:float):
+        # 判断是否允许更新
+        if total_duration < self.min_chunk_duration:
+            allow_update = False
+
+        if not self.speakers:
+            # 时长不够不创建新说话人
             if not allow_update:
-                distances = []
-                for recent_id in self.recent_speakers:
-                    speaker = self.speakers[recent_id]
-                    if speaker.get_embedding() is not None:
-                        dist = cdist(new_embedding, speaker.get_embedding().reshape(1, -1), metric="cosine")[0,0]
-                        distances.append((recent_id, dist))
-                
-                if distances:
-                    # 找出距离最小的说话人
-                    closest_speaker_id = min(distances, key=lambda x: x[1])[0]
-                    logger.debug(f"Short audio: using closest recent speaker {closest_speaker_id}")
-                    return closest_speaker_id
                 return 0
-
-            # 如果最近的说话人中没有匹配，检查所有说话人
-            for speaker_id, speaker_embedding in self.speakers.items():
-                rt, distance = speaker_embedding.is_same_speaker(
-                    new_embedding, 
-                    self.speaker_distance_threshold, 
-                    total_duration,
-                    allow_update
-                )
-                if rt:
-                    if allow_update:
-                        self._update_recent_speakers(speaker_id)
-                        self._update_speaker_storage(speaker_id)
-                    logger.info(f"Speaker found with id: {speaker_id}, time: {time.time() - start_time:.4f}s, distance: {distance:.4f}, duration: {total_duration:.3f}s")
-                    return speaker_id
-
             return self._add_new_speaker(new_embedding, total_duration)
 
-        except Exception as e:
-            logger.error(f"Error getting speaker id from buffer: {e}")
+        # 首先检查最近的说话人
+        for speaker_id in self.recent_speakers:
+            rt, distance = self.speakers[speaker_id].is_same_speaker(
+                new_embedding, 
+                self.speaker_distance_threshold, 
+                total_duration,
+                allow_update
+            )
+            if rt:
+                if allow_update:
+                    self._update_recent_speakers(speaker_id)
+                    self._update_speaker_storage(speaker_id)
+                logger.info(f"Recent speaker found with id: {speaker_id}, time: {time.time() - start_time:.4f}s, distance: {distance:.4f}, duration: {total_duration:.3f}s")
+                return speaker_id
+            else:
+                # logger.debug(f"Recent speaker not found with id: {speaker_id}, time: {time.time() - start_time:.4f}s, distance: {distance:.4f}, duration: {total_duration:.3f}s")
+                pass
+        
+        # 如果是短音频且没有找到完全匹配的说话人,从最近说话人中找最接近的
+        if not allow_update:
+            distances = []
+            for recent_id in self.recent_speakers:
+                speaker = self.speakers[recent_id]
+                if speaker.get_embedding() is not None:
+                    dist = cdist(new_embedding, speaker.get_embedding().reshape(1, -1), metric="cosine")[0,0]
+                    distances.append((recent_id, dist))
+            
+            if distances:
+                # 找出距离最小的说话人
+                closest_speaker_id = min(distances, key=lambda x: x[1])[0]
+                logger.debug(f"Short audio: using closest recent speaker {closest_speaker_id}")
+                return closest_speaker_id
             return 0
 
+        # 如果最近的说话人中没有匹配，检查所有说话人
+        for speaker_id, speaker_embedding in self.speakers.items():
+            rt, distance = speaker_embedding.is_same_speaker(
+                new_embedding, 
+                self.speaker_distance_threshold, 
+                total_duration,
+                allow_update
+            )
+            if rt:
+                if allow_update:
+                    self._update_recent_speakers(speaker_id)
+                    self._update_speaker_storage(speaker_id)
+                logger.info(f"Speaker found with id: {speaker_id}, time: {time.time() - start_time:.4f}s, distance: {distance:.4f}, duration: {total_duration:.3f}s")
+                return speaker_id
+
+        return self._add_new_speaker(new_embedding, total_duration)
+
     def _add_new_speaker(self, embedding, duration):
+        # 先在声纹库中查找，已登记的说话人复用本会议中关联的ID
+        voiceprint = None
+        if self.library is not None:
+            voiceprint = self.library.match(embedding, self.library_threshold)
+        if voiceprint:
+            for speaker_id, speaker in self.speakers.items():
+                if speaker.voiceprint_id == voiceprint['id']:
+                    speaker.add_embedding(duration, embedding)
+                    self._update_recent_speakers(speaker_id)
+                    self._update_speaker_storage(speaker_id)
+                    logger.info(f"Voiceprint {voiceprint['id']} ({voiceprint['name']}) matched speaker {speaker_id}, distance: {voiceprint['distance']:.4f}")
+                    return speaker_id
+
         self.last_speaker_id += 1
         speaker = SpeakerEmbeddings(self.last_speaker_id, self.speaker_distance_threshold)
         speaker.add_embedding(duration, embedding)
+        if voiceprint:
+            speaker.voiceprint_id = voiceprint['id']
+            logger.info(f"New speaker {self.last_speaker_id} linked to voiceprint {voiceprint['id']} ({voiceprint['name']}), distance: {voiceprint['distance']:.4f}")
         self.speakers[self.last_speaker_id] = speaker
         if not self.storage:
             logger.warning(f'_add_new_speaker meeting null storage, reinit with meeting id: {self.current_meeting_id} ')
@@ -398,8 +723,20 @@ class Speaker:
             self.recent_speakers.remove(speaker_id)
         self.recent_speakers.appendleft(speaker_id)
 
-    async def get_speakerid_from_buffer_async(self, buf, sample_rate:int, allow_update:bool = True):
-        return await asyncio.get_event_loop().run_in_executor(None, self.get_speakerid_from_buffer, buf, sample_rate, allow_update)
+    async def get_speakerid_from_buffer_async(self, buf, sample_rate:int, allow_update:bool = True,
+                                              segment_time: Optional[Tuple[float, float]] = None):
+        if self.remote is not None:
+            # embedding 在推理进程中计算，说话人匹配和记录在本进程完成
+            try:
+                start_time = time.time()
+                new_embedding = await self.remote.get_embedding(buf, sample_rate)
+                return await asyncio.get_event_loop().run_in_executor(
+                    None, self._assign_speaker, new_embedding, len(buf) / sample_rate, allow_update, segment_time, start_time
+                )
+            except Exception as e:
+                logger.error(f"Error getting speaker id from buffer: {e}")
+                return 0
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self.get_speakerid_from_buffer, buf, sample_rate, allow_update, segment_time)
 
     def get_distance_by_file(self, file_path_1:str, file_path_2:str):
         embedding_1 = self.get_embedding_by_file(file_path_1)
@@ -415,6 +752,26 @@ class Speaker:
         except Exception as e:
             logger.error(f"Failed to update speaker {speaker_id}: {e}")
 
+    def enroll_voiceprint(self, name: str, speaker_id: Optional[int] = None, file_path: Optional[str] = None) -> dict:
+        """将当前会议的说话人或音频文件登记到声纹库"""
+        if self.library is None:
+            raise ValueError("Voiceprint library is disabled")
+        if speaker_id is not None:
+            embedding = self.get_speaker_embedding(speaker_id)
+            if embedding is None:
+                raise ValueError(f"Speaker {speaker_id} not found")
+        elif file_path is not None:
+            embedding = self.get_embedding_by_file(file_path)
+        else:
+            raise ValueError("speaker_id or file is required")
+
+        voiceprint = self.library.enroll(name, embedding)
+        if speaker_id is not None:
+            with self.meeting.lock:
+                self.speakers[speaker_id].voiceprint_id = voiceprint['id']
+                self._update_speaker_storage(speaker_id)
+        return voiceprint
+
     def get_speaker_embedding(self, speaker_id: int) -> Optional[np.ndarray]:
         """获取指定说话人的平均embedding"""
         speaker = self.speakers.get(speaker_id)
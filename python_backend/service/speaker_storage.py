@@ -5,6 +5,8 @@ import os
 from typing import Dict, Optional
 from pathlib import Path
 import threading
+import time
+import glob
 
 class NumpyEncoder(json.JSONEncoder):
     """处理numpy数据类型的JSON编码器"""
@@ -17,15 +19,134 @@ class NumpyEncoder(json.JSONEncoder):
             return float(obj)
         return super().default(obj)
 
+class SegmentLog:
+    """Append-only log of final segment embeddings, used for batch re-clustering
+
+    File layout: b'SEG1' + uint32 embedding dim, followed by fixed-size records
+    (start float64, end float64, speaker_id int32, embedding float32[dim]).
+    If the embedding dim changes (e.g. the speaker model was switched), the existing
+    log is rotated to {path}.{timestamp}.bak and a new log is started.
+    """
+    MAGIC = b'SEG1'
+    HEADER_SIZE = 8
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def record_dtype(dim: int) -> np.dtype:
+        return np.dtype([
+            ('start', '<f8'),
+            ('end', '<f8'),
+            ('speaker_id', '<i4'),
+            ('embedding', '<f4', (dim,))
+        ])
+
+    def append(self, start: float, end: float, speaker_id: int, embedding: np.ndarray):
+        with self._lock:
+            self._pending.append((start, end, speaker_id, np.asarray(embedding, dtype=np.float32).reshape(-1)))
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._pending)
+
+    @classmethod
+    def read_dim(cls, path: str) -> Optional[int]:
+        """Embedding dim from the file header, None if the file is missing, empty or invalid"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(cls.HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+        if len(header) < cls.HEADER_SIZE or header[:4] != cls.MAGIC:
+            return None
+        return int(np.frombuffer(header[4:], dtype=np.uint32)[0])
+
+    def _rotate(self, reason: str):
+        rotated_path = f"{self.path}.{int(time.time())}.bak"
+        os.replace(self.path, rotated_path)
+        logging.warning(f"Rotated segment log {self.path} -> {rotated_path}: {reason}")
+
+    def flush(self):
+        """Append pending records to the log file"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        dim = pending[0][3].size
+        mismatched = [p for p in pending if p[3].size != dim]
+        if mismatched:
+            logging.warning(f"Dropped {len(mismatched)} segments with embedding dim != {dim}")
+            pending = [p for p in pending if p[3].size == dim]
+        records = np.zeros(len(pending), dtype=self.record_dtype(dim))
+        for i, (start, end, speaker_id, embedding) in enumerate(pending):
+            records[i] = (start, end, speaker_id, embedding)
+        try:
+            file_dim = self.read_dim(self.path)
+            if file_dim is None and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                self._rotate("invalid header")
+            elif file_dim is not None and file_dim != dim:
+                self._rotate(f"embedding dim changed from {file_dim} to {dim}")
+            exists = os.path.exists(self.path) and os.path.getsize(self.path) >= self.HEADER_SIZE
+            with open(self.path, 'ab') as f:
+                if not exists:
+                    f.write(self.MAGIC + np.uint32(dim).tobytes())
+                f.write(records.tobytes())
+            logging.debug(f"Appended {len(pending)} segments to {self.path}")
+        except Exception as e:
+            logging.error(f"Failed to append segments to {self.path}: {e}", exc_info=True)
+
+    @classmethod
+    def read(cls, path: str) -> Optional[np.ndarray]:
+        """Read all records as a structured array"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            header = f.read(cls.HEADER_SIZE)
+            if len(header) < cls.HEADER_SIZE or header[:4] != cls.MAGIC:
+                raise ValueError(f"Invalid segment log: {path}")
+            dim = int(np.frombuffer(header[4:], dtype=np.uint32)[0])
+            data = f.read()
+        dtype = cls.record_dtype(dim)
+        # 忽略崩溃时写了一半的记录
+        count = len(data) // dtype.itemsize
+        return np.frombuffer(data[:count * dtype.itemsize], dtype=dtype)
+
+
+def get_segment_log_path(storage_path: str) -> str:
+    """data/speakers.{meeting_id}.npz -> data/speakers.{meeting_id}.segments.bin"""
+    return f"{os.path.splitext(storage_path)[0]}.segments.bin"
+
+
 class SpeakerStorage:
-    """Speaker embedding storage using JSON file"""
+    """Speaker embedding storage using JSON file
+
+    With flush_interval > 0 updates are write-behind: add_or_update_speaker only
+    marks the speaker dirty, and a background thread writes the file at most once
+    per interval. Call flush()/close() before switching meetings or shutting down.
+    """
     
-    def __init__(self, storage_path: str):
+    def __init__(self, storage_path: str, flush_interval: float = 0.0):
         self.storage_path = storage_path
         self.speakers: Dict[str, Dict] = {}
         self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = set()
+        self.flush_interval = flush_interval
+        self._stop_event = threading.Event()
+        self._flush_thread = None
+        self.segment_log = SegmentLog(get_segment_log_path(storage_path))
         self._ensure_storage_dir()
         self._load_speakers()  # Only load if file exists
+        if self.flush_interval > 0:
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop,
+                name=f"speaker-storage-flush:{os.path.basename(storage_path)}",
+                daemon=True
+            )
+            self._flush_thread.start()
         
     def _ensure_storage_dir(self):
         """Ensure storage directory exists"""
@@ -39,65 +160,83 @@ class SpeakerStorage:
             
         try:
             with self._lock:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-            # Convert string arrays back to numpy arrays
-            for speaker_id, speaker_data in data.items():
-                embeddings = speaker_data['embeddings']
-                speaker_data['embeddings'] = [
-                    {
-                        'duration': float(e['duration']),
-                        'embedding': np.array(e['embedding'], dtype=np.float32)
-                    }
-                    for e in embeddings
-                ]
-                if 'average_embedding' in speaker_data:
-                    speaker_data['average_embedding'] = np.array(
-                        speaker_data['average_embedding'], 
-                        dtype=np.float32
-                    )
-                speaker_data['average_distance'] = float(speaker_data['average_distance'])
-                speaker_data['adaptive_threshold'] = float(speaker_data.get('adaptive_threshold', 0.25))
-                self.speakers[speaker_id] = speaker_data
-                
+                self.speakers = self._read_file(self.storage_path)
             logging.info(f"Loaded {len(self.speakers)} speakers from storage")
         except Exception as e:
             logging.error(f"Failed to load speakers: {e}", exc_info=True)
+
+    def _read_file(self, path: str) -> Dict[str, Dict]:
+        """Read speakers from a JSON file"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # Convert string arrays back to numpy arrays
+        for speaker_id, speaker_data in data.items():
+            embeddings = speaker_data['embeddings']
+            speaker_data['embeddings'] = [
+                {
+                    'duration': float(e['duration']),
+                    'embedding': np.array(e['embedding'], dtype=np.float32)
+                }
+                for e in embeddings
+            ]
+            if 'average_embedding' in speaker_data:
+                speaker_data['average_embedding'] = np.array(
+                    speaker_data['average_embedding'], 
+                    dtype=np.float32
+                )
+            speaker_data['average_distance'] = float(speaker_data['average_distance'])
+            speaker_data['adaptive_threshold'] = float(speaker_data.get('adaptive_threshold', 0.25))
+        return data
+
+    def _write_file(self, path: str, speakers: Dict[str, Dict]):
+        """Write speakers to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(
+                speakers,
+                f,
+                cls=NumpyEncoder,
+                ensure_ascii=False,
+                indent=2  # 美化输出
+            )
             
     def _save_speakers(self):
         """Save speakers to storage file"""
-        try:
+        temp_path = f"{self.storage_path}.tmp"
+        # 快照在写锁内获取：并发的写回线程和 flush() 按快照顺序写入，旧快照不会覆盖新数据
+        with self._write_lock:
+            # _lock 内只做快照，磁盘写入不阻塞更新
             with self._lock:
+                speakers = dict(self.speakers)
+                dirty, self._dirty = self._dirty, set()
+            try:
                 # 创建临时文件
-                temp_path = f"{self.storage_path}.tmp"
-                with open(temp_path, 'w', encoding='utf-8') as f:
-                    json.dump(
-                        self.speakers,
-                        f,
-                        cls=NumpyEncoder,
-                        ensure_ascii=False,
-                        indent=2  # 美化输出
-                    )
+                self._write_file(temp_path, speakers)
                 
                 # 原子性地替换文件
                 os.replace(temp_path, self.storage_path)
-                
-            logging.info(f"Saved {len(self.speakers)} speakers to storage")
-        except Exception as e:
-            logging.error(f"Failed to save speakers: {e}", exc_info=True)
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
+            except Exception as e:
+                # 写入失败时恢复脏标记，下次写回时重试
+                with self._lock:
+                    self._dirty |= dirty
+                logging.error(f"Failed to save speakers: {e}", exc_info=True)
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except:
+                        pass
+                return
+        logging.info(f"Saved {len(speakers)} speakers to storage")
             
     def add_or_update_speaker(self, speaker_id: str, speaker_data: Dict):
         """Add new speaker or update existing speaker data"""
         try:
-            is_new = speaker_id not in self.speakers
-            self.speakers[speaker_id] = speaker_data
-            self._save_speakers()
+            with self._lock:
+                is_new = speaker_id not in self.speakers
+                self.speakers[speaker_id] = speaker_data
+                self._dirty.add(speaker_id)
+            if self._flush_thread is None:
+                self._save_speakers()
             
             if is_new:
                 logging.info(f"Added new speaker {speaker_id} with {len(speaker_data['embeddings'])} embeddings")
@@ -118,6 +257,162 @@ class SpeakerStorage:
         
     def remove_speaker(self, speaker_id: str):
         """Remove speaker by ID"""
-        if speaker_id in self.speakers:
+        with self._lock:
+            if speaker_id not in self.speakers:
+                return
             del self.speakers[speaker_id]
-            self._save_speakers()
\ No newline at end of file
+            self._dirty.add(speaker_id)
+        if self._flush_thread is None:
+            self._save_speakers()
+
+    def add_segment(self, start: float, end: float, speaker_id: int, embedding: np.ndarray):
+        """Record the embedding of a final segment"""
+        self.segment_log.append(start, end, speaker_id, embedding)
+        if self._flush_thread is None:
+            self.segment_log.flush()
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._dirty) or self.segment_log.is_dirty
+
+    def flush(self):
+        """Write pending updates to disk"""
+        self.segment_log.flush()
+        if not self._dirty:
+            return
+        dirty_count = len(self._dirty)
+        self._save_speakers()
+        logging.debug(f"Flushed {dirty_count} dirty speakers to {self.storage_path}")
+
+    def _flush_loop(self):
+        """Background write-behind loop"""
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the background flush thread and write pending updates"""
+        self._stop_event.set()
+        if self._flush_thread is not None and self._flush_thread is not threading.current_thread():
+            self._flush_thread.join(timeout=self.flush_interval + 5.0)
+        self._flush_thread = None
+        self.flush()
+
+
+class BinarySpeakerStorage(SpeakerStorage):
+    """Speaker embedding storage using a compact .npz file
+
+    All embeddings are packed into float32 matrices instead of JSON float lists:
+    - ids / counts: speaker IDs and number of embeddings per speaker
+    - durations / embeddings: concatenated embeddings of all speakers
+    - average_embeddings / average_distances / adaptive_thresholds / voiceprint_ids: one row per speaker
+    """
+
+    # 最近读取的文件中的向量维度，说话人全部删除后仍按该维度写入空矩阵
+    embedding_dim = 0
+
+    @staticmethod
+    def _stack(vectors, dim: int) -> np.ndarray:
+        """把向量列表堆叠为 (n, dim) 的 float32 矩阵，列表为空时返回 (0, dim) 的空矩阵"""
+        if not vectors:
+            return np.zeros((0, dim), dtype=np.float32)
+        return np.stack([np.asarray(v, dtype=np.float32).reshape(-1) for v in vectors])
+
+    def _read_file(self, path: str) -> Dict[str, Dict]:
+        """Read speakers from a .npz file"""
+        speakers = {}
+        with np.load(path) as data:
+            ids = data['ids']
+            counts = data['counts']
+            durations = data['durations']
+            embeddings = data['embeddings']
+            average_embeddings = data['average_embeddings']
+            average_distances = data['average_distances']
+            adaptive_thresholds = data['adaptive_thresholds']
+            voiceprint_ids = data['voiceprint_ids'] if 'voiceprint_ids' in data.files else [''] * len(ids)
+        if embeddings.ndim == 2:
+            self.embedding_dim = embeddings.shape[1]
+
+        offset = 0
+        for i, speaker_id in enumerate(ids):
+            count = int(counts[i])
+            speakers[str(speaker_id)] = {
+                'embeddings': [
+                    {
+                        'duration': float(durations[j]),
+                        'embedding': embeddings[j].reshape(1, -1)
+                    }
+                    for j in range(offset, offset + count)
+                ],
+                'average_embedding': average_embeddings[i].reshape(1, -1),
+                'average_distance': float(average_distances[i]),
+                'adaptive_threshold': float(adaptive_thresholds[i]),
+                'voiceprint_id': str(voiceprint_ids[i])
+            }
+            offset += count
+        return speakers
+
+    def _write_file(self, path: str, speakers: Dict[str, Dict]):
+        """Write speakers to a .npz file"""
+        ids = list(speakers.keys())
+        speakers = [speakers[speaker_id] for speaker_id in ids]
+        all_embeddings = [e for speaker in speakers for e in speaker['embeddings']]
+        if all_embeddings:
+            self.embedding_dim = np.asarray(all_embeddings[0]['embedding']).size
+
+        # np.savez 会为路径自动追加 .npz 后缀，因此写入文件对象
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                ids=np.array(ids, dtype=str),
+                counts=np.array([len(speaker['embeddings']) for speaker in speakers], dtype=np.int32),
+                durations=np.array([e['duration'] for e in all_embeddings], dtype=np.float32),
+                embeddings=self._stack([e['embedding'] for e in all_embeddings], self.embedding_dim),
+                average_embeddings=self._stack([speaker['average_embedding'] for speaker in speakers], self.embedding_dim),
+                average_distances=np.array([speaker['average_distance'] for speaker in speakers], dtype=np.float32),
+                adaptive_thresholds=np.array([speaker.get('adaptive_threshold', 0.25) for speaker in speakers], dtype=np.float32),
+                voiceprint_ids=np.array([speaker.get('voiceprint_id') or '' for speaker in speakers], dtype=str)
+            )
+
+
+STORAGE_FORMATS = {
+    'json': ('.json', SpeakerStorage),
+    'npz': ('.npz', BinarySpeakerStorage),
+}
+
+
+def get_speaker_storage_path(base_path: str, meeting_id, storage_format: str = 'json') -> str:
+    """根据配置的存储路径生成会议对应的文件路径: data/speakers.json -> data/speakers.{meeting_id}.npz"""
+    root, _ = os.path.splitext(base_path)
+    return f"{root}.{meeting_id}{STORAGE_FORMATS[storage_format][0]}"
+
+
+def migrate_json_to_binary(json_path: str, binary_path: Optional[str] = None) -> str:
+    """将JSON格式的说话人文件转换为 .npz 格式，原文件保留"""
+    if binary_path is None:
+        binary_path = f"{os.path.splitext(json_path)[0]}.npz"
+    source = SpeakerStorage(json_path)
+    target = BinarySpeakerStorage(binary_path)
+    target.speakers = dict(source.get_all_speakers())
+    target._save_speakers()
+    logging.info(f"Migrated {len(target.speakers)} speakers: {json_path} -> {binary_path}")
+    return binary_path
+
+
+def open_speaker_storage(base_path: str, meeting_id, storage_format: str = 'json', flush_interval: float = 0.0) -> SpeakerStorage:
+    """打开会议的说话人存储，二进制格式不存在而旧JSON存在时自动迁移"""
+    storage_cls = STORAGE_FORMATS[storage_format][1]
+    storage_path = get_speaker_storage_path(base_path, meeting_id, storage_format)
+    if storage_format != 'json' and not os.path.exists(storage_path):
+        json_path = get_speaker_storage_path(base_path, meeting_id, 'json')
+        if os.path.exists(json_path):
+            migrate_json_to_binary(json_path, storage_path)
+    return storage_cls(storage_path, flush_interval=flush_interval)
+
+
+if __name__ == '__main__':
+    # 一次性迁移: python -m service.speaker_storage [data/speakers.*.json ...]
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    paths = sys.argv[1:] or glob.glob('data/speakers.*.json')
+    for json_path in paths:
+        migrate_json_to_binary(json_path)
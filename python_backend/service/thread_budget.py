@@ -0,0 +1,168 @@
+import os
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any
+
+from config.config_manager import config
+
+logger = logging.getLogger(__name__)
+
+# 按此顺序从第一个可用核开始依次分配
+COMPONENTS = ('asr', 'vad', 'speaker', 'embedding')
+
+
+def pin_current_thread(cores: Optional[List[int]]):
+    """把当前线程绑定到指定CPU核（Linux下 pid 0 表示当前线程），之后创建的推理线程继承该绑定"""
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass
+class ComponentLayout:
+    """一个组件的线程分配：workers 个推理线程，每个线程使用 threads 个 intra-op 线程，绑定到各自的一组核"""
+    name: str
+    workers: int
+    threads: int
+    core_sets: List[List[int]] = field(default_factory=list)
+    uses_torch: bool = False
+    _counter: Any = field(default_factory=itertools.count, repr=False)
+
+    def next_cores(self) -> List[int]:
+        """推理线程依次轮流使用各组核（VAD 每个会话一个线程，多于 workers 时共用）"""
+        return self.core_sets[next(self._counter) % len(self.core_sets)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'threads': self.threads,
+            'core_sets': self.core_sets,
+            'torch': self.uses_torch,
+        }
+
+
+class ThreadBudget:
+    """CPU 线程预算
+
+    torch（VAD JIT、CAMPPlus、SenseVoice torch 版、bge-m3）、onnxruntime（SenseVoice、silero）和各线程池
+    默认都按机器核数开线程，同时推理时严重超额订阅。启用后按 config.yaml 的 threads 配置统一分配：
+    - asr / vad / speaker / embedding 各自 workers 个推理线程，每个线程 threads 个 intra-op 线程，
+      依次分配互不重叠的核，推理线程绑定到分配的核，在其中创建的 ONNX 会话和 OpenMP 线程继承绑定
+    - ONNX 的 intra-op 线程数按会话设置；torch 的 intra-op 线程数是进程级的，取使用 torch 的组件中的最大值，
+      inter-op 线程数只能在首次并行前设置一次
+    - 核不够分时按顺序循环复用并告警（oversubscribed）
+    """
+
+    def __init__(self, threads_config: Optional[Dict[str, Any]] = None):
+        self._torch_applied = False
+        self.configure(threads_config or config.threads_config)
+
+    def configure(self, threads_config: Dict[str, Any]):
+        """按配置重新计算分配，只影响之后创建的线程池和模型（基准测试切换布局时使用）"""
+        self.enabled = threads_config['enable']
+        self.pin = threads_config['pin'] and hasattr(os, 'sched_setaffinity')
+        self.torch_inter_op = threads_config['torch_inter_op']
+        self.default_executor_workers = threads_config['default_executor']
+
+        cores = available_cores()
+        if threads_config['cores'] > 0:
+            cores = cores[:threads_config['cores']]
+        self.cores = cores
+
+        torch_components = {
+            'asr': not config.audio_config['asr']['use_onnx'],
+            'vad': not config.vad_config['use_onnx'],
+            'speaker': True,
+            'embedding': True,
+        }
+        self.components: Dict[str, ComponentLayout] = {}
+        offset = 0
+        for name in COMPONENTS:
+            workers = max(1, threads_config[name]['workers'])
+            threads = max(1, threads_config[name]['threads'])
+            core_sets = []
+            for _ in range(workers):
+                core_sets.append(sorted({cores[(offset + i) % len(cores)] for i in range(threads)}))
+                offset += threads
+            self.components[name] = ComponentLayout(name, workers, threads, core_sets, torch_components[name])
+        self.oversubscribed = offset > len(cores)
+        self.torch_threads = max([c.threads for c in self.components.values() if c.uses_torch] or [1])
+
+    def apply_environment(self):
+        """设置 OpenMP/MKL 线程数环境变量，必须在导入 torch / onnxruntime 之前调用，已设置的环境变量优先"""
+        if not self.enabled:
+            return
+        for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ.setdefault(name, str(self.torch_threads))
+
+    def apply_torch(self):
+        """设置 torch 进程级线程数，在加载模型前调用"""
+        if not self.enabled or self._torch_applied:
+            return
+        import torch
+        torch.set_num_threads(self.torch_threads)
+        try:
+            torch.set_num_interop_threads(self.torch_inter_op)
+        except RuntimeError as e:
+            # 已经执行过并行计算或已设置过
+            logger.warning(f"Failed to set torch inter-op threads: {str(e)}")
+        self._torch_applied = True
+
+    def executor(self, name: str, max_workers: Optional[int] = None) -> Optional[ThreadPoolExecutor]:
+        """创建组件的推理线程池，线程绑定到组件的核；未启用时返回 None，调用方使用原来的线程池"""
+        if not self.enabled:
+            return None
+        component = self.components[name]
+        return ThreadPoolExecutor(
+            max_workers=max_workers or component.workers,
+            thread_name_prefix=name,
+            initializer=self._init_thread,
+            initargs=(component,)
+        )
+
+    def _init_thread(self, component: ComponentLayout):
+        cores = component.next_cores()
+        if self.pin:
+            pin_current_thread(cores)
+
+    def install_default_executor(self, loop: asyncio.AbstractEventLoop):
+        """限制 asyncio 默认线程池（存储落盘、文件读写等）的线程数"""
+        if self.enabled and self.default_executor_workers > 0:
+            loop.set_default_executor(ThreadPoolExecutor(
+                max_workers=self.default_executor_workers, thread_name_prefix='default'
+            ))
+
+    def layout(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'cores': len(self.cores),
+            'pin': self.pin,
+            'oversubscribed': self.oversubscribed,
+            'torch_threads': self.torch_threads,
+            'torch_inter_op': self.torch_inter_op,
+            'default_executor': self.default_executor_workers,
+            'components': {name: c.to_dict() for name, c in self.components.items()},
+        }
+
+    def log_layout(self):
+        if not self.enabled:
+            logger.info("Thread budget disabled, libraries use their default thread counts")
+            return
+        logger.info(f"Thread budget: {len(self.cores)} cores, pin: {self.pin}, torch threads: {self.torch_threads}, "
+                    f"torch inter-op: {self.torch_inter_op}, default executor: {self.default_executor_workers}")
+        for name, component in self.components.items():
+            logger.info(f"  {name:<9} workers={component.workers} threads={component.threads} "
+                        f"torch={component.uses_torch} cores={component.core_sets}")
+        if self.oversubscribed:
+            logger.warning(f"Thread budget needs more than {len(self.cores)} cores, some cores are shared")
+
+
+thread_budget = ThreadBudget()
@@ -1,3 +1,4 @@
+import copy
 import logging
 import torch
 import numpy as np
@@ -8,6 +9,8 @@ from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 from config.config_manager import config
+from .thread_budget import thread_budget
+from .model_registry import model_registry, warmup_audio
 
 logger = logging.getLogger(__name__)
 
@@ -55,11 +58,11 @@ class VoiceDetector:
     - 通道：单通道
     """
     
-    def __init__(self):
+    def __init__(self, shared: Optional['VoiceDetector'] = None):
         """初始化VAD检测器
         
         Args:
-            use_onnx: 是否使用ONNX推理
+            shared: 已加载模型的VAD检测器，传入时复用其模型（每个会话保持独立的模型状态）
         """
         self.sample_rate = config.audio_config['sample_rate']
         self.use_onnx = config.vad_config['use_onnx']
@@ -67,7 +70,10 @@ class VoiceDetector:
         self.exp_filter_alpha = config.vad_config.get('exp_filter_alpha', 0.8)
         
         # 初始化模型和配置
-        self._init_model()
+        if shared is not None:
+            self._init_model_from(shared)
+        else:
+            self._init_model()
         self._init_configs()
         
         # 状态管理
@@ -78,8 +84,8 @@ class VoiceDetector:
         # 平滑处理
         self.exp_filter = ExpFilter(alpha=self.exp_filter_alpha)
         
-        # 线程池用于模型推理
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        # 线程池用于模型推理，启用线程预算时绑定到 VAD 的核
+        self.executor = thread_budget.executor('vad', max_workers=1) or ThreadPoolExecutor(max_workers=1)
         
         # VAD 状态
         self.is_speaking = False
@@ -89,14 +95,17 @@ class VoiceDetector:
         """初始化VAD模型"""
         try:
             if self.use_onnx:
+                # 本地模型目录中有 torch hub 仓库时不联网
+                repo_dir = model_registry.resolve('silero_vad')
                 model, utils = torch.hub.load(
-                    repo_or_dir="snakers4/silero-vad",
+                    repo_or_dir=repo_dir or "snakers4/silero-vad",
                     model="silero_vad",
+                    source='local' if repo_dir else 'github',
                     onnx=True,
                     force_reload=False
                 )
             else:
-                model = torch.jit.load("models/silero_vad.jit")
+                model = torch.jit.load(self._jit_path())
                 model.eval()
             self.model = model
             logger.info("VAD model loaded successfully")
@@ -104,6 +113,32 @@ class VoiceDetector:
             logger.error(f"Failed to load VAD model: {str(e)}")
             raise
             
+    def _init_model_from(self, shared: 'VoiceDetector'):
+        """复用已加载的VAD模型
+
+        silero VAD 在模型对象内保存RNN状态，不能在会话间直接共享：
+        ONNX 模型浅拷贝后共享推理会话、重置状态；JIT 模型重新加载（体积很小）。
+        """
+        if self.use_onnx:
+            self.model = copy.copy(shared.model)
+            self.model.reset_states()
+        else:
+            self.model = torch.jit.load(self._jit_path())
+            self.model.eval()
+
+    @staticmethod
+    def _jit_path() -> str:
+        return model_registry.resolve('silero_vad_jit', fallback="models/silero_vad.jit") or "models/silero_vad.jit"
+
+    def warm_up(self, duration: float):
+        """用一段噪声逐帧推理，完成推理内核的初始化，之后重置模型状态"""
+        audio = warmup_audio(duration, self.sample_rate).astype(np.float32) / 32768.0
+        # silero VAD 在 16kHz 下每次输入 512 个采样点
+        for start in range(0, len(audio) - 511, 512):
+            self._inference(audio[start:start + 512])
+        self.model.reset_states()
+        self.exp_filter.last_value = None
+
     def _init_configs(self):
         """初始化VAD配置"""
         # 使用新的配置访问方式
@@ -0,0 +1,272 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceprintLibrary:
+    """跨会议的声纹库
+
+    存储归一化后的说话人embedding，使用 IVF（倒排文件）索引做近似最近邻查找：
+    - 声纹数量小于 brute_force_limit 时直接做矩阵向量乘（精确查找）
+    - 超过后用 k-means 训练 nlist 个聚类中心，查询时只扫描最近的 nprobe 个倒排列表
+    - 声纹数量比上次训练翻倍时重新训练
+
+    全部数据保存在 {path}/library.npz 中，写入时使用临时文件原子替换。
+    flush_interval > 0 时登记/删除只标记脏数据，由后台线程每个间隔最多写盘一次，
+    批量登记时不会每条都重写整个文件；关闭前调用 close() 写入剩余更新。
+    """
+
+    def __init__(self, path: str = "data/voiceprints", nprobe: int = 8, brute_force_limit: int = 2048,
+                 flush_interval: float = 0.0):
+        self.path = path
+        self.file_path = os.path.join(path, "library.npz")
+        self.nprobe = nprobe
+        self.brute_force_limit = brute_force_limit
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._stop_event = threading.Event()
+        self._flush_thread = None
+
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.created_at = np.zeros(0, dtype=np.float64)
+        self.vectors: Optional[np.ndarray] = None  # (n, d) float32, 已归一化
+
+        # IVF 索引
+        self.centroids: Optional[np.ndarray] = None  # (nlist, d)
+        self.assignments = np.zeros(0, dtype=np.int32)  # 每个声纹所属的聚类
+        self._list_order = np.zeros(0, dtype=np.int64)  # 按聚类排序后的声纹下标
+        self._list_offsets = np.zeros(1, dtype=np.int64)  # 每个聚类在 _list_order 中的起止位置
+        self._trained_size = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        if self.flush_interval > 0:
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, name="voiceprint-library-flush", daemon=True
+            )
+            self._flush_thread.start()
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        return vector / max(float(np.linalg.norm(vector)), 1e-8)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _load(self):
+        """加载声纹库文件"""
+        if not os.path.exists(self.file_path):
+            logger.info(f"No voiceprint library found at {self.file_path}")
+            return
+        try:
+            with np.load(self.file_path) as data:
+                self.ids = [str(i) for i in data['ids']]
+                self.names = [str(n) for n in data['names']]
+                self.created_at = data['created_at']
+                self.vectors = data['vectors'] if len(self.ids) else None
+                if 'centroids' in data.files and data['centroids'].size:
+                    self.centroids = data['centroids']
+                    self.assignments = data['assignments']
+                    self._trained_size = len(self.ids)
+            self._rebuild_lists()
+            logger.info(f"Loaded {len(self.ids)} voiceprints from {self.file_path}")
+        except Exception as e:
+            logger.error(f"Failed to load voiceprint library: {e}", exc_info=True)
+
+    def _write_file(self, path: str, snapshot: Dict[str, np.ndarray]):
+        with open(path, 'wb') as f:
+            np.savez(f, **snapshot)
+
+    def _snapshot(self) -> Dict[str, np.ndarray]:
+        """在 _lock 内调用；数组在更新时整体替换而不是原地修改，快照只需复制列表"""
+        dim = self.vectors.shape[1] if self.vectors is not None else 0
+        return {
+            'ids': np.array(self.ids, dtype=str),
+            'names': np.array(self.names, dtype=str),
+            'created_at': self.created_at,
+            'vectors': self.vectors if self.vectors is not None else np.zeros((0, dim), dtype=np.float32),
+            'centroids': self.centroids if self.centroids is not None else np.zeros((0, dim), dtype=np.float32),
+            'assignments': self.assignments,
+        }
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self):
+        """原子写入声纹库文件，写入失败时保留脏标记并抛出异常"""
+        temp_path = f"{self.file_path}.tmp"
+        # 快照在写锁内获取，并发的 flush 按快照顺序写入，旧快照不会覆盖新数据
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = self._snapshot()
+                self._dirty = False
+            try:
+                self._write_file(temp_path, snapshot)
+                os.replace(temp_path, self.file_path)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+                raise
+        logger.debug(f"Saved {len(snapshot['ids'])} voiceprints to {self.file_path}")
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to save voiceprint library: {e}", exc_info=True)
+
+    def close(self):
+        """停止后台写盘线程并写入剩余更新"""
+        self._stop_event.set()
+        if self._flush_thread is not None and self._flush_thread is not threading.current_thread():
+            self._flush_thread.join(timeout=self.flush_interval + 5.0)
+        self._flush_thread = None
+        self.flush()
+
+    def _train(self, iterations: int = 10):
+        """用 k-means 训练 IVF 聚类中心"""
+        n = len(self.ids)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        centroids = self.vectors[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空聚类保留原中心
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-8), centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = np.argmax(self.vectors @ self.centroids.T, axis=1).astype(np.int32)
+        self._trained_size = n
+        logger.info(f"Trained voiceprint IVF index: {n} voiceprints, {nlist} lists")
+
+    def _rebuild_lists(self):
+        """根据聚类分配重建倒排列表"""
+        if self.centroids is None:
+            return
+        self._list_order = np.argsort(self.assignments, kind='stable')
+        self._list_offsets = np.searchsorted(
+            self.assignments[self._list_order], np.arange(len(self.centroids) + 1)
+        )
+
+    def _update_index(self):
+        n = len(self.ids)
+        if n < self.brute_force_limit:
+            self.centroids = None
+            self.assignments = np.zeros(0, dtype=np.int32)
+            self._trained_size = 0
+            return
+        if self.centroids is None or n >= self._trained_size * 2:
+            self._train()
+        self._rebuild_lists()
+
+    def enroll(self, name: str, embedding: np.ndarray) -> Dict:
+        """登记声纹"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            voiceprint_id = uuid.uuid4().hex[:12]
+            self.ids.append(voiceprint_id)
+            self.names.append(name)
+            self.created_at = np.append(self.created_at, time.time())
+            self.vectors = vector[None, :] if self.vectors is None else np.vstack([self.vectors, vector])
+            if self.centroids is not None:
+                # 增量分配到最近的聚类中心
+                self.assignments = np.append(
+                    self.assignments, np.int32(np.argmax(self.centroids @ vector))
+                )
+            self._update_index()
+            self._dirty = True
+            logger.info(f"Enrolled voiceprint {voiceprint_id} ({name}), total: {len(self.ids)}")
+            result = self._describe(len(self.ids) - 1)
+        if self._flush_thread is None:
+            self.flush()
+        return result
+
+    def delete(self, voiceprint_id: str) -> bool:
+        """删除声纹"""
+        with self._lock:
+            if voiceprint_id not in self.ids:
+                return False
+            index = self.ids.index(voiceprint_id)
+            del self.ids[index]
+            del self.names[index]
+            self.created_at = np.delete(self.created_at, index)
+            self.vectors = np.delete(self.vectors, index, axis=0) if len(self.ids) else None
+            if self.centroids is not None:
+                self.assignments = np.delete(self.assignments, index)
+            self._update_index()
+            self._dirty = True
+            logger.info(f"Deleted voiceprint {voiceprint_id}, total: {len(self.ids)}")
+        if self._flush_thread is None:
+            self.flush()
+        return True
+
+    def get(self, voiceprint_id: str) -> Optional[Dict]:
+        with self._lock:
+            if voiceprint_id not in self.ids:
+                return None
+            return self._describe(self.ids.index(voiceprint_id))
+
+    def list(self) -> List[Dict]:
+        """列出所有声纹"""
+        with self._lock:
+            return [self._describe(i) for i in range(len(self.ids))]
+
+    def _describe(self, index: int) -> Dict:
+        return {
+            'id': self.ids[index],
+            'name': self.names[index],
+            'created_at': float(self.created_at[index]),
+        }
+
+    def search(self, embedding: np.ndarray, k: int = 1) -> List[Dict]:
+        """查找最相近的k个声纹，返回按余弦距离升序排列的结果"""
+        query = self._normalize(embedding)
+        with self._lock:
+            if not self.ids:
+                return []
+            if self.centroids is None:
+                candidates = np.arange(len(self.ids))
+            else:
+                nprobe = min(self.nprobe, len(self.centroids))
+                probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                candidates = np.concatenate([
+                    self._list_order[self._list_offsets[c]:self._list_offsets[c + 1]] for c in probe
+                ])
+                if len(candidates) == 0:
+                    return []
+            distances = 1.0 - self.vectors[candidates] @ query
+            k = min(k, len(candidates))
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top])]
+            return [
+                {**self._describe(int(candidates[i])), 'distance': float(distances[i])}
+                for i in top
+            ]
+
+    def match(self, embedding: np.ndarray, threshold: float) -> Optional[Dict]:
+        """返回距离小于阈值的最近声纹"""
+        results = self.search(embedding, k=1)
+        if results and results[0]['distance'] < threshold:
+            return results[0]
+        return None
@@ -0,0 +1,76 @@
+import pytest
+
+from service.admission import AdmissionController, AdmissionRejected
+
+
+class _Clock:
+    def __init__(self, now: float = 100.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_concurrency_limit():
+    clock = _Clock()
+    admission = AdmissionController('test', max_concurrent=2, window_limit=0, clock=clock)
+    first = admission.acquire()
+    admission.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire()
+    assert rejected.value.reason == 'too many concurrent requests'
+    assert admission.rejected_concurrency == 1
+
+    admission.release(first)
+    admission.acquire()
+    assert admission.active == 2
+
+
+def test_concurrency_retry_after_tracks_task_duration():
+    clock = _Clock()
+    admission = AdmissionController('test', max_concurrent=1, window_limit=0, clock=clock)
+    # 初始估计 1s，之后按耗时做指数平均：0.8 * 1 + 0.2 * 11 = 3.0
+    started = admission.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire()
+    assert rejected.value.retry_after == 1
+
+    clock.now += 11.0
+    admission.release(started)
+    admission.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire()
+    assert rejected.value.retry_after == 3
+
+
+def test_sliding_window_eviction_and_retry_after():
+    clock = _Clock()
+    admission = AdmissionController('test', max_concurrent=0, window_limit=2, window_seconds=60.0, clock=clock)
+    admission.release(admission.acquire())
+    clock.now += 20.0
+    admission.release(admission.acquire())
+
+    clock.now += 10.0
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire()
+    # 最早的准入在 30s 后移出窗口
+    assert rejected.value.reason == 'rate limit exceeded'
+    assert rejected.value.retry_after == 30
+    assert admission.rejected_rate == 1
+    assert admission.stats()['window_count'] == 2
+
+    clock.now += 29.5
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire()
+    assert rejected.value.retry_after == 1
+
+    clock.now += 0.5
+    admission.acquire()
+    assert admission.stats()['window_count'] == 2
+    assert admission.admitted == 3
+
+
+def test_release_never_goes_negative():
+    admission = AdmissionController('test', max_concurrent=1, window_limit=0, clock=_Clock())
+    admission.release(100.0)
+    assert admission.active == 0
@@ -0,0 +1,41 @@
+import numpy as np
+
+from service.asr_chunker import find_split_points, make_chunks, merge_chunk_results
+
+
+def _chunk_lengths(duration: float, points: list) -> list:
+    bounds = [0.0] + points + [duration]
+    return [end - start for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def test_split_points_last_chunk_not_shorter_than_min_chunk():
+    rng = np.random.default_rng(0)
+    for duration in (12.0, 13.1, 16.5, 21.3, 40.0):
+        samples = rng.standard_normal(int(duration * 16000)).astype(np.float32)
+        points = find_split_points(samples, 16000, min_chunk=5.0, max_chunk=8.0)
+        lengths = _chunk_lengths(duration, points)
+        assert all(length >= 5.0 - 0.02 for length in lengths), (duration, lengths)
+        assert all(length <= 8.0 + 0.02 for length in lengths[:-1]), (duration, lengths)
+
+
+def test_merge_drops_overlap_by_timestamp():
+    chunks = make_chunks(2.0, [1.0], overlap=0.2)
+    results = [
+        ('你好世', [[0, 300], [300, 600], [950, 1050]]),
+        ('世界', [[50, 150], [200, 500]]),
+    ]
+    text, timestamps = merge_chunk_results(chunks, results)
+    assert text == '你好世界'
+    assert timestamps == [[0, 300], [300, 600], [950, 1050], [1100, 1400]]
+
+
+def test_merge_trims_overlap_when_itn_changes_token_count():
+    chunks = make_chunks(2.0, [1.0], overlap=0.2)
+    # ITN 把 "一百" 转为 "100"，文本 token 数多于时间戳数量
+    results = [
+        ('你好', [[0, 300], [300, 600]]),
+        ('好100个', [[0, 80], [200, 400], [400, 600], [600, 800]]),
+    ]
+    text, timestamps = merge_chunk_results(chunks, results)
+    assert text == '你好100个'
+    assert timestamps == [[0, 300], [300, 600], [1100, 1300], [1300, 1500], [1500, 1700]]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from service.change_point import detect_change_point
+
+
+def _cluster(center: np.ndarray, count: int, rng) -> np.ndarray:
+    return center + rng.normal(scale=0.05, size=(count, center.size))
+
+
+def test_two_cluster_split():
+    rng = np.random.default_rng(0)
+    a = np.zeros(16)
+    a[0] = 1.0
+    b = np.zeros(16)
+    b[1] = 1.0
+    embeddings = np.vstack([_cluster(a, 6, rng), _cluster(b, 4, rng)])
+
+    index, distance = detect_change_point(embeddings, min_size=2)
+    assert index == 6
+    assert distance > 0.8
+
+
+def test_single_speaker_has_small_distance():
+    rng = np.random.default_rng(1)
+    center = np.ones(16)
+    index, distance = detect_change_point(_cluster(center, 10, rng), min_size=2)
+    assert index is not None
+    assert distance < 0.05
+
+
+def test_too_few_windows():
+    embeddings = np.eye(4)[:3]
+    assert detect_change_point(embeddings, min_size=2) == (None, 0.0)
+    assert detect_change_point(np.eye(4), min_size=2)[0] == 2
+    assert detect_change_point(None) == (None, 0.0)
+    assert detect_change_point(np.ones(4)) == (None, 0.0)
+
+
+def test_zero_norm_rows():
+    embeddings = np.zeros((6, 8))
+    index, distance = detect_change_point(embeddings, min_size=2)
+    assert index is not None and np.isfinite(distance)
+
+    # 静音窗口的零向量不影响切分位置
+    embeddings[:3, 0] = 1.0
+    embeddings[4:, 1] = 1.0
+    index, distance = detect_change_point(embeddings, min_size=2)
+    assert index in (3, 4)
+    assert np.isfinite(distance) and distance > 0.8
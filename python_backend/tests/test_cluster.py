@@ -0,0 +1,243 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('redis')
+if not (Path(__file__).resolve().parents[1] / 'config' / 'config.yaml').exists():
+    # config_manager 在导入时读取 config.yaml
+    pytest.skip("config/config.yaml not found, copy it from config.yaml.default", allow_module_level=True)
+
+from core.cluster import ClusterCoordinator
+from core.redis_client import RedisClient
+
+
+class _FakeRedis:
+    """内存中的 Redis 替身：只实现 ClusterCoordinator 用到的命令，TTL 按手动推进的时钟过期"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._data = {}
+        self._expires = {}
+        self._pubsubs = []
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= self.now:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _expire(self, key: str, seconds):
+        if seconds is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = self.now + seconds
+
+    async def get(self, key):
+        return self._data.get(key) if self._alive(key) else None
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self._data[key] = str(value)
+        self._expire(key, ex)
+        return True
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+        self._expires.pop(key, None)
+
+    async def hset(self, key, mapping):
+        if not self._alive(key):
+            self._data[key] = {}
+        self._data[key].update({field: str(value) for field, value in mapping.items()})
+
+    async def hgetall(self, key):
+        return dict(self._data[key]) if self._alive(key) else {}
+
+    async def expire(self, key, seconds):
+        if self._alive(key):
+            self._expire(key, seconds)
+
+    async def zadd(self, key, mapping):
+        self._data.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self._data.get(key, {}).pop(member, None)
+
+    async def zrange(self, key, start, end):
+        members = sorted(self._data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        return [member for member, _ in members]
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    async def publish(self, channel, message):
+        for pubsub in self._pubsubs:
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({'type': 'message', 'channel': channel, 'data': message})
+
+    def pubsub(self):
+        pubsub = _FakePubSub(self)
+        self._pubsubs.append(pubsub)
+        return pubsub
+
+
+class _FakePipeline:
+    def __init__(self, redis: _FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class _FakePubSub:
+    def __init__(self, redis: _FakeRedis):
+        self.redis = redis
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        self.redis._pubsubs.remove(self)
+
+
+def _worker(redis, worker_id: str, sessions: int = 0, meetings=None) -> ClusterCoordinator:
+    load = {'sessions': sessions, 'meetings': meetings or []}
+    return ClusterCoordinator(
+        redis=redis, worker_id=worker_id, url=f"http://{worker_id}", heartbeat_interval=1.0,
+        max_sessions=4, load_fn=lambda: load
+    )
+
+
+def test_heartbeat_expiry():
+    async def run():
+        redis = _FakeRedis()
+        w1, w2 = _worker(redis, 'w1', sessions=2), _worker(redis, 'w2')
+        await w1.heartbeat()
+        await w2.heartbeat()
+        assert [w['worker_id'] for w in await w1.list_workers()] == ['w2', 'w1']
+        assert (await w1.get_worker('w1'))['load'] == 0.5
+
+        # TTL 为 3 个心跳周期，w2 继续心跳，w1 停止
+        redis.advance(2.0)
+        await w2.heartbeat()
+        redis.advance(1.5)
+        assert [w['worker_id'] for w in await w2.list_workers()] == ['w2']
+        # 过期成员从 workers 中清理
+        assert await redis.zrange(RedisClient.key('workers'), 0, -1) == ['w2']
+    asyncio.run(run())
+
+
+def test_route_is_sticky_and_renewed_by_heartbeat():
+    async def run():
+        redis = _FakeRedis()
+        w1, w2 = _worker(redis, 'w1', meetings=[5]), _worker(redis, 'w2', sessions=1)
+        await w1.heartbeat()
+        await w2.heartbeat()
+        assert (await w2.route(5))['worker_id'] == 'w1'
+
+        # w1 变忙后已分配的会议仍路由到 w1
+        w1.load_fn = lambda: {'sessions': 3, 'meetings': [5]}
+        for _ in range(5):
+            redis.advance(2.0)
+            await w1.heartbeat()
+            await w2.heartbeat()
+        assert (await w2.route(5))['worker_id'] == 'w1'
+        assert (await w2.route(6))['worker_id'] == 'w2'
+    asyncio.run(run())
+
+
+def test_route_hands_over_when_owner_heartbeat_lapses():
+    async def run():
+        redis = _FakeRedis()
+        w1, w2 = _worker(redis, 'w1', meetings=[5]), _worker(redis, 'w2', sessions=1)
+        await w1.heartbeat()
+        await w2.heartbeat()
+        assert (await w2.route(5))['worker_id'] == 'w1'
+
+        redis.advance(2.0)
+        await w2.heartbeat()
+        redis.advance(2.0)
+        assert (await w2.route(5))['worker_id'] == 'w2'
+        assert await redis.get(w2._route_key(5)) == 'w2'
+    asyncio.run(run())
+
+
+def test_route_overwrites_assignment_of_offline_worker():
+    async def run():
+        redis = _FakeRedis()
+        w1, w2 = _worker(redis, 'w1', meetings=[5]), _worker(redis, 'w2', sessions=1)
+        await w1.heartbeat()
+        await w2.heartbeat()
+        # w1 主动下线，路由键尚未过期
+        await w1.stop()
+        assert await redis.get(w2._route_key(5)) == 'w1'
+        assert (await w2.route(5))['worker_id'] == 'w2'
+        assert await redis.get(w2._route_key(5)) == 'w2'
+    asyncio.run(run())
+
+
+def test_concurrent_route_first_writer_wins():
+    async def run():
+        redis = _FakeRedis()
+        w1, w2 = _worker(redis, 'w1'), _worker(redis, 'w2', sessions=1)
+        await w1.heartbeat()
+        await w2.heartbeat()
+        route_key = w1._route_key(5)
+        get = redis.get
+
+        async def racing_get(key):
+            # 本 worker 读到路由为空后、写入前，另一个 worker 抢先分配给了 w2
+            value = await get(key)
+            if key == route_key and value is None:
+                await redis.set(route_key, 'w2', ex=3, nx=True)
+            return value
+        redis.get = racing_get
+        assert (await w1.route(5))['worker_id'] == 'w2'
+        assert await get(route_key) == 'w2'
+    asyncio.run(run())
+
+
+def test_pubsub_event_relay():
+    async def run():
+        redis = _FakeRedis()
+        w1, w2 = _worker(redis, 'w1'), _worker(redis, 'w2')
+        received = asyncio.Queue()
+
+        async def deliver(message):
+            await received.put(message)
+        await w2.subscribe(5, deliver)
+        await w1.publish(5, {'type': 'transcription', 'text': '你好'})
+        await w1.publish(6, {'type': 'transcription', 'text': 'other'})
+
+        message = await asyncio.wait_for(received.get(), 2.0)
+        assert message == {'worker_id': 'w1', 'meeting_id': 5, 'event': {'type': 'transcription', 'text': '你好'}}
+
+        await w2.unsubscribe(5, deliver)
+        await w1.publish(5, {'type': 'transcription', 'text': 'late'})
+        await asyncio.sleep(0.05)
+        assert received.empty()
+        await w2.stop()
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip('msgpack')
+
+from service.event_encoding import ENCODING_VERSION, decode_events, delta_decode, delta_encode, encode_events
+from service.event_queue import EventQueue
+
+
+def _transcription(text: str, start: float, end: float, is_final: bool = False, timestamp=None) -> dict:
+    return {
+        'type': 'transcription',
+        'text': text,
+        'speaker_id': 1,
+        'start_time': start,
+        'end_time': end,
+        'isFinal': is_final,
+        'timestamp': timestamp or [],
+    }
+
+
+def test_delta_round_trip():
+    timestamps = [[120, 300], [300, 540], [610, 900]]
+    deltas = delta_encode(timestamps)
+    assert deltas == [120, 180, 0, 240, 70, 290]
+    assert delta_decode(deltas) == timestamps
+    assert delta_encode(None) == [] and delta_decode([]) == []
+
+
+def test_encode_decode_round_trip():
+    events = [
+        _transcription('你好', 1.5, 2.25, timestamp=[[0, 300], [300, 750]]),
+        _transcription('你好世界', 1.5, 3.0, is_final=True, timestamp=[[0, 300], [300, 600], [800, 1100], [1100, 1500]]),
+        {'type': 'error', 'code': 1003, 'message': 'ASR failed'},
+    ]
+    decoded = decode_events(encode_events(events))
+    assert decoded == events
+
+
+def test_decode_rejects_unknown_version():
+    import msgpack
+    with pytest.raises(ValueError):
+        decode_events(msgpack.packb([ENCODING_VERSION + 1, []]))
+
+
+def test_collapse_drops_covered_partials():
+    queue = EventQueue()
+    events = [
+        _transcription('你', 1.0, 1.5),
+        _transcription('你好', 1.0, 2.0),
+        _transcription('别的', 3.0, 3.5),
+        {'type': 'error', 'code': 1003, 'message': 'x'},
+        _transcription('你好世界', 1.0, 2.5, is_final=True),
+    ]
+    collapsed = queue.collapse(events)
+    assert [e.get('text') for e in collapsed] == ['别的', None, '你好世界']
+    assert queue.superseded == 2
+
+    # 定稿结果不会被后面的结果覆盖
+    finals = [_transcription('a', 1.0, 2.0, is_final=True), _transcription('b', 1.0, 2.0, is_final=True)]
+    assert queue.collapse(finals) == finals
+
+    decoded = decode_events(encode_events(collapsed))
+    assert [e.get('text') for e in decoded] == ['别的', None, '你好世界']
@@ -0,0 +1,65 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from service import inference_worker
+from service.inference_worker import AudioRing, InferenceProcessPool, _read_audio
+
+
+def _fake_worker_main(index, ring_name, slots, slot_bytes, requests, results, load_asr, load_speaker):
+    """不加载模型的 worker：embedding 请求返回音频之和，crash 请求直接退出进程"""
+    ring = AudioRing(slots, slot_bytes, name=ring_name)
+    results.put(('ready', index, None))
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        kind, request_id, audio, params = request
+        if kind == 'crash':
+            os._exit(3)
+        results.put(('result', request_id, float(_read_audio(ring, audio).sum())))
+    ring.close()
+
+
+@pytest.fixture
+def fake_worker(monkeypatch):
+    # spawn 按模块名和函数名序列化 target，子进程导入本测试模块得到替身
+    monkeypatch.setattr(inference_worker, '_worker_main', _fake_worker_main)
+
+
+def _wait(predicate, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_dead_worker_fails_pending_and_restarts(fake_worker):
+    pool = InferenceProcessPool(processes=1, slots=2, max_segment_duration=0.01,
+                                start_timeout=60.0, health_check_interval=0.1, max_restarts=1)
+    try:
+        samples = np.ones(16, dtype=np.float32)
+        assert pool._submit('embedding', samples, {}).result(timeout=10) == 16.0
+
+        crashed = pool._submit('crash', samples, {})
+        with pytest.raises(RuntimeError, match="exited with code 3"):
+            crashed.result(timeout=10)
+        # 退出进程占用的槽已归还
+        assert pool._free_slots.qsize() == 2
+        assert pool.get_metrics()['worker_exits'] == 1
+
+        _wait(lambda: pool.get_metrics()['process_ready'] == [True])
+        assert pool._submit('embedding', samples, {}).result(timeout=10) == 16.0
+        assert pool.get_metrics()['process_restarts'] == [1]
+
+        # 超过重启次数后不再分发请求
+        with pytest.raises(RuntimeError):
+            pool._submit('crash', samples, {}).result(timeout=10)
+        _wait(lambda: pool._processes[0] is None)
+        with pytest.raises(RuntimeError, match="No inference worker available"):
+            pool._submit('embedding', samples, {}).result(timeout=1)
+        assert pool._free_slots.qsize() == 2
+    finally:
+        pool.close()
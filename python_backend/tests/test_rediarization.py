@@ -0,0 +1,79 @@
+import numpy as np
+
+from service.rediarization import build_relabel_map, cluster_embeddings, relabel_utterances, run_rediarization
+from service.speaker_storage import SegmentLog
+
+
+def _segments(rng):
+    """两个真实说话人；实时识别把 A 拆成了 0 和 2，把 B 的一段短语音误标为 0"""
+    a = np.zeros(16)
+    a[0] = 1.0
+    b = np.zeros(16)
+    b[1] = 1.0
+    centers = [a, a, a, b, b, a, b, b]
+    speaker_ids = np.array([0, 0, 2, 1, 1, 2, 1, 0], dtype=np.int32)
+    durations = np.array([3.0, 2.0, 2.5, 4.0, 2.0, 1.5, 3.0, 0.5])
+    embeddings = np.array([c + rng.normal(scale=0.05, size=16) for c in centers])
+    return embeddings, speaker_ids, durations
+
+
+def test_cluster_embeddings_merges_split_speaker():
+    embeddings, _, durations = _segments(np.random.default_rng(0))
+    labels = cluster_embeddings(embeddings, durations, threshold=0.45, min_duration=1.0)
+    assert len(set(labels[[0, 1, 2, 5]])) == 1
+    assert len(set(labels[[3, 4, 6, 7]])) == 1
+    assert labels[0] != labels[3]
+
+
+def test_cluster_embeddings_edge_cases():
+    assert cluster_embeddings(np.zeros((0, 4)), np.zeros(0), 0.45).shape == (0,)
+    np.testing.assert_array_equal(cluster_embeddings(np.ones((1, 4)), np.ones(1), 0.45), [0])
+    # 只有一个长片段时用全部片段聚类
+    labels = cluster_embeddings(np.eye(4)[[0, 0, 1]], np.array([2.0, 0.5, 0.5]), 0.45)
+    assert labels[0] == labels[1] != labels[2]
+
+
+def test_build_relabel_map_picks_longest_speaker_per_cluster():
+    embeddings, speaker_ids, durations = _segments(np.random.default_rng(0))
+    labels = cluster_embeddings(embeddings, durations, threshold=0.45, min_duration=1.0)
+    relabel_map, new_ids = build_relabel_map(speaker_ids, labels, durations)
+
+    # A 聚类中 0 共 5.0s、2 共 4.0s，B 聚类中 1 共 9.0s、0 共 0.5s
+    np.testing.assert_array_equal(new_ids, [0, 0, 0, 1, 1, 0, 1, 1])
+    assert relabel_map == {0: 0, 1: 1, 2: 0}
+
+
+def test_relabel_utterances_by_overlap():
+    starts = np.array([0.0, 5.0])
+    ends = np.array([4.0, 9.0])
+    new_ids = np.array([0, 1], dtype=np.int32)
+    utterances = [
+        {'start_time': 1.0, 'end_time': 3.0, 'speaker_id': 2, 'text': 'a'},
+        {'start_time': 4.5, 'end_time': 6.0, 'speaker_id': 0, 'text': 'b'},
+        {'start_time': 10.0, 'end_time': 11.0, 'speaker_id': 2, 'text': 'c'},
+        {'start_time': 12.0, 'end_time': 13.0, 'speaker_id': None, 'text': 'd'},
+    ]
+    corrected = relabel_utterances(utterances, starts, ends, new_ids, {2: 0})
+    assert [u['speaker_id'] for u in corrected] == [0, 1, 0, None]
+    assert [u['text'] for u in corrected] == ['a', 'b', 'c', 'd']
+    assert utterances[0]['speaker_id'] == 2
+
+
+def test_run_rediarization_from_segment_log(tmp_path):
+    embeddings, speaker_ids, durations = _segments(np.random.default_rng(0))
+    path = str(tmp_path / 'speakers.1.segments.bin')
+    log = SegmentLog(path)
+    start = 0.0
+    for embedding, speaker_id, duration in zip(embeddings, speaker_ids, durations):
+        log.append(start, start + duration, int(speaker_id), embedding)
+        start += duration
+    log.flush()
+
+    result = run_rediarization(path, threshold=0.45, min_duration=1.0)
+    assert result['segment_count'] == 8
+    assert result['speaker_count_before'] == 3
+    assert result['speaker_count_after'] == 2
+    assert result['relabel_map'] == {'0': 0, '1': 1, '2': 0}
+
+    empty = run_rediarization(str(tmp_path / 'missing.bin'), threshold=0.45, min_duration=1.0)
+    assert empty['segment_count'] == 0
@@ -0,0 +1,135 @@
+import os
+import json
+import threading
+
+import numpy as np
+
+from service.speaker_storage import BinarySpeakerStorage, SegmentLog, migrate_json_to_binary
+
+
+def _speaker(dim: int = 4) -> dict:
+    embedding = np.ones((1, dim), dtype=np.float32)
+    return {
+        'embeddings': [{'duration': 1.5, 'embedding': embedding}],
+        'average_embedding': embedding,
+        'average_distance': 0.1,
+        'adaptive_threshold': 0.25,
+        'voiceprint_id': '',
+    }
+
+
+def test_binary_storage_round_trip(tmp_path):
+    path = str(tmp_path / 'speakers.1.npz')
+    storage = BinarySpeakerStorage(path)
+    storage.add_or_update_speaker('speaker_0', _speaker())
+
+    speakers = BinarySpeakerStorage(path).get_all_speakers()
+    assert list(speakers) == ['speaker_0']
+    assert speakers['speaker_0']['embeddings'][0]['duration'] == 1.5
+    np.testing.assert_array_equal(speakers['speaker_0']['average_embedding'], np.ones((1, 4)))
+
+
+def test_binary_storage_remove_last_speaker(tmp_path):
+    path = str(tmp_path / 'speakers.1.npz')
+    storage = BinarySpeakerStorage(path)
+    storage.add_or_update_speaker('speaker_0', _speaker())
+    storage.remove_speaker('speaker_0')
+
+    reloaded = BinarySpeakerStorage(path)
+    assert reloaded.get_all_speakers() == {}
+    assert reloaded.embedding_dim == 4
+    with np.load(path) as data:
+        assert data['embeddings'].shape == (0, 4)
+        assert data['average_embeddings'].shape == (0, 4)
+
+
+def test_migrate_empty_json(tmp_path):
+    json_path = tmp_path / 'speakers.1.json'
+    json_path.write_text(json.dumps({}), encoding='utf-8')
+
+    binary_path = migrate_json_to_binary(str(json_path))
+    assert os.path.exists(binary_path)
+    assert BinarySpeakerStorage(binary_path).get_all_speakers() == {}
+
+
+def test_segment_log_rotates_on_dim_change(tmp_path):
+    path = str(tmp_path / 'speakers.1.segments.bin')
+    log = SegmentLog(path)
+    log.append(0.0, 1.0, 0, np.ones(4))
+    log.flush()
+    log.append(1.0, 2.0, 1, np.ones(4))
+    log.flush()
+    assert len(SegmentLog.read(path)) == 2
+
+    log.append(2.0, 3.0, 0, np.ones(8))
+    log.flush()
+    records = SegmentLog.read(path)
+    assert SegmentLog.read_dim(path) == 8
+    assert len(records) == 1 and records[0]['start'] == 2.0
+    rotated = [name for name in os.listdir(tmp_path) if name.endswith('.bak')]
+    assert len(rotated) == 1
+    assert len(SegmentLog.read(str(tmp_path / rotated[0]))) == 2
+
+
+class _DelayedLock:
+    """第一次 acquire 时先等待 event，模拟写回线程在获取写锁前被调度出去"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.event = threading.Event()
+        self.waiting = threading.Event()
+        self._first = True
+
+    def __enter__(self):
+        if self._first:
+            self._first = False
+            self.waiting.set()
+            self.event.wait(5)
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def test_concurrent_flushes_keep_newest_data(tmp_path):
+    path = str(tmp_path / 'speakers.1.npz')
+    storage = BinarySpeakerStorage(path, flush_interval=3600)
+    storage._write_lock = _DelayedLock()
+
+    old = _speaker()
+    old['average_distance'] = 0.1
+    storage.add_or_update_speaker('speaker_0', old)
+    first = threading.Thread(target=storage.flush)
+    first.start()
+    assert storage._write_lock.waiting.wait(5)
+
+    new = _speaker()
+    new['average_distance'] = 0.9
+    storage.add_or_update_speaker('speaker_0', new)
+    storage.flush()
+    storage._write_lock.event.set()
+    first.join(5)
+
+    reloaded = BinarySpeakerStorage(path).get_speaker('speaker_0')
+    assert abs(reloaded['average_distance'] - 0.9) < 1e-6
+    storage.close()
+
+
+def test_failed_write_keeps_dirty_speakers(tmp_path, monkeypatch):
+    path = str(tmp_path / 'speakers.1.npz')
+    storage = BinarySpeakerStorage(path, flush_interval=3600)
+    storage.add_or_update_speaker('speaker_0', _speaker())
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(storage, '_write_file', fail)
+    storage.flush()
+    assert storage.is_dirty
+    assert not os.path.exists(path)
+
+    monkeypatch.undo()
+    storage.flush()
+    assert not storage.is_dirty
+    assert list(BinarySpeakerStorage(path).get_all_speakers()) == ['speaker_0']
+    storage.close()
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from service.voiceprint_library import VoiceprintLibrary
+
+
+def _clustered(count: int, speakers: int, dim: int, rng) -> np.ndarray:
+    """每个说话人的多条 embedding 分布在同一个中心附近"""
+    centers = rng.standard_normal((speakers, dim))
+    labels = rng.integers(0, speakers, count)
+    return centers[labels] + rng.normal(scale=0.3, size=(count, dim))
+
+
+def test_ivf_search_recall_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = _clustered(2000, 100, 32, rng)
+    library = VoiceprintLibrary(str(tmp_path), nprobe=8, brute_force_limit=256, flush_interval=3600)
+    for i, vector in enumerate(vectors):
+        library.enroll(f"speaker_{i}", vector)
+    assert library.centroids is not None
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(len(vectors), 200, replace=False)] + rng.normal(scale=0.1, size=(200, 32))
+    hits = 0
+    for query in queries:
+        query = query / np.linalg.norm(query)
+        expected = library.ids[int(np.argmax(normalized @ query))]
+        hits += library.search(query, k=1)[0]['id'] == expected
+    assert hits / len(queries) >= 0.95
+    library.close()
+
+
+def test_enroll_delete_round_trip(tmp_path):
+    library = VoiceprintLibrary(str(tmp_path), flush_interval=0)
+    alice = library.enroll("alice", np.array([1.0, 0.0, 0.0]))
+    bob = library.enroll("bob", np.array([0.0, 1.0, 0.0]))
+    assert library.delete(alice['id'])
+    assert not library.delete(alice['id'])
+
+    reloaded = VoiceprintLibrary(str(tmp_path))
+    assert [v['id'] for v in reloaded.list()] == [bob['id']]
+    assert reloaded.get(bob['id'])['name'] == "bob"
+    assert reloaded.match(np.array([0.0, 2.0, 0.1]), threshold=0.1)['id'] == bob['id']
+    assert reloaded.match(np.array([1.0, 0.0, 0.0]), threshold=0.1) is None
+
+    assert reloaded.delete(bob['id'])
+    empty = VoiceprintLibrary(str(tmp_path))
+    assert len(empty) == 0
+    assert empty.search(np.ones(3)) == []
+
+
+def test_write_behind_batches_until_flush(tmp_path):
+    library = VoiceprintLibrary(str(tmp_path), flush_interval=3600)
+    for i in range(5):
+        library.enroll(f"speaker_{i}", np.eye(5)[i])
+    assert library.is_dirty
+    assert not os.path.exists(library.file_path)
+
+    library.close()
+    assert not library.is_dirty
+    assert len(VoiceprintLibrary(str(tmp_path))) == 5
+
+
+def test_failed_write_keeps_dirty(tmp_path, monkeypatch):
+    library = VoiceprintLibrary(str(tmp_path), flush_interval=3600)
+    library.enroll("alice", np.ones(4))
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(library, '_write_file', fail)
+    with pytest.raises(OSError):
+        library.flush()
+    assert library.is_dirty
+
+    monkeypatch.undo()
+    library.close()
+    assert len(VoiceprintLibrary(str(tmp_path))) == 1
@@ -0,0 +1,148 @@
+"""SenseVoice 全精度 / INT8量化模型对比测试
+
+用法（在 python_backend 目录下）：
+    python -m tools.asr_benchmark data/asr_corpus --language zh
+
+语料目录中的每个 xxx.wav 为一条测试音频（16bit PCM），同名 xxx.txt 为可选的参考文本。
+输出两种模型的实时率(RTF)、单条延迟 p50/p95，以及字错误率(CER)：
+有参考文本时分别计算相对参考文本的CER，否则计算量化模型相对全精度模型输出的差异。
+"""
+import os
+import time
+import wave
+import argparse
+import numpy as np
+from typing import List, Tuple
+
+from service.sense_voice import SenseVoiceSTT
+from tools.text_splitter import split_text
+
+
+def load_wav(path: str) -> Tuple[np.ndarray, int]:
+    """读取16bit PCM WAV，多声道取平均"""
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit PCM WAV is supported: {path}")
+        channels = wf.getnchannels()
+        sample_rate = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return audio, sample_rate
+
+
+def load_corpus(corpus_dir: str) -> List[dict]:
+    items = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith('.wav'):
+            continue
+        path = os.path.join(corpus_dir, name)
+        audio, sample_rate = load_wav(path)
+        reference_path = os.path.splitext(path)[0] + '.txt'
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, 'r', encoding='utf-8') as f:
+                reference = f.read().strip()
+        items.append({
+            'name': name,
+            'audio': audio,
+            'sample_rate': sample_rate,
+            'duration': len(audio) / sample_rate,
+            'reference': reference
+        })
+    return items
+
+
+def _normalize_text(text: str) -> List[str]:
+    """去掉标点和表情，按字/英文单词切分"""
+    return [t.text.lower() for t in split_text(text) if not t.is_punctuation]
+
+
+def edit_distance(a: List[str], b: List[str]) -> int:
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, y in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y))
+        previous = current
+    return previous[-1]
+
+
+def cer(hypotheses: List[str], references: List[str]) -> float:
+    errors = 0
+    total = 0
+    for hypothesis, reference in zip(hypotheses, references):
+        reference_tokens = _normalize_text(reference)
+        errors += edit_distance(_normalize_text(hypothesis), reference_tokens)
+        total += len(reference_tokens)
+    return errors / max(total, 1)
+
+
+def run_variant(corpus: List[dict], quantize: bool, language: str, warmup: int) -> dict:
+    """逐条同步识别，统计延迟和实时率"""
+    stt = SenseVoiceSTT(use_onnx=True, quantize=quantize)
+    model = stt.instances[0].model
+    inputs = [SenseVoiceSTT._to_model_input(item['audio'], item['sample_rate']) for item in corpus]
+
+    for samples in inputs[:warmup]:
+        stt._recognize_batch_sync(model, [samples], language, False, [_new_job()])
+
+    texts = []
+    latencies = []
+    for samples in inputs:
+        start = time.perf_counter()
+        text, _ = stt._recognize_batch_sync(model, [samples], language, False, [_new_job()])[0]
+        latencies.append(time.perf_counter() - start)
+        texts.append(text)
+    stt.close()
+
+    total_duration = sum(item['duration'] for item in corpus)
+    return {
+        'texts': texts,
+        'rtf': sum(latencies) / max(total_duration, 1e-8),
+        'p50': float(np.percentile(latencies, 50)),
+        'p95': float(np.percentile(latencies, 95)),
+    }
+
+
+def _new_job() -> dict:
+    return {'submit_time': time.perf_counter(), 'started': False, 'cancelled': False}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SenseVoice 全精度与INT8量化模型对比")
+    parser.add_argument('corpus', help="WAV语料目录，可选同名.txt参考文本")
+    parser.add_argument('--language', default='zh')
+    parser.add_argument('--warmup', type=int, default=2, help="预热条数")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("未找到WAV文件")
+        return
+    print(f"语料: {len(corpus)} 条, 总时长 {sum(item['duration'] for item in corpus):.1f}s")
+
+    results = {
+        'fp32': run_variant(corpus, False, args.language, args.warmup),
+        'int8': run_variant(corpus, True, args.language, args.warmup),
+    }
+
+    with_reference = [i for i, item in enumerate(corpus) if item['reference']]
+    print(f"\n{'模型':<8}{'RTF':>10}{'p50(ms)':>12}{'p95(ms)':>12}{'CER':>10}")
+    for variant, result in results.items():
+        if with_reference:
+            variant_cer = cer([result['texts'][i] for i in with_reference],
+                              [corpus[i]['reference'] for i in with_reference])
+            cer_text = f"{variant_cer * 100:.2f}%"
+        else:
+            cer_text = '-'
+        print(f"{variant:<8}{result['rtf']:>10.4f}{result['p50'] * 1000:>12.1f}{result['p95'] * 1000:>12.1f}{cer_text:>10}")
+
+    # 量化模型相对全精度模型输出的差异
+    difference = cer(results['int8']['texts'], results['fp32']['texts'])
+    print(f"\nINT8 相对 FP32 输出的CER差异: {difference * 100:.2f}%")
+    print(f"INT8 加速比: {results['fp32']['rtf'] / max(results['int8']['rtf'], 1e-8):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""本地模型目录管理
+
+用法（在 python_backend 目录下，fetch 需要联网）：
+    python -m tools.model_registry fetch                  # 下载全部模型到 models.registry.path 并写入 manifest
+    python -m tools.model_registry fetch campplus bge_m3  # 只下载指定模型
+    python -m tools.model_registry add campplus /path/to/campplus_cn_common.bin
+    python -m tools.model_registry verify                 # 重新计算并校验全部模型的 sha256
+    python -m tools.model_registry list
+
+模型名见 service/model_registry.py 的 MODEL_SOURCES。生成的目录可以整体复制到离线部署的机器上，
+并设置 models.registry.offline: true。
+"""
+import os
+import glob
+import argparse
+
+from service.model_registry import model_registry, MODEL_SOURCES, ModelIntegrityError
+
+
+def _silero_repo() -> str:
+    import torch
+    torch.hub.load(repo_or_dir="snakers4/silero-vad", model="silero_vad", onnx=True, trust_repo=True)
+    return os.path.join(torch.hub.get_dir(), "snakers4_silero-vad_master")
+
+
+def fetch_silero_vad() -> str:
+    return _silero_repo()
+
+
+def fetch_silero_vad_jit() -> str:
+    candidates = glob.glob(os.path.join(_silero_repo(), "**", "silero_vad.jit"), recursive=True)
+    if not candidates:
+        raise FileNotFoundError("silero_vad.jit not found in silero-vad repository")
+    return candidates[0]
+
+
+def fetch_campplus() -> str:
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id="funasr/campplus", filename="campplus_cn_common.bin")
+
+
+def fetch_sense_voice() -> str:
+    from modelscope import snapshot_download
+    from funasr_onnx import SenseVoiceSmall
+    model_dir = snapshot_download("iic/SenseVoiceSmall")
+    # funasr_onnx 首次加载时在模型目录中导出 model.onnx / model_quant.onnx，离线环境无法导出，一并放入目录
+    SenseVoiceSmall(model_dir, quantize=False)
+    SenseVoiceSmall(model_dir, quantize=True)
+    return model_dir
+
+
+def fetch_bge_m3() -> str:
+    from huggingface_hub import snapshot_download
+    return snapshot_download("BAAI/bge-m3")
+
+
+FETCHERS = {
+    'silero_vad': fetch_silero_vad,
+    'silero_vad_jit': fetch_silero_vad_jit,
+    'campplus': fetch_campplus,
+    'sense_voice': fetch_sense_voice,
+    'bge_m3': fetch_bge_m3,
+}
+
+
+def fetch(names):
+    unknown = [name for name in names if name not in FETCHERS]
+    if unknown:
+        raise SystemExit(f"未知模型: {unknown}，可选: {list(FETCHERS)}")
+    for name in names or FETCHERS:
+        print(f"下载 {name} ({MODEL_SOURCES[name]}) ...")
+        entry = model_registry.add(name, FETCHERS[name]())
+        print(f"  -> {entry['path']}, {len(entry['files'])} 个文件")
+
+
+def verify(names):
+    failed = 0
+    for name in names or model_registry.models:
+        try:
+            model_registry.verify_model(name, use_cache=False)
+            print(f"{name:<16}OK")
+        except (ModelIntegrityError, KeyError) as e:
+            failed += 1
+            print(f"{name:<16}FAILED: {e}")
+    if failed:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模型目录管理")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fetch_parser = subparsers.add_parser('fetch', help="联网下载模型并写入 manifest")
+    fetch_parser.add_argument('names', nargs='*', help=f"模型名（{', '.join(FETCHERS)}），默认全部")
+    add_parser = subparsers.add_parser('add', help="把本地文件或目录加入模型目录")
+    add_parser.add_argument('name', choices=list(MODEL_SOURCES))
+    add_parser.add_argument('path')
+    verify_parser = subparsers.add_parser('verify', help="校验模型文件的 sha256")
+    verify_parser.add_argument('names', nargs='*', help="模型名，默认全部")
+    subparsers.add_parser('list', help="列出目录中的模型")
+    args = parser.parse_args()
+
+    print(f"模型目录: {os.path.abspath(model_registry.path)}")
+    if args.command == 'fetch':
+        fetch(args.names)
+    elif args.command == 'add':
+        entry = model_registry.add(args.name, args.path)
+        print(f"{args.name} -> {entry['path']}, {len(entry['files'])} 个文件")
+    elif args.command == 'verify':
+        verify(args.names)
+    else:
+        for name, entry in model_registry.models.items():
+            print(f"{name:<16}{entry['path']:<40}{len(entry['files']):>6} 个文件  {entry.get('source', '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""CPU 线程预算布局对比测试
+
+用法（在 python_backend 目录下）：
+    python -m tools.thread_benchmark data/asr_corpus --concurrency 4
+    python -m tools.thread_benchmark data/asr_corpus --layout asr=1x4,speaker=1x2 --layout asr=2x2,speaker=2x1
+
+每个布局写作 组件=workers x threads，未写的组件使用 config.yaml 中 threads 的配置；
+不指定 --layout 时按可用核数自动生成一组布局。语料格式同 tools/asr_benchmark.py。
+每条音频依次做ASR识别和说话人embedding，concurrency 路并发，模拟多个会话同时推理，
+输出每个布局的吞吐（处理的音频时长 / 墙钟时间）和单条延迟 p50/p95。
+
+torch 的 inter-op 线程数只能设置一次，整个测试使用配置中的 torch_inter_op。
+"""
+import time
+import copy
+import asyncio
+import argparse
+import numpy as np
+from typing import List, Dict, Any
+
+import torch
+
+from config.config_manager import config
+from service.thread_budget import thread_budget, COMPONENTS
+from service.sense_voice import SenseVoiceSTT
+from service.speaker import Speaker
+from tools.asr_benchmark import load_corpus
+
+
+def parse_layout(text: str) -> Dict[str, Dict[str, int]]:
+    """asr=2x2,speaker=1x2 -> {'asr': {'workers': 2, 'threads': 2}, ...}"""
+    layout = {}
+    for part in text.split(','):
+        name, value = part.strip().split('=')
+        if name not in COMPONENTS:
+            raise ValueError(f"Unknown component: {name}")
+        workers, threads = value.lower().split('x')
+        layout[name] = {'workers': int(workers), 'threads': int(threads)}
+    return layout
+
+
+def default_layouts(cores: int) -> List[Dict[str, Dict[str, int]]]:
+    """ASR 实例数 1/2/4 与说话人线程数 1/2 的组合，ASR 分到剩余的核"""
+    layouts = []
+    for speaker_threads in (1, 2):
+        for instances in (1, 2, 4):
+            asr_threads = (cores - speaker_threads - 1) // instances
+            if asr_threads < 1:
+                continue
+            layouts.append({
+                'asr': {'workers': instances, 'threads': asr_threads},
+                'speaker': {'workers': 1, 'threads': speaker_threads},
+            })
+    return layouts
+
+
+def format_layout(layout: Dict[str, Dict[str, int]]) -> str:
+    return ','.join(f"{name}={spec['workers']}x{spec['threads']}" for name, spec in layout.items())
+
+
+async def run_layout(corpus: List[dict], layout: Dict[str, Dict[str, int]], concurrency: int,
+                     warmup: int, language: str) -> Dict[str, Any]:
+    threads_config = copy.deepcopy(config.threads_config)
+    threads_config['enable'] = True
+    for name, spec in layout.items():
+        threads_config[name] = spec
+    thread_budget.configure(threads_config)
+    torch.set_num_threads(thread_budget.torch_threads)
+
+    asr_config = config.audio_config['asr']
+    asr_layout = thread_budget.components['asr']
+    # 关闭结果缓存，避免重复音频直接命中
+    stt = SenseVoiceSTT(
+        use_onnx=asr_config['use_onnx'],
+        instances=asr_layout.workers,
+        intra_op_threads=asr_layout.threads,
+        batching=asr_config['batching'],
+        quantize=asr_config['quantize'],
+        chunking=asr_config['chunking'],
+        core_sets=asr_layout.core_sets if thread_budget.pin else None
+    )
+    speaker = Speaker()
+    loop = asyncio.get_running_loop()
+
+    async def process(item: dict) -> float:
+        start = time.perf_counter()
+        await stt.recognize_array(item['audio'], item['sample_rate'], language=language)
+        await loop.run_in_executor(speaker.executor, speaker.get_embedding_from_buffer,
+                                   item['audio'], item['sample_rate'])
+        return time.perf_counter() - start
+
+    for item in corpus[:warmup]:
+        await process(item)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in corpus:
+        queue.put_nowait(item)
+    latencies = []
+
+    async def stream():
+        while not queue.empty():
+            latencies.append(await process(queue.get_nowait()))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[stream() for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+
+    stt.close()
+    speaker.executor.shutdown(wait=True)
+    total_duration = sum(item['duration'] for item in corpus)
+    return {
+        'wall': wall,
+        'throughput': total_duration / max(wall, 1e-8),
+        'p50': float(np.percentile(latencies, 50)),
+        'p95': float(np.percentile(latencies, 95)),
+        'oversubscribed': thread_budget.oversubscribed,
+    }
+
+
+async def run(args):
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("未找到WAV文件")
+        return
+    print(f"语料: {len(corpus)} 条, 总时长 {sum(item['duration'] for item in corpus):.1f}s, 并发: {args.concurrency}")
+
+    cores = len(thread_budget.cores)
+    layouts = [parse_layout(text) for text in args.layout] if args.layout else default_layouts(cores)
+    torch.set_num_interop_threads(config.threads_config['torch_inter_op'])
+
+    results = []
+    for layout in layouts:
+        print(f"测试布局 {format_layout(layout)} ...")
+        results.append((layout, await run_layout(corpus, layout, args.concurrency, args.warmup, args.language)))
+
+    print(f"\n可用核数: {cores}")
+    print(f"{'布局':<40}{'吞吐(x实时)':>14}{'耗时(s)':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for layout, result in sorted(results, key=lambda r: -r[1]['throughput']):
+        name = format_layout(layout) + (' *' if result['oversubscribed'] else '')
+        print(f"{name:<40}{result['throughput']:>14.2f}{result['wall']:>10.2f}"
+              f"{result['p50'] * 1000:>10.1f}{result['p95'] * 1000:>10.1f}")
+    if any(result['oversubscribed'] for _, result in results):
+        print("* 布局需要的核数超过可用核数，部分核被共用")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU 线程预算布局对比")
+    parser.add_argument('corpus', help="WAV语料目录")
+    parser.add_argument('--layout', action='append', help="布局，如 asr=2x2,speaker=1x2，可指定多次")
+    parser.add_argument('--concurrency', type=int, default=4, help="并发路数")
+    parser.add_argument('--language', default='zh')
+    parser.add_argument('--warmup', type=int, default=2, help="每个布局的预热条数")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()